@@ -7,12 +7,23 @@
 
 import os
 import sys
-from typing import List
+from contextlib import nullcontext, redirect_stderr, redirect_stdout
+from io import StringIO
+from typing import List, Optional, Tuple
 
 import click
 from xdis.version_info import version_tuple_to_str
 
+from decompyle3.limits import (
+    HAVE_LIMITS,
+    DecompileTimeout,
+    MemoryLimitExceeded,
+    file_limits,
+)
 from decompyle3.main import main, status_msg
+from decompyle3.parsers.main import clear_parser_cache
+from decompyle3.server import DEFAULT_TIMEOUT, serve as run_server
+from decompyle3.timings import Timings, collect_timings
 from decompyle3.version import __version__
 
 case_sensitive = {"case_sensitive": False}
@@ -24,6 +35,119 @@ def usage():
     sys.exit(1)
 
 
+def process_file(
+    filename: str,
+    src_base: str,
+    out_base: Optional[str],
+    main_opts: dict,
+    timings: bool = False,
+    file_timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+    outfile: Optional[str] = None,
+    is_source: bool = False,
+) -> Tuple[str, Tuple[int, int, int, int, int, int], str, str, Optional[dict]]:
+    """
+    Decompile a single file inside a worker process for --jobs.
+
+    Output that main() would have written to stdout and stderr is
+    captured and handed back to the parent process along with the
+    (tot, okay, failed, verify_failed, timed_out, out_of_memory) counts,
+    so that the parent can write it out in one piece, in the order that
+    the files were given. If `timings` is set, the last item is the
+    report of the time spent, otherwise None. `filename` is a Python
+    source file to compile first if `is_source` is set, and `outfile` is
+    where to write its decompiled source, as for main().
+
+    Decompiling stops if it takes longer than `file_timeout` seconds or
+    needs the process's address space to be more than `max_memory` bytes.
+    """
+    out, err = StringIO(), StringIO()
+    file_timings = Timings()
+    collecting = collect_timings(file_timings) if timings else nullcontext()
+    with redirect_stdout(out), redirect_stderr(err), collecting:
+        try:
+            compiled_files, source_files = (
+                ([], [filename]) if is_source else ([filename], [])
+            )
+            with file_limits(file_timeout, max_memory):
+                result = main(
+                    src_base,
+                    out_base,
+                    compiled_files,
+                    source_files,
+                    outfile,
+                    **main_opts,
+                )
+            result += (0, 0)
+        except (DecompileTimeout, MemoryLimitExceeded, MemoryError) as e:
+            sys.stderr.write(f"\n# file {os.path.join(src_base, filename)}\n# {e}\n")
+            if isinstance(e, DecompileTimeout):
+                result = (1, 0, 1, 0, 1, 0)
+            else:
+                result = (1, 0, 1, 0, 0, 1)
+            # The parsers may have been stopped part way through
+            # changing their grammar; start again with new ones.
+            clear_parser_cache()
+        except Exception as e:
+            # Something main() doesn't handle itself. Count the file
+            # as failed rather than taking down the whole pool.
+            sys.stderr.write(f"\n# file {os.path.join(src_base, filename)}\n# {e}\n")
+            result = (1, 0, 1, 0, 0, 0)
+    report = file_timings.report() if timings else None
+    return filename, result, out.getvalue(), err.getvalue(), report
+
+
+def run_in_workers(process_func, jobs: List[Tuple[str, bool]], numproc: int):
+    """
+    Run process_func(filename, is_source=is_source) for each
+    (filename, is_source) of `jobs` in `numproc` worker processes, and
+    yield what process_file() returns for each, in the order of `jobs`.
+
+    A worker process can die, for example when the system runs out of
+    memory and kills it, and that breaks the whole pool. The first file
+    not yet finished is then run again in a process of its own, and the
+    pool is started again for the rest. If that file's own process dies
+    too, what is yielded for it has None instead of counts.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    finished = {}
+    i = 0
+    while i < len(jobs):
+        executor = ProcessPoolExecutor(numproc)
+        futures = {
+            j: executor.submit(process_func, filename, is_source=is_source)
+            for j, (filename, is_source) in enumerate(jobs)
+            if j >= i and j not in finished
+        }
+        try:
+            while i < len(jobs):
+                result = finished.pop(i) if i in finished else futures[i].result()
+                yield result
+                i += 1
+        except BrokenProcessPool:
+            for j, future in futures.items():
+                if j > i and future.done() and future.exception() is None:
+                    finished[j] = future.result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+            executor.shutdown()
+        if i == len(jobs):
+            break
+
+        filename, is_source = jobs[i]
+        with ProcessPoolExecutor(1) as executor:
+            try:
+                yield executor.submit(
+                    process_func, filename, is_source=is_source
+                ).result()
+            except BrokenProcessPool:
+                yield filename, None, "", "", None
+        i += 1
+
+
 @click.command(context_settings={"help_option_names": ["--help", "-help", "-h"]})
 @click.option(
     "--asm++/--no-asm++",
@@ -83,7 +207,83 @@ def usage():
     help="stop decompilation when seeing an offset greater or equal to this; default is "
     "-1 which indicates no stopping point.",
 )
-@click.argument("files", nargs=-1, type=click.Path(readable=True), required=True)
+@click.option(
+    "--function",
+    "qualname",
+    default=None,
+    help="decompile only the function or class with this qualified name, "
+    'e.g. "Class.method" or "function.<locals>.inner".',
+)
+@click.option(
+    "--from-tokens",
+    "from_tokens",
+    is_flag=True,
+    default=False,
+    help="the files are files of scanned tokens that "
+    '"decompyle3-tokenize --dump" wrote, rather than bytecode files.',
+)
+@click.option(
+    "--jobs",
+    "-j",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="number of processes to decompile files with; default is the number "
+    "of CPUs. Output is written in the order the files are given.",
+)
+@click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=False,
+    help="reuse decompiled text of code seen before, and save new results, in "
+    "an on-disk cache. See DECOMPYLE3_CACHE_DIR.",
+)
+@click.option(
+    "--serve",
+    is_flag=True,
+    default=False,
+    help="run as a server that reads JSON requests, one per line, and writes "
+    "JSON responses. See decompyle3.server.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(),
+    default=None,
+    help="with --serve, accept connections on this Unix-domain socket instead "
+    "of reading stdin.",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=DEFAULT_TIMEOUT,
+    show_default=True,
+    help="with --serve, seconds a request may take by default.",
+)
+@click.option(
+    "--timings/--no-timings",
+    "show_timings",
+    default=False,
+    help="report on stderr the time spent in each phase of decompiling, and "
+    "the code objects that took longest.",
+)
+@click.option(
+    "--file-timeout",
+    "file_timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="seconds that decompiling a file may take; a file that takes longer "
+    "is counted as timed out. Files are decompiled in worker processes.",
+)
+@click.option(
+    "--max-memory",
+    "max_memory",
+    type=click.IntRange(min=1),
+    default=None,
+    help="megabytes of address space that a worker process may have while "
+    "decompiling a file; a file that needs more is counted as out of memory.",
+)
+@click.argument("files", nargs=-1, type=click.Path(readable=True), required=False)
 def main_bin(
     asm_plus: bool,
     asm: bool,
@@ -96,6 +296,16 @@ def main_bin(
     outfile,
     start_offset: int,
     stop_offset: int,
+    qualname: Optional[str],
+    from_tokens: bool,
+    jobs: Optional[int],
+    use_cache: bool,
+    serve: bool,
+    socket_path: Optional[str],
+    timeout: float,
+    show_timings: bool,
+    file_timeout: Optional[float],
+    max_memory: Optional[int],
     files: List[str],
 ):
     """
@@ -109,6 +319,32 @@ def main_bin(
         )
         sys.exit(-1)
 
+    if serve:
+        try:
+            run_server(socket_path, jobs, timeout)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if qualname is not None:
+        # These apply to whole files, or to files of tokens, which
+        # --function doesn't decompile.
+        incompatible = [
+            option
+            for option, given in (
+                ("--linemaps", linemaps),
+                ("--start-offset", start_offset != 0),
+                ("--stop-offset", stop_offset != -1),
+                ("--cache", use_cache),
+                ("--from-tokens", from_tokens),
+            )
+            if given
+        ]
+        if incompatible:
+            raise click.UsageError(
+                f"--function can't be used with {', '.join(incompatible)}"
+            )
+
     out_base = None
     source_paths: List[str] = []
     # timestamp = False
@@ -118,12 +354,13 @@ def main_bin(
 
     # Expand directory if "recurse" was specified.
     if recurse_dirs:
+        suffixes = (".tokens",) if from_tokens else (".pyc", ".pyo")
         expanded_files = []
         for f in pyc_paths:
             if os.path.isdir(f):
                 for root, _, dir_files in os.walk(f):
                     for df in dir_files:
-                        if df.endswith(".pyc") or df.endswith(".pyo"):
+                        if df.endswith(suffixes):
                             expanded_files.append(os.path.join(root, df))
         pyc_paths = expanded_files
 
@@ -168,24 +405,44 @@ def main_bin(
         "dups": False,
     }
 
-    numproc = 1
-    if numproc <= 1:
-        show_ast = {"before": tree or tree_plus, "after": tree_plus}
+    show_ast = {"before": tree or tree_plus, "after": tree_plus}
+    main_opts = {
+        "showasm": asm_opt,
+        "showgrammar": show_grammar,
+        "showast": show_ast,
+        "do_verify": verify,
+        "do_linemaps": linemaps,
+        "start_offset": start_offset,
+        "stop_offset": stop_offset,
+        "use_cache": use_cache,
+        "qualname": qualname,
+        "from_tokens": from_tokens,
+    }
+
+    if max_memory is not None:
+        max_memory *= 1024 * 1024
+    limited = file_timeout is not None or max_memory is not None
+    if limited and not HAVE_LIMITS:
+        raise click.UsageError(
+            "--file-timeout and --max-memory are not supported on this system"
+        )
+
+    numproc = (os.cpu_count() or 1) if jobs is None else jobs
+    numproc = min(numproc, len(pyc_paths) + len(source_paths))
+    timings = Timings()
+    # Limits are enforced in worker processes, so that a file which goes
+    # over them doesn't take us down with it.
+    if numproc <= 1 and not limited:
         try:
-            result = main(
-                src_base,
-                out_base,
-                pyc_paths,
-                source_paths,
-                outfile,
-                showasm=asm_opt,
-                showgrammar=show_grammar,
-                showast=show_ast,
-                do_verify=verify,
-                do_linemaps=linemaps,
-                start_offset=start_offset,
-                stop_offset=stop_offset,
-            )
+            with collect_timings(timings) if show_timings else nullcontext():
+                result = main(
+                    src_base,
+                    out_base,
+                    pyc_paths,
+                    source_paths,
+                    outfile,
+                    **main_opts,
+                )
 
             if len(pyc_paths) > 1:
                 mess = status_msg(verify, *result)
@@ -197,67 +454,81 @@ def main_bin(
         except KeyboardInterrupt:
             pass
     else:
-        from multiprocessing import Process, Queue
-        from queue import Empty
-
-        fqueue = Queue(len(pyc_paths) + numproc)
-        for f in pyc_paths:
-            fqueue.put(f)
-        for i in range(numproc):
-            fqueue.put(None)
-
-        rqueue = Queue(numproc)
-
-        def process_func():
-            (tot_files, okay_files, failed_files, verify_failed_files) = (
-                0,
-                0,
-                0,
-                0,
-            )
-            try:
-                while True:
-                    f = fqueue.get()
-                    if f is None:
-                        break
-                    (t, o, f, v) = main(src_base, out_base, [f], [], outfile)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except (Empty, KeyboardInterrupt):
-                pass
-            rqueue.put((tot_files, okay_files, failed_files, verify_failed_files))
-            rqueue.close()
+        from functools import partial
 
+        process_func = partial(
+            process_file,
+            src_base=src_base,
+            out_base=out_base,
+            main_opts=main_opts,
+            timings=show_timings,
+            file_timeout=file_timeout,
+            max_memory=max_memory,
+            outfile=outfile,
+        )
+        tot_files, okay_files, failed_files, verify_failed_files = (0, 0, 0, 0)
+        timeout_files = oom_files = 0
+        jobs_list = [(path, False) for path in pyc_paths]
+        jobs_list += [(path, True) for path in source_paths]
         try:
-            procs = [Process(target=process_func) for _ in range(numproc)]
-            for p in procs:
-                p.start()
-            for p in procs:
-                p.join()
-            (tot_files, okay_files, failed_files, verify_failed_files) = (
-                0,
-                0,
-                0,
-                0,
-            )
-            try:
-                while True:
-                    (t, o, f, v) = rqueue.get(False)
-                    tot_files += t
-                    okay_files += o
-                    failed_files += f
-                    verify_failed_files += v
-            except Empty:
-                pass
-            print(
-                "# decompiled %i files: %i okay, %i failed, %i verify failed"
-                % (tot_files, okay_files, failed_files, verify_failed_files)
+            for filename, counts, out_text, err_text, report in run_in_workers(
+                process_func, jobs_list, numproc
+            ):
+                if counts is None:
+                    counts = (1, 0, 1, 0, 0, 0)
+                    err_text = (
+                        f"\n# file {os.path.join(src_base, filename)}\n"
+                        "# the process decompiling it died\n"
+                    )
+                t, o, f, v, to, oom = counts
+                if report is not None:
+                    timings.merge(report)
+                tot_files += t
+                okay_files += o
+                failed_files += f
+                verify_failed_files += v
+                timeout_files += to
+                oom_files += oom
+
+                # When writing decompiled source to a directory, the
+                # per-file chatter is just a status line which we
+                # replace with our own aggregate one below.
+                if out_base is None:
+                    sys.stdout.write(out_text)
+                sys.stderr.write(err_text)
+                if out_base is not None:
+                    sys.stdout.write(
+                        "%s -- %s\r"
+                        % (
+                            os.path.join(src_base, filename),
+                            status_msg(
+                                verify,
+                                tot_files,
+                                okay_files,
+                                failed_files,
+                                verify_failed_files,
+                                timeout_files,
+                                oom_files,
+                            ),
+                        )
+                    )
+                sys.stdout.flush()
+            mess = status_msg(
+                verify,
+                tot_files,
+                okay_files,
+                failed_files,
+                verify_failed_files,
+                timeout_files,
+                oom_files,
             )
+            print("\n# " + mess)
         except (KeyboardInterrupt, OSError):
             pass
 
+    if show_timings:
+        sys.stderr.write(timings.format())
+
     # if timestamp:
     #     print(time.strftime(timestampfmt))
 
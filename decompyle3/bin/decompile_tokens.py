@@ -24,9 +24,11 @@ parsing.
 
 import getopt
 import os
+import os.path as osp
 import sys
 
 from decompyle3.disas import disassemble_file
+from decompyle3.token_stream import dump, scan_file
 from decompyle3.version import __version__
 
 program = "decompile-tokens"
@@ -53,10 +55,15 @@ Examples:
   {0} foo.pyc
   {0} foo.py    # same thing as above but find the file
   {0} foo.pyc bar.pyc  # disassemble foo.pyc and bar.pyc
+  {0} --dump foo.pyc   # save the tokens of foo.pyc in foo.tokens
 
 See also `pydisasm' from the `xdis' package.
 
 Options:
+  -d | --dump        instead of showing the tokens of each FILE, save them
+                     in a file named after FILE with the extension
+                     ".tokens". "decompyle3 --from-tokens" decompiles
+                     these files without scanning the bytecode again.
   -V | --version     show version and stop
   -h | --help        show this message
 
@@ -78,14 +85,17 @@ Type -h for for full help."""
 
     try:
         opts, files = getopt.getopt(
-            sys.argv[1:], "hVU", ["help", "version", "decompyle3"]
+            sys.argv[1:], "dhVU", ["dump", "help", "version", "decompyle3"]
         )
     except getopt.GetoptError as e:
         print(f"{os.path.basename(sys.argv[0])}: {e}", file=sys.stderr)
         sys.exit(-1)
 
+    save_tokens = False
     for opt, val in opts:
-        if opt in ("-h", "--help"):
+        if opt in ("-d", "--dump"):
+            save_tokens = True
+        elif opt in ("-h", "--help"):
             print(__doc__)
             sys.exit(1)
         elif opt in ("-V", "--version"):
@@ -98,7 +108,14 @@ Type -h for for full help."""
 
     for file in files:
         if os.path.exists(files[0]):
-            disassemble_file(file, sys.stdout)
+            if save_tokens:
+                dump_path = osp.splitext(file)[0] + ".tokens"
+                stream = scan_file(file)
+                with open(dump_path, "wb") as fp:
+                    dump(stream, fp)
+                print(f"Wrote {dump_path}")
+            else:
+                disassemble_file(file, sys.stdout)
         else:
             print(f"Can't read {files[0]} - skipping", file=sys.stderr)
             pass
@@ -32,17 +32,36 @@ want to run on earlier Python versions.
 import sys
 from collections import deque
 from py_compile import PyCompileError
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 
 from xdis import check_object_path, iscode, load_module
 
-from decompyle3.scanner import get_scanner
+from decompyle3.load import load_module_mapped
+from decompyle3.scanner import ScannedCode, get_scanner
 from decompyle3.semantics.pysource import (
     PARSER_DEFAULT_DEBUG,
     TREE_DEFAULT_DEBUG,
     code_deparse,
 )
 
+# The compile modes to use for code objects that come from expressions
+# rather than statements, by the name the code object has.
+EXPRESSION_COMPILE_MODES = {
+    "<dictcomp>": "dictcomp",
+    "<genexpr>": "genexpr",
+    "<lambda>": "lambda",
+    "<listcomp>": "listcomp",
+    "<setcomp>": "setcomp",
+}
+
+# Flag of functions' code objects; class bodies and modules don't have it.
+CO_NEWLOCALS = 0x2
+
+# Instructions that bind the name in a "def" or "class" statement.
+DEFINITION_STORES = frozenset(
+    ("STORE_DEREF", "STORE_FAST", "STORE_GLOBAL", "STORE_NAME")
+)
+
 
 def disco_deparse(
     version: Optional[tuple],
@@ -227,13 +246,7 @@ def decompile_all_fragments(
     """
     return decompile_code_type(
         filename,
-        {
-            "<dictcomp>": "dictcomp",
-            "<genexpr>": "genexpr",
-            "<lambda>": "lambda",
-            "<listcomp>": "listcomp",
-            "<setcomp>": "setcomp",
-        },
+        EXPRESSION_COMPILE_MODES,
         outstream,
         showasm,
         showast,
@@ -352,6 +365,183 @@ def decompile_set_comprehensions(
     )
 
 
+def code_qualnames(co) -> Iterator[Tuple[str, object, object]]:
+    """
+    Give the qualified name, the code object and the code object it is
+    in, for each code object nested in module code object `co`. Code
+    objects come before those nested in them.
+
+    The qualified names are those that the functions and classes made
+    from the code objects have in __qualname__, e.g. "Class.method" or
+    "function.<locals>.inner". They are worked out from where each code
+    object is, since 3.7 and 3.8 code objects don't record them.
+    """
+    stack = [(co, None)]
+    while stack:
+        parent, parent_qualname = stack.pop()
+        children = []
+        for child in parent.co_consts:
+            if not iscode(child):
+                continue
+            if parent_qualname is None:
+                qualname = child.co_name
+            elif parent.co_flags & CO_NEWLOCALS:
+                qualname = f"{parent_qualname}.<locals>.{child.co_name}"
+            else:
+                qualname = f"{parent_qualname}.{child.co_name}"
+            yield qualname, child, parent
+            children.append((child, qualname))
+        stack.extend(reversed(children))
+
+
+def definition_offsets(scanned: ScannedCode, co) -> Tuple[int, int]:
+    """
+    Return the offsets at which the "def" or "class" statement that
+    makes code object `co` starts and stops, in the scanned code object
+    that `co` is in.
+    """
+    insts = scanned.insts
+    for i, inst in enumerate(insts):
+        if inst.opname == "LOAD_CONST" and inst.argval is co:
+            break
+    else:
+        raise ValueError(f"{co.co_name} isn't loaded in {scanned.co.co_name}")
+
+    # The statement ends by binding the name to the function or class,
+    # after applying any decorators.
+    stop_offset = -1
+    for j in range(i + 1, len(insts)):
+        if insts[j].opname in DEFINITION_STORES:
+            if j + 1 < len(insts):
+                stop_offset = insts[j + 1].offset
+            break
+
+    # The statement starts with the first decorator, which is on the
+    # line the code object starts at.
+    load_offset = insts[i].offset
+    line_offsets = [
+        offset for offset in scanned.linestarts.keys() if offset <= load_offset
+    ]
+    start_offsets = [
+        offset
+        for offset in line_offsets
+        if scanned.linestarts[offset] >= co.co_firstlineno
+    ]
+    start_offset = min(start_offsets) if start_offsets else max(line_offsets)
+    return start_offset, stop_offset
+
+
+class _NoLeadingNewlines:
+    """
+    A stream that passes what is written on to `out`, except for the
+    newlines written before anything else.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.started = False
+
+    def write(self, s: str) -> None:
+        if not self.started:
+            s = s.lstrip("\n")
+            if not s:
+                return
+            self.started = True
+        self.out.write(s)
+
+    def __getattr__(self, name: str):
+        return getattr(self.out, name)
+
+
+def deparse_function(
+    co,
+    qualname: str,
+    out=None,
+    version=None,
+    python_implementation=None,
+    showasm=None,
+    showast=TREE_DEFAULT_DEBUG,
+    showgrammar=PARSER_DEFAULT_DEBUG,
+):
+    """
+    Like decompile_function(), but decompile the function or class with
+    qualified name `qualname` in module code object `co`.
+    """
+    for name, code, parent in code_qualnames(co):
+        if name == qualname:
+            break
+    else:
+        raise ValueError(f"no function or class is named {qualname}")
+
+    # A definition is written after blank lines, which are left off
+    # when it is all there is.
+    real_out = _NoLeadingNewlines(out or sys.stdout)
+    debug_opts = {"asm": showasm, "tree": showast, "grammar": showgrammar}
+    compile_mode = EXPRESSION_COMPILE_MODES.get(code.co_name)
+    if compile_mode is not None:
+        deparsed = code_deparse(
+            code,
+            real_out,
+            version=version,
+            debug_opts=debug_opts,
+            python_implementation=python_implementation,
+            compile_mode=compile_mode,
+        )
+    else:
+        # Decompile the statement that defines the function, so that
+        # its decorators and default values are there too.
+        scanner = get_scanner(version, python_implementation=python_implementation)
+        scanned = scanner.scan(parent, show_asm=showasm)
+        start_offset, stop_offset = definition_offsets(scanned, code)
+        deparsed = code_deparse(
+            parent,
+            real_out,
+            version=version,
+            debug_opts=debug_opts,
+            python_implementation=python_implementation,
+            start_offset=start_offset,
+            stop_offset=stop_offset,
+            scanned_codes={id(parent): scanned},
+        )
+    real_out.write("\n")
+    return deparsed
+
+
+def decompile_function(
+    filename: str,
+    qualname: str,
+    outstream=None,
+    showasm=None,
+    showast=TREE_DEFAULT_DEBUG,
+    showgrammar=PARSER_DEFAULT_DEBUG,
+):
+    """
+    decompile just the function or class with qualified name `qualname`
+    in a python byte-code file (.pyc), and the code nested in it; see
+    code_qualnames() for the form of `qualname`. Nothing else in the
+    file is scanned or parsed, except for the code object that the
+    function or class is defined in. When several functions have the
+    name, the first one is decompiled.
+
+    For lambdas and comprehensions, just their expression is given.
+
+    If given a Python source file (".py") file, we'll
+    decompile the function in the corresponding compiled object.
+    """
+    filename = check_object_path(filename)
+    version, _, _, co, python_implementation = load_module_mapped(filename)[:5]
+    return deparse_function(
+        co,
+        qualname,
+        outstream,
+        version,
+        python_implementation,
+        showasm,
+        showast,
+        showgrammar,
+    )
+
+
 def _test() -> None:
     """Simple test program to disassemble a file."""
     argc = len(sys.argv)
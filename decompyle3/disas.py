@@ -33,11 +33,14 @@ import sys
 from collections import deque
 
 from xdis import check_object_path, iscode, load_module
+from xdis.version_info import PYTHON_IMPLEMENTATION
 
 from decompyle3.scanner import get_scanner
 
 
-def disco(version: str, co, out=None, is_pypy=False) -> None:
+def disco(
+    version: str, co, out=None, python_implementation=PYTHON_IMPLEMENTATION
+) -> None:
     """
     diassembles and deparses a given code block 'co'
     """
@@ -50,13 +53,18 @@ def disco(version: str, co, out=None, is_pypy=False) -> None:
     if co.co_filename:
         print(f"# Embedded file name: {co.co_filename}", file=real_out)
 
-    scanner = get_scanner(version, is_pypy=is_pypy)
+    scanner = get_scanner(version, python_implementation)
 
     queue = deque([co])
-    disco_loop(scanner.ingest, queue, real_out)
+    disco_loop(scanner.ingest_tokens, queue, real_out)
 
 
 def disco_loop(disasm, queue, real_out):
+    """
+    Print the tokens that `disasm` gives for each code object in `queue`,
+    and for the code objects they load. Tokens are printed as `disasm`
+    gives them, so the whole token list of a code object isn't needed.
+    """
     while len(queue) > 0:
         co = queue.popleft()
         if co.co_name != "<module>":
@@ -65,8 +73,7 @@ def disco_loop(disasm, queue, real_out):
                 % (co.co_name, co.co_firstlineno, co.co_filename),
                 file=real_out,
             )
-        tokens, customize = disasm(co)
-        for t in tokens:
+        for t in disasm(co):
             if iscode(t.pattr):
                 queue.append(t.pattr)
             elif iscode(t.attr):
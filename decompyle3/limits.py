@@ -0,0 +1,115 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Limits on the time and memory that decompiling a file may use.
+
+Some bytecode makes the Earley parser run for minutes, or use gigabytes
+of memory. file_limits() raises DecompileTimeout in the code inside it
+when that has run for too long, and MemoryLimitExceeded when it has
+tried to use too much memory.
+
+The time limit is a SIGALRM timer, so it can be used only in the main
+thread of a process, on systems which have setitimer(). The memory limit
+is a limit on the size of the whole process's address space, set with
+setrlimit(), so that an allocation that would go over it fails with
+MemoryError however quickly memory is being used. Both are meant for
+worker processes, which decompile one file at a time.
+"""
+
+import errno
+import signal
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The resource limit that caps the memory a process can use.
+if resource is None:
+    MEMORY_RLIMIT = None
+else:
+    MEMORY_RLIMIT = getattr(
+        resource, "RLIMIT_AS", getattr(resource, "RLIMIT_DATA", None)
+    )
+
+HAVE_LIMITS = hasattr(signal, "setitimer") and MEMORY_RLIMIT is not None
+
+
+class LimitExceeded(BaseException):
+    """
+    A limit set by file_limits() was exceeded. Like KeyboardInterrupt,
+    this isn't an Exception, so that "except Exception" in the code being
+    run doesn't stop it.
+    """
+
+
+class DecompileTimeout(LimitExceeded):
+    """Decompiling took longer than its time limit."""
+
+
+class MemoryLimitExceeded(LimitExceeded):
+    """Decompiling used more memory than its limit."""
+
+
+@contextmanager
+def file_limits(timeout: Optional[float] = None, max_memory: Optional[int] = None):
+    """
+    Raise DecompileTimeout in the with statement body if it runs for more
+    than `timeout` seconds, or MemoryLimitExceeded if it runs out of memory
+    because the process's address space would go over `max_memory` bytes.
+    A limit of None is no limit.
+
+    The process's memory limit is put back when the with statement is left.
+    """
+    if timeout is None and max_memory is None:
+        yield
+        return
+
+    if not HAVE_LIMITS:
+        raise RuntimeError("time and memory limits are not supported on this system")
+
+    def expired(signum, frame):
+        raise DecompileTimeout(f"no result after {timeout} seconds")
+
+    old_rlimit = None
+    if max_memory is not None:
+        old_rlimit = resource.getrlimit(MEMORY_RLIMIT)
+        soft, hard = old_rlimit
+        if hard != resource.RLIM_INFINITY:
+            max_memory = min(max_memory, hard)
+        resource.setrlimit(MEMORY_RLIMIT, (max_memory, hard))
+    old_handler = signal.signal(signal.SIGALRM, expired)
+    if timeout is not None:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    except (MemoryError, OSError) as e:
+        # Memory that the system won't map is ENOMEM.
+        if max_memory is None or (isinstance(e, OSError) and e.errno != errno.ENOMEM):
+            raise
+        raise MemoryLimitExceeded(
+            f"more than {max_memory // (1024 * 1024)} MB of memory needed"
+        )
+    finally:
+        # expired() may raise here, before the timer is stopped; the
+        # timer doesn't repeat, so it can't raise twice.
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        finally:
+            signal.signal(signal.SIGALRM, old_handler)
+            if old_rlimit is not None:
+                resource.setrlimit(MEMORY_RLIMIT, old_rlimit)
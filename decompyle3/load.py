@@ -0,0 +1,110 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Loading bytecode files through memory-mapped files.
+
+xdis.load_module() reads a whole .pyc file into a bytes object before
+unmarshalling it, and when the file is for the running Python, reads
+it a second time from there. For the bytecode that we decompile, we
+instead map the file into memory and unmarshal the code object from the
+mapping, so the file's contents are never copied into Python objects;
+only the code objects built from them are.
+
+The header is read in place from the mapping, and only its first 16
+bytes are looked at. Files we don't decompile, or can't map, go to
+xdis.load_module(). So do files whose code object can't be unmarshalled
+from the mapping, so that the error for a malformed file is xdis's
+ImportError, which says what is wrong with it.
+"""
+
+import marshal
+import mmap
+import os.path as osp
+from struct import error as StructError, unpack_from
+
+import xdis.unmarshal
+from xdis import load_module
+from xdis.load import is_pypy
+from xdis.magics import PYTHON_MAGIC_INT, magic2int, magic_int2tuple
+from xdis.version_info import PythonImplementation
+
+from decompyle3.scanner import PYTHON_VERSIONS
+
+# The size of the header of a 3.7 or 3.8 bytecode file; see PEP 552.
+HEADER_SIZE = 16
+
+# The 3.7.0beta3 magic number; its files always have a hash.
+MAGIC_INT_37_BETA3 = 3393
+
+
+def load_module_mapped(filename: str, code_objects=None) -> tuple:
+    """
+    Load the module in bytecode file `filename` without importing it,
+    giving the same values as xdis.load_module() does.
+    """
+    if code_objects is None:
+        code_objects = {}
+    if osp.isfile(filename) and osp.getsize(filename) >= HEADER_SIZE:
+        with open(filename, "rb") as fp:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                try:
+                    result = _load_mapped(mapped, filename, code_objects)
+                except (EOFError, StructError, ValueError):
+                    # A truncated or otherwise malformed file.
+                    result = None
+        if result is not None:
+            return result
+    return load_module(filename, code_objects)
+
+
+def _load_mapped(mapped, filename: str, code_objects: dict):
+    """
+    Return what load_module_mapped() does for the bytecode file mapped
+    in `mapped`, or None if it isn't 3.7 or 3.8 CPython bytecode.
+    """
+    magic_int = magic2int(mapped[:4])
+    try:
+        version = magic_int2tuple(magic_int)
+    except KeyError:
+        return None
+    if version[:2] not in PYTHON_VERSIONS or is_pypy(magic_int, filename):
+        return None
+
+    flags = unpack_from("<I", mapped, 4)[0]
+    if flags & 1 or magic_int == MAGIC_INT_37_BETA3:
+        timestamp = source_size = None
+        sip_hash = unpack_from("<Q", mapped, 8)[0]
+    else:
+        timestamp, source_size = unpack_from("<II", mapped, 8)
+        sip_hash = None
+
+    if magic_int == PYTHON_MAGIC_INT:
+        # The views must be released before the file is unmapped.
+        with memoryview(mapped) as view, view[HEADER_SIZE:] as body:
+            co = marshal.loads(body)
+    else:
+        mapped.seek(HEADER_SIZE)
+        co = xdis.unmarshal.load_code(mapped, magic_int, code_objects=code_objects)
+
+    return (
+        version,
+        timestamp,
+        magic_int,
+        co,
+        PythonImplementation.CPython,
+        source_size,
+        sip_hash,
+        {},
+    )
@@ -21,9 +21,9 @@ import py_compile
 import subprocess
 import sys
 import tempfile
-from typing import Any, Optional, TextIO, Tuple
+from typing import Any, List, Optional, TextIO, Tuple
 
-from xdis import iscode, load_module
+from xdis import iscode
 from xdis.version_info import (
     IS_PYPY,
     PYTHON_VERSION_TRIPLE,
@@ -31,12 +31,17 @@ from xdis.version_info import (
     version_tuple_to_str,
 )
 
+from decompyle3.code_fns import deparse_function
 from decompyle3.disas import check_object_path
+from decompyle3.limits import LimitExceeded
+from decompyle3.load import load_module_mapped
 from decompyle3.parsers.parse_heads import ParserError
+from decompyle3.result_cache import RecordingStream, ResultCache, code_hash
 from decompyle3.semantics import pysource
 from decompyle3.semantics.fragments import code_deparse as code_deparse_fragments
 from decompyle3.semantics.linemap import deparse_code_with_map
 from decompyle3.semantics.pysource import PARSER_DEFAULT_DEBUG, code_deparse
+from decompyle3.token_stream import load as load_token_stream
 from decompyle3.version import __version__
 
 # from decompyle3.linenumbers import line_number_mapping
@@ -65,6 +70,50 @@ def syntax_check(filename: str) -> bool:
     return valid
 
 
+def write_header(
+    out: TextIO,
+    co,
+    bytecode_version: Tuple[int],
+    timestamp=None,
+    source_encoding=None,
+    source_size=None,
+    python_implementation=PythonImplementation.CPython,
+    magic_int=None,
+) -> None:
+    """
+    write the comments that start decompiled text: which decompyle3 and
+    Python made it, and what the bytecode file's header says.
+    """
+
+    def write(s):
+        s += "\n"
+        out.write(s)
+
+    co_pypy_str = "PyPy " if python_implementation is PythonImplementation.PyPy else ""
+    run_pypy_str = "PyPy " if IS_PYPY else ""
+    sys_version_lines = sys.version.split("\n")
+    if source_encoding:
+        write(f"# -*- coding: {source_encoding} -*-")
+    write(
+        "# decompyle3 version %s\n"
+        "# %sPython bytecode version base %s%s\n# Decompiled from: %sPython %s"
+        % (
+            __version__,
+            co_pypy_str,
+            version_tuple_to_str(bytecode_version),
+            " (%s)" % str(magic_int) if magic_int else "",
+            run_pypy_str,
+            "\n# ".join(sys_version_lines),
+        )
+    )
+    if co.co_filename:
+        write(f"# Embedded file name: {co.co_filename}")
+    if timestamp:
+        write(f"# Compiled at: {datetime.datetime.fromtimestamp(timestamp)}")
+    if source_size:
+        write("# Size of source mod 2**32: %d bytes" % source_size)
+
+
 def decompile(
     co,
     bytecode_version: Tuple[int] = PYTHON_VERSION_TRIPLE,
@@ -83,6 +132,8 @@ def decompile(
     compile_mode="exec",
     start_offset: int = 0,
     stop_offset: int = -1,
+    result_cache: Optional[ResultCache] = None,
+    scanned_codes: Optional[dict] = None,
 ) -> Any:
     """
     ingests and deparses a given code block 'co'
@@ -90,6 +141,14 @@ def decompile(
     if `bytecode_version` is None, use the current Python interpreter
     version.
 
+    If `result_cache` is given, the decompiled text of `co` and of the
+    functions in it are looked up there before decompiling and saved
+    there afterwards. When the text for `co` is found, None is returned
+    instead of a deparsed object.
+
+    `scanned_codes` are the results of scanning `co` and the code
+    objects in it, if that has already been done; see code_deparse().
+
     Caller is responsible for closing `out` and `mapstream`
     """
     if bytecode_version is None:
@@ -98,35 +157,18 @@ def decompile(
     # store final output stream for case of error
     real_out = out or sys.stdout
 
-    def write(s):
-        s += "\n"
-        real_out.write(s)
-
     assert iscode(co), f"""{co} does not smell like code"""
 
-    co_pypy_str = "PyPy " if python_implementation is PythonImplementation.PyPy else ""
-    run_pypy_str = "PyPy " if IS_PYPY else ""
-    sys_version_lines = sys.version.split("\n")
-    if source_encoding:
-        write(f"# -*- coding: {source_encoding} -*-")
-    write(
-        "# decompyle3 version %s\n"
-        "# %sPython bytecode version base %s%s\n# Decompiled from: %sPython %s"
-        % (
-            __version__,
-            co_pypy_str,
-            version_tuple_to_str(bytecode_version),
-            " (%s)" % str(magic_int) if magic_int else "",
-            run_pypy_str,
-            "\n# ".join(sys_version_lines),
-        )
+    write_header(
+        real_out,
+        co,
+        bytecode_version,
+        timestamp,
+        source_encoding,
+        source_size,
+        python_implementation,
+        magic_int,
     )
-    if co.co_filename:
-        write(f"# Embedded file name: {co.co_filename}")
-    if timestamp:
-        write(f"# Compiled at: {datetime.datetime.fromtimestamp(timestamp)}")
-    if source_size:
-        write("# Size of source mod 2**32: %d bytes" % source_size)
 
     grammar = dict(PARSER_DEFAULT_DEBUG)
     if showgrammar.get("reduce", False):
@@ -149,18 +191,47 @@ def decompile(
                 python_implementation=python_implementation,
                 debug_opts=debug_opts,
             )
-            header_count = 3 + len(sys_version_lines)
             if deparsed is not None:
-                linemap = [
-                    (line_no, deparsed.source_linemap[line_no] + header_count)
-                    for line_no in sorted(deparsed.source_linemap.keys())
-                ]
-                mapstream.write("\n\n# %s\n" % linemap)
+                mapstream.write("\n\n# %s\n" % source_linemap(deparsed))
+        elif result_cache is not None and not (
+            do_fragments or showasm or any(showast.values()) or grammar["reduce"]
+        ):
+            key = code_hash(
+                co,
+                bytecode_version,
+                python_implementation,
+                "module",
+                compile_mode,
+                start_offset,
+                stop_offset,
+            )
+            cached = result_cache.get(key)
+            if cached is not None:
+                deparsed = None
+                out.write(cached.decode("utf-8"))
+            else:
+                recording = RecordingStream(out)
+                deparsed = code_deparse(
+                    co,
+                    recording,
+                    bytecode_version,
+                    python_implementation=python_implementation,
+                    debug_opts=debug_opts,
+                    compile_mode=compile_mode,
+                    start_offset=start_offset,
+                    stop_offset=stop_offset,
+                    result_cache=result_cache,
+                    scanned_codes=scanned_codes,
+                )
+                if deparsed is not None:
+                    result_cache.put(key, "".join(recording.writes).encode("utf-8"))
         else:
             if do_fragments:
                 deparse_fn = code_deparse_fragments
+                deparse_opts = {}
             else:
                 deparse_fn = code_deparse
+                deparse_opts = {"scanned_codes": scanned_codes}
             deparsed = deparse_fn(
                 co,
                 out,
@@ -170,6 +241,7 @@ def decompile(
                 compile_mode=compile_mode,
                 start_offset=start_offset,
                 stop_offset=stop_offset,
+                **deparse_opts,
             )
             pass
         real_out.write("\n")
@@ -179,6 +251,18 @@ def decompile(
         raise pysource.SourceWalkerError(str(e))
 
 
+def source_linemap(deparsed) -> List[Tuple[int, int]]:
+    """
+    Return the line-number pairs that decompile() writes to its mapstream
+    for `deparsed`, a result of deparse_code_with_map().
+    """
+    header_count = 3 + len(sys.version.split("\n"))
+    return [
+        (line_no, deparsed.source_linemap[line_no] + header_count)
+        for line_no in sorted(deparsed.source_linemap.keys())
+    ]
+
+
 def compile_file(source_path: str) -> str:
     if source_path.endswith(".py"):
         basename = source_path[:-3]
@@ -206,10 +290,13 @@ def decompile_file(
     do_fragments=False,
     start_offset=0,
     stop_offset=-1,
+    result_cache: Optional[ResultCache] = None,
 ) -> Any:
     """
     decompile Python byte-code file (.pyc). Return objects to
     all of the deparsed objects found in `filename`.
+
+    See decompile() for a description of `result_cache`.
     """
 
     filename = check_object_path(filename)
@@ -223,7 +310,7 @@ def decompile_file(
         source_size,
         _,
         _,
-    ) = load_module(filename, code_objects)
+    ) = load_module_mapped(filename, code_objects)
 
     if isinstance(co, list):
         deparsed = []
@@ -244,6 +331,7 @@ def decompile_file(
                     mapstream=mapstream,
                     start_offset=start_offset,
                     stop_offset=stop_offset,
+                    result_cache=result_cache,
                 ),
             )
     else:
@@ -266,11 +354,108 @@ def decompile_file(
                 compile_mode="exec",
                 start_offset=start_offset,
                 stop_offset=stop_offset,
+                result_cache=result_cache,
             )
         ]
     return deparsed
 
 
+def decompile_token_stream(
+    filename: str,
+    outstream: Optional[TextIO] = None,
+    showasm: Optional[str] = None,
+    showast={},
+    showgrammar=dict(PARSER_DEFAULT_DEBUG),
+    source_encoding=None,
+    mapstream=None,
+    do_fragments=False,
+    start_offset=0,
+    stop_offset=-1,
+    result_cache: Optional[ResultCache] = None,
+) -> Any:
+    """
+    Like decompile_file(), but decompile the file of scanned tokens
+    `filename`, which decompyle3.token_stream.dump() wrote, without
+    scanning.
+
+    Raise ValueError if `filename` isn't a token stream.
+    """
+    with open(filename, "rb") as fp:
+        stream = load_token_stream(fp)
+    co = stream.scanned_codes[0].co
+    return [
+        decompile(
+            co,
+            stream.version,
+            outstream,
+            showasm,
+            showast,
+            stream.timestamp,
+            showgrammar,
+            source_encoding,
+            source_size=stream.source_size,
+            python_implementation=stream.python_implementation,
+            magic_int=stream.magic_int,
+            mapstream=mapstream,
+            do_fragments=do_fragments,
+            compile_mode="exec",
+            start_offset=start_offset,
+            stop_offset=stop_offset,
+            result_cache=result_cache,
+            scanned_codes={id(scanned.co): scanned for scanned in stream.scanned_codes},
+        )
+    ]
+
+
+def decompile_file_function(
+    filename: str,
+    qualname: str,
+    outstream: Optional[TextIO] = None,
+    showasm: Optional[str] = None,
+    showast={},
+    showgrammar=dict(PARSER_DEFAULT_DEBUG),
+    source_encoding=None,
+) -> Any:
+    """
+    Like decompile_file(), but decompile just the function or class with
+    qualified name `qualname` and the code nested in it; see
+    decompyle3.code_fns.decompile_function().
+    """
+    filename = check_object_path(filename)
+    (
+        version,
+        timestamp,
+        magic_int,
+        co,
+        python_implementation,
+        source_size,
+        _,
+        _,
+    ) = load_module_mapped(filename)
+    real_out = outstream or sys.stdout
+    write_header(
+        real_out,
+        co,
+        version,
+        timestamp,
+        source_encoding,
+        source_size,
+        python_implementation,
+        magic_int,
+    )
+    real_out.write("\n")
+    return deparse_function(
+        co,
+        qualname,
+        real_out,
+        version,
+        python_implementation,
+        showasm,
+        showast,
+        showgrammar,
+    )
+
+
 # FIXME: combine into an options parameter
 def main(
     in_base: str,
@@ -287,6 +472,9 @@ def main(
     do_fragments=False,
     start_offset: int = 0,
     stop_offset: int = -1,
+    use_cache: bool = False,
+    qualname: Optional[str] = None,
+    from_tokens: bool = False,
 ) -> Tuple[int, int, int, int]:
     """
     in_base	base directory for input files
@@ -298,11 +486,22 @@ def main(
     - <filename>		outfile=<filename> (out_base is ignored)
     - files below out_base	out_base=...
     - stdout			out_base=None, outfile=None
+
+    use_cache	look up and save results in the on-disk result cache
+            (not when verifying or showing fragments)
+    qualname	decompile only the function or class with this qualified
+            name, e.g. "Class.method"; do_linemaps, start_offset,
+            stop_offset, use_cache and from_tokens don't apply to it
+    from_tokens	the files are files of scanned tokens that
+            decompyle3.token_stream.dump() wrote
     """
     tot_files = okay_files = failed_files = 0
     verify_failed_files = 0 if do_verify else 0
     current_outfile = outfile
     linemap_stream = None
+    result_cache = (
+        ResultCache() if use_cache and not (do_verify or do_fragments) else None
+    )
 
     for source_path in source_files:
         compiled_files.append(compile_file(source_path))
@@ -345,18 +544,46 @@ def main(
 
         # Try to decompile the input file.
         try:
-            deparsed_objects = decompile_file(
-                infile,
-                outstream,
-                showasm,
-                showast,
-                showgrammar,
-                source_encoding,
-                linemap_stream,
-                do_fragments,
-                start_offset,
-                stop_offset,
-            )
+            if from_tokens:
+                deparsed_objects = decompile_token_stream(
+                    infile,
+                    outstream,
+                    showasm,
+                    showast,
+                    showgrammar,
+                    source_encoding,
+                    linemap_stream,
+                    do_fragments,
+                    start_offset,
+                    stop_offset,
+                    result_cache,
+                )
+            elif qualname is None:
+                deparsed_objects = decompile_file(
+                    infile,
+                    outstream,
+                    showasm,
+                    showast,
+                    showgrammar,
+                    source_encoding,
+                    linemap_stream,
+                    do_fragments,
+                    start_offset,
+                    stop_offset,
+                    result_cache,
+                )
+            else:
+                deparsed_objects = [
+                    decompile_file_function(
+                        infile,
+                        qualname,
+                        outstream,
+                        showasm,
+                        showast,
+                        showgrammar,
+                        source_encoding,
+                    )
+                ]
             if do_fragments:
                 for deparsed_object in deparsed_objects:
                     last_mod = None
@@ -425,6 +652,14 @@ def main(
             sys.stdout.write("\n")
             sys.stderr.write(f"\nLast file: {infile}   ")
             raise
+        except (LimitExceeded, MemoryError):
+            # Don't leave what was written before decompiling was stopped
+            # where it looks like a result.
+            failed_outfile = current_outfile or outfile
+            if failed_outfile:
+                outstream.close()
+                os.replace(failed_outfile, failed_outfile + "_failed")
+            raise
         except RuntimeError as e:
             sys.stdout.write(f"\n{str(e)}\n")
             if str(e).startswith("Unsupported Python"):
@@ -495,9 +730,20 @@ def status_msg(
     okay_files: int,
     failed_files: int,
     verify_failed_files: Optional[int],
+    timeout_files: int = 0,
+    oom_files: int = 0,
 ):
+    """
+    Return a summary of the counts of files. `timeout_files` and
+    `oom_files`, the files that went over their time or memory limit,
+    are among those in `failed_files`.
+    """
     if tot_files == 1:
-        if failed_files:
+        if timeout_files:
+            return "\n# decompile timed out"
+        elif oom_files:
+            return "\n# decompile ran out of memory"
+        elif failed_files:
             return "\n# decompile failed"
         elif verify_failed_files:
             return "\n# decompile run verification failed"
@@ -508,6 +754,8 @@ def status_msg(
             pass
         pass
     mess = f"decompiled {tot_files} files: {okay_files} okay, {failed_files} failed"
+    if timeout_files or oom_files:
+        mess += f" ({timeout_files} timed out, {oom_files} out of memory)"
     if do_verify:
         mess += f", {verify_failed_files} failed verification"
     return mess
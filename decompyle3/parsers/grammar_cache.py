@@ -0,0 +1,212 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+On-disk cache of the uncustomized grammars for our parsers.
+
+Building a parser collects and splits up every grammar rule found in the
+docstrings of its p_* methods. Rather than do that in every new process,
+we save the resulting grammar tables in a file whose name contains a
+hash of the source code of the modules that define the parser class and
+the classes it is derived from, since these build the grammar tables
+and the rest of what is saved. When a grammar rule or anything else in
+those modules is changed, the hash changes, so the old file is no longer
+used and a new one is written the next time the parser is built.
+
+Only the grammar rules and the information that goes along with them are
+saved. Spark's Earley state tables are not: customizing the grammar for a
+code object adds rules, which causes spark to recompute those tables
+anyway.
+
+The cache directory is $DECOMPYLE3_CACHE_DIR/grammar when that
+environment variable is set, and $XDG_CACHE_HOME/decompyle3/grammar or
+~/.cache/decompyle3/grammar otherwise. Setting DECOMPYLE3_CACHE_DIR to
+the empty string turns off caching.
+
+Since loading a pickle can run code, a cache file is used only if it and
+its directory belong to the user running decompyle3 and can't be
+written by anyone else, and only the classes that a grammar needs can be
+loaded from it.
+"""
+
+import hashlib
+import os
+import os.path as osp
+import pickle
+import stat
+import sys
+import tempfile
+from glob import glob
+from typing import Optional
+
+from spark_parser.version import __version__ as SPARK_VERSION
+
+from decompyle3.version import __version__ as VERSION
+
+# Change this when the format of what we save changes.
+GRAMMAR_CACHE_FORMAT = 2
+
+PICKLE_PROTOCOL = 4
+
+
+def cache_dir(subdir: str) -> Optional[str]:
+    """
+    Return the directory to store decompyle3 cache files of kind `subdir`
+    in, or None if caching has been turned off.
+    """
+    base = os.environ.get("DECOMPYLE3_CACHE_DIR")
+    if base is None:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or osp.join(
+            osp.expanduser("~"), ".cache"
+        )
+        base = osp.join(xdg_cache, "decompyle3")
+    elif not base:
+        return None
+    return osp.join(base, subdir)
+
+
+# The classes that a saved grammar can have instances of, by module
+ALLOWED_GLOBALS = {"decompyle3.parsers.treenode": {"SyntaxTree"}}
+
+
+def grammar_hash(parser_class: type) -> str:
+    """
+    Return a hash of everything that goes into building a parser of class
+    `parser_class`: the source code of the modules which define it and
+    the classes it is derived from, and the versions of the code that
+    turns its grammar rules into a grammar.
+    """
+    h = hashlib.sha256()
+    h.update(
+        f"{GRAMMAR_CACHE_FORMAT} {VERSION} {SPARK_VERSION} "
+        f"{parser_class.__module__}.{parser_class.__qualname__}\n".encode("utf-8")
+    )
+    seen = set()
+    for cls in parser_class.__mro__:
+        path = getattr(sys.modules.get(cls.__module__), "__file__", None)
+        if path is None or path in seen:
+            continue
+        seen.add(path)
+        h.update(f"{cls.__module__}\n".encode("utf-8"))
+        with open(path, "rb") as fp:
+            h.update(fp.read())
+    return h.hexdigest()
+
+
+def is_private(fp) -> bool:
+    """
+    Return True if open file `fp` and the directory it is in belong to
+    the user we are running as, and can't be written by anyone else.
+    """
+    if not hasattr(os, "getuid"):
+        # There is no owner to check, so nothing to trust.
+        return False
+    uid = os.getuid()
+    for st in (os.fstat(fp.fileno()), os.stat(osp.dirname(fp.name))):
+        if st.st_uid != uid or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+    return True
+
+
+class GrammarUnpickler(pickle.Unpickler):
+    """An unpickler that loads only the classes in ALLOWED_GLOBALS."""
+
+    def find_class(self, module: str, name: str):
+        if name not in ALLOWED_GLOBALS.get(module, ()):
+            raise pickle.UnpicklingError(f"{module}.{name} is not in a grammar")
+        return super().find_class(module, name)
+
+
+def _cache_path(parser_class: type, debug_parser: dict) -> Optional[str]:
+    if "SPARK_PARSER_COVERAGE" in os.environ or debug_parser.get("dups", False):
+        # Coverage information is loaded and duplicate rules are
+        # reported only when the grammar is built from its rules.
+        return None
+    if not hasattr(os, "getuid"):
+        # Cache files are loaded only when is_private() can tell that
+        # they are ours, so there is no point in writing them.
+        return None
+    cache_directory = cache_dir("grammar")
+    if cache_directory is None:
+        return None
+    digest = grammar_hash(parser_class)
+    return osp.join(cache_directory, f"{parser_class.__name__}-{digest}.pickle")
+
+
+def load_parser(parser_class: type, debug_parser: dict):
+    """
+    Return a parser of class `parser_class` whose grammar comes from the
+    cache, or None if there is no usable cache entry for it.
+    """
+    path = _cache_path(parser_class, debug_parser)
+    if path is None or not osp.exists(path):
+        return None
+    try:
+        with open(path, "rb") as fp:
+            if not is_private(fp):
+                return None
+            state = GrammarUnpickler(fp).load()
+    except Exception:
+        # A truncated or otherwise damaged file; it will get rewritten.
+        return None
+
+    p = parser_class.__new__(parser_class)
+    p.__dict__.update(state)
+
+    # Semantic actions are closures over the parser and can't be
+    # pickled. Recreate them the way spark does when adding rules.
+    p.rule2func = {}
+    for rule in p.rule2name:
+        if rule[0] == p._START:
+            p.rule2func[rule] = lambda args: args[1]
+        else:
+            p.rule2func[rule] = p.preprocess(rule, None)[1]
+    p.debug = dict(debug_parser)
+    return p
+
+
+def save_parser(p, debug_parser: dict) -> None:
+    """
+    Save the grammar of parser `p`, which should not have been
+    customized or used in parsing, to the cache.
+    """
+    parser_class = p.__class__
+    path = _cache_path(parser_class, debug_parser)
+    if path is None:
+        return
+
+    state = dict(p.__dict__)
+    del state["rule2func"]
+    del state["debug"]
+
+    cache_directory = osp.dirname(path)
+    try:
+        os.makedirs(cache_directory, mode=0o700, exist_ok=True)
+        # Write to a temporary file and rename it so that other
+        # processes never see a partially-written file.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump(state, fp, protocol=PICKLE_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        # Remove entries for older versions of this grammar.
+        for old_path in glob(osp.join(cache_directory, f"{parser_class.__name__}-*")):
+            if old_path != path:
+                os.unlink(old_path)
+    except (OSError, pickle.PicklingError):
+        # Caching is an optimization; not being able to write is okay.
+        pass
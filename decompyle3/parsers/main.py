@@ -32,6 +32,7 @@ from xdis.version_info import (
     version_tuple_to_str,
 )
 
+from decompyle3.parsers.grammar_cache import load_parser, save_parser
 from decompyle3.parsers.p37.heads import (
     Python37ParserEval,
     Python37ParserExec,
@@ -55,18 +56,78 @@ from decompyle3.parsers.p38pypy.heads import (
 )
 from decompyle3.parsers.treenode import SyntaxTree
 from decompyle3.show import maybe_show_asm
+from decompyle3.timings import current_timings, phase
 
 
 def parse(p, tokens, customize, is_lambda: bool) -> SyntaxTree:
     was_lambda = p.is_lambda
     p.is_lambda = is_lambda
-    p.customize_grammar_rules(tokens, customize)
-    tree = p.parse(tokens)
-    p.is_lambda = was_lambda
+    # The rules added for this code object are taken out again after
+    # parsing, so the grammar used for the next code object has only
+    # what that code object needs.
+    timings = current_timings()
+    p.begin_customization()
+    try:
+        with phase("customize_grammar"):
+            p.customize_grammar_rules(tokens, customize)
+        if timings is None:
+            p.end_customization()
+            tree = p.parse(tokens)
+        else:
+            timings.count(
+                tokens=len(tokens),
+                rules_added=sum(1 for change in p.grammar_delta if change[0] == "add"),
+            )
+            p.end_customization()
+            tree = _timed_parse(p, tokens, timings)
+    finally:
+        p.undo_customization()
+        p.is_lambda = was_lambda
     #  p.cleanup()
     return tree
 
 
+def _timed_parse(p, tokens, timings) -> SyntaxTree:
+    """
+    p.parse(tokens), counting Earley items and timing reduction checks
+    in `timings`.
+    """
+    make_set = p.makeSet
+    reduce_is_invalid = p.reduce_is_invalid
+
+    def counting_make_set(tokens, sets, i):
+        make_set(tokens, sets, i)
+        # Items are only added to sets[i] and sets[i + 1] here, so
+        # sets[i] is now complete.
+        timings.count(earley_items=len(sets[i]))
+
+    def timed_reduce_is_invalid(rule, ast, tokens, first, last):
+        with timings.phase("reduce_check"):
+            return reduce_is_invalid(rule, ast, tokens, first, last)
+
+    p.makeSet = counting_make_set
+    p.reduce_is_invalid = timed_reduce_is_invalid
+    try:
+        return p.parse(tokens)
+    finally:
+        del p.makeSet
+        del p.reduce_is_invalid
+
+
+# Uncustomized parsers, keyed by version, compile mode, Python
+# implementation and debug flags. get_python_parser() hands out clones of
+# these so that the grammar for each kind of parser is built only once
+# per process.
+_parser_cache = {}
+
+
+def clear_parser_cache() -> None:
+    """
+    Forget all of the parsers that get_python_parser() has built.
+    """
+    _parser_cache.clear()
+
+
 def get_python_parser(
     version,
     debug_parser=PARSER_DEFAULT_DEBUG,
@@ -77,6 +138,11 @@ def get_python_parser(
     Returns parser object for Python version 3.7, 3.8, etc. depending on the parameters
     passed.
 
+    The first parser of a given kind is built from its grammar rules, or
+    read from the on-disk grammar cache, and kept. Subsequent requests for
+    the same kind of parser get a clone of the kept parser, which is much
+    cheaper than building it again.
+
     *compile_mode* is one of:
 
     * "lambda": is for the grammar that can appear in lambda statements.
@@ -89,6 +155,43 @@ def get_python_parser(
     See https://docs.python.org/3/library/functions.html#compile for an
     explanation of the different modes.
     """
+    try:
+        key = (
+            tuple(version[:2]),
+            compile_mode,
+            python_implementation,
+            tuple(sorted(debug_parser.items())),
+        )
+        hash(key)
+    except TypeError:
+        # Some debug value can't be hashed; don't cache.
+        return build_python_parser(
+            version, debug_parser, compile_mode, python_implementation
+        )
+
+    p = _parser_cache.get(key)
+    if p is None:
+        parser_class = get_parser_class(version, compile_mode, python_implementation)
+        p = load_parser(parser_class, debug_parser)
+        if p is None:
+            p = build_python_parser(
+                version, dict(debug_parser), compile_mode, python_implementation
+            )
+            save_parser(p, debug_parser)
+        _parser_cache[key] = p
+    return p.clone()
+
+
+def get_parser_class(
+    version,
+    compile_mode="exec",
+    python_implementation=PythonImplementation.CPython,
+) -> type:
+    """
+    Returns the parser class for Python version 3.7, 3.8, etc. and
+    compile mode `compile_mode`. See get_python_parser() for a description
+    of the compile modes.
+    """
 
     # FIXME: there has to be a better way...
     # We could do this as a table lookup, but that would force us
@@ -100,55 +203,69 @@ def get_python_parser(
         raise RuntimeError(f"Unsupported Python version {version}")
     elif version == (3, 7):
         if compile_mode == "exec":
-            p = Python37ParserExec(debug_parser=debug_parser)
+            parser_class = Python37ParserExec
         elif compile_mode == "single":
-            p = Python37ParserSingle(debug_parser=debug_parser)
+            parser_class = Python37ParserSingle
         elif compile_mode == "lambda":
-            p = Python37ParserLambda(debug_parser=debug_parser)
+            parser_class = Python37ParserLambda
         elif compile_mode == "eval":
-            p = Python37ParserEval(debug_parser=debug_parser)
+            parser_class = Python37ParserEval
         elif compile_mode == "expr":
-            p = Python37ParserExpr(debug_parser=debug_parser)
+            parser_class = Python37ParserExpr
         else:
-            p = Python37ParserSingle(debug_parser)
+            parser_class = Python37ParserSingle
     elif version == (3, 8):
         if compile_mode == "exec":
             if python_implementation is PythonImplementation.PyPy:
-                p = Python38PyPyParserExec(debug_parser=debug_parser)
+                parser_class = Python38PyPyParserExec
             else:
-                p = Python38ParserExec(debug_parser=debug_parser)
+                parser_class = Python38ParserExec
 
         elif compile_mode == "single":
             if python_implementation is PythonImplementation.PyPy:
-                p = Python38PyPyParserSingle(debug_parser=debug_parser)
+                parser_class = Python38PyPyParserSingle
             else:
-                p = Python38ParserSingle(debug_parser=debug_parser)
+                parser_class = Python38ParserSingle
         elif compile_mode == "lambda":
             if python_implementation is PythonImplementation.PyPy:
-                p = Python38PyPyParserLambda(debug_parser=debug_parser)
+                parser_class = Python38PyPyParserLambda
             else:
-                p = Python38ParserLambda(debug_parser=debug_parser)
+                parser_class = Python38ParserLambda
         elif compile_mode == "eval":
             if python_implementation is PythonImplementation.PyPy:
-                p = Python38PyPyParserEval(debug_parser=debug_parser)
+                parser_class = Python38PyPyParserEval
             else:
-                p = Python38ParserEval(debug_parser=debug_parser)
+                parser_class = Python38ParserEval
         elif compile_mode == "expr":
             if python_implementation is PythonImplementation.PyPy:
-                p = Python38PyPyParserExpr(debug_parser=debug_parser)
+                parser_class = Python38PyPyParserExpr
             else:
-                p = Python38ParserExpr(debug_parser=debug_parser)
+                parser_class = Python38ParserExpr
         elif python_implementation is PythonImplementation.PyPy:
-            p = Python38PyPyParserSingle(debug_parser)
+            parser_class = Python38PyPyParserSingle
         else:
-            p = Python38ParserSingle(debug_parser)
+            parser_class = Python38ParserSingle
 
     elif version > (3, 8):
         raise RuntimeError(
             f"""Version {version_tuple_to_str(version)} is not supported."""
         )
+    return parser_class
 
-    p.version = version
+
+def build_python_parser(
+    version,
+    debug_parser=PARSER_DEFAULT_DEBUG,
+    compile_mode="exec",
+    python_implementation=PythonImplementation.CPython,
+):
+    """
+    Build a new parser from its grammar rules. Parameters are the same as
+    in get_python_parser(), which is usually what you want to call instead.
+    """
+    parser_class = get_parser_class(version, compile_mode, python_implementation)
+    p = parser_class(debug_parser=debug_parser)
+    p.version = version[:2]
     # p.dump_grammar() # debug
     return p
 
@@ -185,7 +302,8 @@ def python_parser(
     from decompyle3.scanner import get_scanner
 
     scanner = get_scanner(version, python_implementation)
-    tokens, customize = scanner.ingest(co)
+    scanned = scanner.scan(co)
+    tokens, customize = list(scanned.tokens), dict(scanned.customize)
     maybe_show_asm(showasm, tokens)
 
     # For heavy grammar debugging
@@ -198,11 +316,7 @@ def python_parser(
         python_implementation=PYTHON_IMPLEMENTATION,
     )
 
-    # FIXME: have p.insts update in a better way
-    # modularity is broken here
-    p.insts = scanner.insts
-    p.offset2inst_index = scanner.offset2inst_index
-    p.opc = scanner.opc
+    p.set_scanned_code(scanned)
 
     return parse(p, tokens, customize, is_lambda)
 
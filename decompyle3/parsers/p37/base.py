@@ -633,6 +633,29 @@ class Python37BaseParser(PythonBaseParser):
                     nop_func,
                 )
                 custom_ops_processed.add(opname)
+            elif opname == "GET_ANEXT" and not self.is_lambda:
+                # The code for an async comprehension has GET_ANEXT but not
+                # the GET_AITER of the code that calls it, so add the rules
+                # that GET_AITER adds for parsing the comprehension's code.
+                self.addRule(
+                    """
+                    stmt                ::= genexpr_func_async
+
+                    func_async_middle   ::= POP_BLOCK JUMP_FORWARD COME_FROM_EXCEPT
+                                            DUP_TOP LOAD_GLOBAL COMPARE_OP POP_JUMP_IF_TRUE
+                                            END_FINALLY COME_FROM
+                    func_async_middle   ::= POP_BLOCK JUMP_FORWARD COME_FROM_EXCEPT
+                                            DUP_TOP LOAD_GLOBAL COMPARE_OP POP_JUMP_IF_TRUE
+                                            END_FINALLY _come_froms
+
+                    list_afor2          ::= func_async_prefix
+                                            store func_async_middle list_iter
+                                            JUMP_LOOP COME_FROM
+                                            POP_TOP POP_TOP POP_TOP POP_EXCEPT POP_TOP
+                   """,
+                    nop_func,
+                )
+                custom_ops_processed.add(opname)
             elif opname == "JUMP_IF_NOT_DEBUG":
                 v = token.attr
                 self.addRule(
@@ -46,6 +46,7 @@ class Python38LambdaCustom(Python38BaseParser):
                 "BEFORE",
                 "BUILD",
                 "CALL",
+                "CONST",
                 "DICT",
                 "GET",
                 "FORMAT",
@@ -183,6 +184,21 @@ class Python38LambdaCustom(Python38BaseParser):
                             expr                ::= const_list
                         """
                 self.addRule(rule, nop_func)
+            elif opname in ("CONST_LIST", "CONST_DICT", "CONST_SET"):
+                # A constant collection that the scanner has made into one token.
+                if opname == "CONST_DICT":
+                    rule = f"""
+                            const_list          ::= {opname}
+                            dict                ::= const_list
+                            expr                ::= dict
+                            """
+                else:
+                    rule = f"""
+                            const_list          ::= {opname}
+                            expr                ::= const_list
+                            """
+                self.addRule(rule, nop_func)
+                custom_ops_processed.add(opname)
             elif opname_base in (
                 "BUILD_LIST",
                 "BUILD_SET",
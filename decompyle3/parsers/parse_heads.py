@@ -25,6 +25,9 @@ and start-symbol grammar rule.
 # The below adds a special "start" rule for the kind of thing that we want to
 # decompile
 
+import os
+import re
+import threading
 from typing import Union
 
 from spark_parser import GenericASTBuilder
@@ -151,6 +154,208 @@ class PythonBaseParser(GenericASTBuilder):
         self.add_unique_rules(rules, customize)
         return
 
+    def clone(self):
+        """
+        Return a copy of this parser that has its own copy of the grammar.
+
+        Customizing the grammar of the copy, or parsing with it, leaves this
+        parser untouched, so an uncustomized parser can be kept around and
+        cloned instead of re-collecting all of the grammar rules from
+        the docstrings of the p_* methods.
+        """
+        cls = self.__class__
+        new = cls.__new__(cls)
+        for name, value in self.__dict__.items():
+            if isinstance(value, (dict, list, set)):
+                value = value.copy()
+            new.__dict__[name] = value
+
+        # Spark's coverage information is accumulated over all parsers.
+        new.profile_info = self.profile_info
+
+        new.rules = {lhs: list(rules) for lhs, rules in self.rules.items()}
+
+        # Copies start out with the same grammar, so the Earley tables for
+        # a given customization can be shared among them. Spark fills in
+        # these tables as it parses, so copies used in different threads
+        # get different tables.
+        if self.thread_grammar_tables is None:
+            self.thread_grammar_tables = threading.local()
+        new.thread_grammar_tables = self.thread_grammar_tables
+        tables = getattr(self.thread_grammar_tables, "tables", None)
+        if tables is None:
+            tables = self.thread_grammar_tables.tables = {}
+        new.grammar_tables = tables
+
+        # The semantic actions that build tree nodes are closures over
+        # the parser they were created in; rebind them to the copy.
+        for rule, func in self.rule2func.items():
+            if rule[0] != self._START:
+                new.rule2func[rule] = new.preprocess(rule, func)[1]
+        return new
+
+    # Grammar customization for a code object is recorded so that it
+    # can be undone once that code object has been parsed. Otherwise the
+    # grammar keeps growing with the rules needed by every code object
+    # that the parser has seen, and each Earley step gets slower.
+
+    # While customizing, the list of changes made to the grammar,
+    # oldest first; None when we are not recording changes.
+    grammar_delta = None
+
+    # Earley tables computed for customized grammars, keyed by the
+    # changes made to the uncustomized grammar, least-recently used first.
+    grammar_tables = None
+
+    # A threading.local() whose "tables" attribute is the grammar_tables
+    # of the copies of this parser made in that thread. These go away
+    # with the thread.
+    thread_grammar_tables = None
+    GRAMMAR_TABLES_CACHE_SIZE = 32
+
+    # Attributes that customization may change in place or replace and
+    # that we restore from a copy when the customization is undone.
+    customization_attrs = (
+        "check_reduce",
+        "list_like_nt",
+        "new_rules",
+        "optional_nt",
+        "reduce_check_table",
+    )
+
+    def begin_customization(self) -> None:
+        """
+        Start recording the changes made to the grammar so that
+        undo_customization() can take them back out again.
+        """
+        assert self.grammar_delta is None, "grammar customization is already active"
+        if self.grammar_tables is None:
+            self.grammar_tables = {}
+        self.grammar_delta = []
+        self._added_candidates = []
+        self._saved_attrs = {
+            name: getattr(self, name).copy()
+            for name in self.customization_attrs
+            if hasattr(self, name)
+        }
+
+    def end_customization(self) -> None:
+        """
+        Stop recording grammar changes. If the grammar has been customized
+        in this way before, reuse the Earley tables that spark computed
+        for it then.
+        """
+        self._added_candidates = []
+        if self.ruleschanged:
+            key = self._delta_key()
+            tables = self.grammar_tables.pop(key, None)
+            if tables is not None:
+                # Move to the most-recently used end.
+                self.grammar_tables[key] = tables
+                (
+                    self.nullable,
+                    self.newrules,
+                    self.new2old,
+                    self.edges,
+                    self.cores,
+                    self.states,
+                ) = tables
+                self.ruleschanged = False
+
+    def undo_customization(self) -> None:
+        """
+        Return the grammar and the tables used in reduction checks to the
+        way they were before begin_customization() was called.
+        """
+        delta = self.grammar_delta
+        if delta is None:
+            return
+        self._added_candidates = []
+
+        if delta and not self.ruleschanged and hasattr(self, "states"):
+            key = self._delta_key()
+            if key not in self.grammar_tables:
+                if len(self.grammar_tables) >= self.GRAMMAR_TABLES_CACHE_SIZE:
+                    del self.grammar_tables[next(iter(self.grammar_tables))]
+                self.grammar_tables[key] = (
+                    self.nullable,
+                    self.newrules,
+                    self.new2old,
+                    self.edges,
+                    self.cores,
+                    self.states,
+                )
+
+        for change in reversed(delta):
+            if change[0] == "add":
+                _, rule, new_lhs = change
+                lhs = rule[0]
+                self.rules[lhs].pop()
+                if new_lhs:
+                    del self.rules[lhs]
+                del self.rule2func[rule]
+                del self.rule2name[rule]
+            else:
+                _, rule, index, func, name = change
+                self.rules[rule[0]].insert(index, rule)
+                self.rule2func[rule] = func
+                self.rule2name[rule] = name
+        if delta:
+            self.ruleschanged = True
+
+        for name, value in self._saved_attrs.items():
+            setattr(self, name, value)
+        self.grammar_delta = None
+
+    def _delta_key(self) -> tuple:
+        return tuple(change[:3] for change in self.grammar_delta)
+
+    def addRule(self, doc, func, _preprocess=True):
+        GenericASTBuilder.addRule(self, doc, func, _preprocess)
+        if self.grammar_delta is not None:
+            # preprocess() has noted the rules that weren't in the grammar;
+            # those that are there now have been added.
+            for rule, new_lhs in self._added_candidates:
+                if rule in self.rule2name:
+                    self.grammar_delta.append(("add", rule, new_lhs))
+            self._added_candidates = []
+
+    def preprocess(self, rule, func):
+        if self.grammar_delta is not None and rule not in self.rule2name:
+            self._added_candidates.append((rule, rule[0] not in self.rules))
+        return GenericASTBuilder.preprocess(self, rule, func)
+
+    def remove_rules(self, doc):
+        if self.grammar_delta is None:
+            return GenericASTBuilder.remove_rules(self, doc)
+
+        # Note where each rule was so that it can be put back there.
+        # This follows the way spark picks apart the rules in "doc".
+        doc = os.linesep.join(
+            [s for s in doc.splitlines() if s and not re.match(r"^\s*#", s)]
+        )
+        words = doc.split()
+        index = [i - 1 for i, word in enumerate(words) if word == "::="]
+        index.append(len(words))
+        for i in range(len(index) - 1):
+            lhs = words[index[i]]
+            rule = (lhs, tuple(words[index[i] + 2 : index[i + 1]]))
+            if lhs not in self.rules:
+                return
+            if rule in self.rules[lhs]:
+                self.grammar_delta.append(
+                    (
+                        "remove",
+                        rule,
+                        self.rules[lhs].index(rule),
+                        self.rule2func[rule],
+                        self.rule2name[rule],
+                    )
+                )
+                GenericASTBuilder.remove_rules(self, f"{lhs} ::= {' '.join(rule[1])}")
+
+    remove_rule = remove_rules
+
     def cleanup(self):
         """
         Remove recursive references to allow garbage
@@ -261,6 +466,15 @@ class PythonBaseParser(GenericASTBuilder):
             rv = GenericASTBuilder.nonterminal(self, nt, args)
         return rv
 
+    def set_scanned_code(self, scanned) -> None:
+        """
+        Use the instructions and tables of `scanned`, a ScannedCode, for
+        the tokens parsed next.
+        """
+        self.insts = scanned.insts
+        self.offset2inst_index = scanned.offset2inst_index
+        self.opc = scanned.opc
+
     def off2inst(self, token):
         """
         Return the corresponding instruction for this token
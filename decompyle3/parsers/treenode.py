@@ -19,59 +19,75 @@ class SyntaxTree(spark_AST):
         return self.__repr1__("", None)
 
     def __repr1__(self, indent, sibNum=None) -> str:
-        rv = str(self.kind)
-        if sibNum is not None:
-            rv = "%2d. %s" % (sibNum, rv)
-        enumerate_children = False
-        if len(self) > 1:
-            rv += " (%d)" % (len(self))
-            enumerate_children = True
-        if self.transformed_by is not None:
-            rv += f" (transformed by {self.transformed_by})"
-            pass
-        rv = indent + rv
-        indent += "    "
-        i = 0
-        for node in self:
-            if hasattr(node, "__repr1__"):
-                if enumerate_children:
-                    child = node.__repr1__(indent, i)
-                else:
-                    child = node.__repr1__(indent, None)
-            else:
+        # The tree is walked with an explicit stack, not by recursion, so
+        # that deeply-nested trees can be shown.
+        lines = []
+        stack = [(self, indent, sibNum)]
+        while stack:
+            node, indent, sibNum = stack.pop()
+            if not isinstance(node, SyntaxTree):
                 inst = node.format(line_prefix="")
                 if inst.startswith("\n"):
                     # Nuke leading \n
                     inst = inst[1:]
-                if enumerate_children:
-                    child = indent + "%2d. %s" % (i, inst)
-                else:
-                    child = indent + inst
+                if sibNum is not None:
+                    inst = "%2d. %s" % (sibNum, inst)
+                lines.append(indent + inst)
+                continue
+
+            rv = str(node.kind)
+            if sibNum is not None:
+                rv = "%2d. %s" % (sibNum, rv)
+            enumerate_children = False
+            if len(node) > 1:
+                rv += " (%d)" % (len(node))
+                enumerate_children = True
+            if node.transformed_by is not None:
+                rv += f" (transformed by {node.transformed_by})"
                 pass
-            rv += "\n" + child
-            i += 1
-        return rv
+            lines.append(indent + rv)
+            indent += "    "
+            for i in range(len(node) - 1, -1, -1):
+                stack.append((node[i], indent, i if enumerate_children else None))
+        return "\n".join(lines)
 
     def first_child(self):
-        for child in self:
+        for child in tree_tokens(self):
             if isinstance(child, Token):
                 return child
-            if child is not None:
-                child = child.first_child()
-                if isinstance(child, Token):
-                    return child
-                pass
         return None
 
     def last_child(self):
-        if len(self) > 0:
+        node = self
+        while len(node) > 0:
             child_index = -1
-            child = self[-1]
+            child = node[-1]
             while isinstance(child, SyntaxTree) and len(child) == 0:
                 # Skip over empty nonterminal reductions
                 child_index -= 1
-                child = self[child_index]
+                child = node[child_index]
             if not isinstance(child, SyntaxTree):
                 return child
-            return child.last_child()
-        return self
+            node = child
+        return node
+
+
+def tree_tokens(tree, skip_kinds=()):
+    """
+    Yield the leaves of `tree`, first to last, which are Tokens (or
+    None). Subtrees whose kind is in `skip_kinds` are not looked into.
+
+    The tree is walked with an explicit stack rather than by recursion,
+    so how deeply a tree can nest isn't limited by the Python stack.
+    """
+    stack = [iter(tree)]
+    while stack:
+        for node in stack[-1]:
+            if isinstance(node, SyntaxTree):
+                if node.kind not in skip_kinds:
+                    stack.append(iter(node))
+                    break
+            else:
+                yield node
+        else:
+            stack.pop()
@@ -0,0 +1,257 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Content-addressed cache of decompilation results.
+
+The same bytecode often shows up many times: byte-identical .pyc files
+installed in several virtual environments, vendored packages, and small
+functions that appear over and over. Rather than decompile these again,
+we can save the source text that was produced for them under a hash of
+the code object and the things that go into decompiling it, and reuse
+that text the next time the same code object is seen.
+
+Results are kept in files below $DECOMPYLE3_CACHE_DIR/results, or
+$XDG_CACHE_HOME/decompyle3/results or ~/.cache/decompyle3/results; see
+decompyle3.parsers.grammar_cache.cache_dir(). When the total size of the
+files goes over a limit, the least-recently used files are removed.
+"""
+
+import hashlib
+import os
+import os.path as osp
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+
+from xdis import iscode
+from xdis.version_info import version_tuple_to_str
+
+from decompyle3.parsers.grammar_cache import cache_dir
+from decompyle3.version import __version__ as VERSION
+
+# Change this when the format of what we save changes.
+RESULT_CACHE_FORMAT = 1
+
+# Default limit on the total size of the files in the cache.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Number of recently used results that are also kept in memory.
+MEMORY_CACHE_ENTRIES = 512
+
+
+def _update_hash(h, co, first_line: int) -> None:
+    h.update(co.co_code)
+    for name in (
+        "co_argcount",
+        "co_posonlyargcount",
+        "co_kwonlyargcount",
+        "co_nlocals",
+        "co_flags",
+    ):
+        h.update(b"%d," % getattr(co, name, 0))
+    for name in ("co_names", "co_varnames", "co_freevars", "co_cellvars"):
+        h.update(("\0".join(getattr(co, name, ())) + "\1").encode("utf-8"))
+    h.update(co.co_name.encode("utf-8") + b"\1")
+
+    # Line-number information matters only relative to the code object
+    # at the root, so that the same code at a different place in a file
+    # gets the same hash.
+    h.update(b"%d," % (co.co_firstlineno - first_line))
+    h.update(getattr(co, "co_lnotab", b"") or b"")
+
+    for const in co.co_consts:
+        _update_const_hash(h, const, first_line)
+    h.update(b"\2")
+
+
+def _update_const_hash(h, const, first_line: int) -> None:
+    if iscode(const):
+        h.update(b"code(")
+        _update_hash(h, const, first_line)
+        h.update(b")")
+    elif isinstance(const, (tuple, list)):
+        h.update(f"{type(const).__name__}(".encode("utf-8"))
+        for item in const:
+            _update_const_hash(h, item, first_line)
+        h.update(b")")
+    elif isinstance(const, frozenset):
+        # The iteration order of a frozenset can change from one run to
+        # the next.
+        h.update(b"frozenset(")
+        for item in sorted(repr(item) for item in const):
+            h.update(item.encode("utf-8", "surrogatepass") + b"\1")
+        h.update(b")")
+    else:
+        h.update(f"{type(const).__name__}:{const!r}\1".encode("utf-8", "surrogatepass"))
+
+
+def code_hash(co, version: tuple, python_implementation, *extra) -> str:
+    """
+    Return a hash of code object `co`, including the code objects nested
+    in it, for bytecode version `version` from `python_implementation`.
+    `extra` are further values that decompiling the code depends on.
+    """
+    h = hashlib.sha256()
+    h.update(
+        f"{RESULT_CACHE_FORMAT} {VERSION} {version_tuple_to_str(version)} "
+        f"{python_implementation} {extra!r}\n".encode("utf-8")
+    )
+    _update_hash(h, co, co.co_firstlineno)
+    return h.hexdigest()
+
+
+class RecordingStream:
+    """
+    A file-like object that passes writes on to `out` and keeps a list
+    of them. Everything else is handled by `out`.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.writes = []
+
+    def write(self, s: str):
+        self.writes.append(s)
+        return self.out.write(s)
+
+    def __getattr__(self, name: str):
+        return getattr(self.out, name)
+
+
+class ResultCache:
+    """
+    A store of decompilation results keyed by the strings that
+    code_hash() returns.
+
+    When `directory` is None, the results directory under cache_dir() is
+    used; when caching has been turned off there, results are kept
+    only in memory.
+    """
+
+    def __init__(
+        self, directory: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE
+    ):
+        self.directory = cache_dir("results") if directory is None else directory
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.hits = self.misses = 0
+
+        # Total size of the files in the directory; computed the first
+        # time it is needed.
+        self.size = None
+
+    def _path(self, key: str) -> str:
+        return osp.join(self.directory, key[:2], key[2:])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the result saved under `key`, or None if there isn't one.
+        """
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return data
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as fp:
+                    data = fp.read()
+                # Note that this entry has been used.
+                os.utime(path)
+            except OSError:
+                data = None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Save `data` as the result for `key`.
+        """
+        self._remember(key, data)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            # A result written before for the same key is replaced.
+            old_size = os.stat(path).st_size
+        except OSError:
+            old_size = 0
+        try:
+            os.makedirs(osp.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename it so that other
+            # processes never see a partially-written file.
+            fd, tmp_path = tempfile.mkstemp(dir=osp.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fp:
+                    fp.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            # Caching is an optimization; not being able to write is okay.
+            return
+
+        if self.size is None:
+            self.size = self._disk_usage()[0]
+        else:
+            self.size += len(data) - old_size
+        if self.size > self.max_size:
+            self.prune()
+
+    def _remember(self, key: str, data: bytes) -> None:
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        if len(self.memory) > MEMORY_CACHE_ENTRIES:
+            self.memory.popitem(last=False)
+
+    def _disk_usage(self):
+        size = 0
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = osp.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                size += st.st_size
+                entries.append((st.st_mtime, st.st_size, path))
+        return size, entries
+
+    def prune(self) -> None:
+        """
+        Remove the least-recently used results until the cache uses no
+        more than 3/4 of its maximum size.
+        """
+        if self.directory is None:
+            return
+        size, entries = self._disk_usage()
+        entries.sort()
+        target = self.max_size * 3 // 4
+        for _, file_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= file_size
+        self.size = size
@@ -24,17 +24,17 @@ scanners, e.g. for Python 3.7 or 3.8.
 import importlib
 from abc import ABC
 from array import array
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from types import ModuleType
+from types import MappingProxyType, ModuleType
 from typing import Optional, Union
 
 import xdis
 from xdis import (
     Bytecode,
     canonic_python_version,
-    code2num,
-    extended_arg_val,
     instruction_size,
+    iscode,
     next_offset,
 )
 from xdis.version_info import (
@@ -44,6 +44,7 @@ from xdis.version_info import (
 )
 
 from decompyle3.scanners.tok import Token
+from decompyle3.timings import phase
 
 # The byte code versions we support.
 # Note: these all have to be tuples
@@ -61,23 +62,221 @@ def long(num):
     return num
 
 
+class JumpLabels(set):
+    """
+    The offsets that instructions jump to. xdis adds to its list of labels
+    with append().
+    """
+
+    append = set.add
+
+
+class LinearLabelOpcodes:
+    """
+    Stands in for an opcode module when xdis decodes instructions.
+
+    xdis keeps the offsets that are jumped to in a list, and looks up each
+    instruction's offset in it. That takes time proportional to the number
+    of jumps for every instruction, which is slow for large functions with
+    thousands of branches. Here the offsets are found in one pass and kept
+    in a set.
+    """
+
+    def __init__(self, opc):
+        self.opc = opc
+
+    def __getattr__(self, name):
+        return getattr(self.opc, name)
+
+    def findlabels(self, code: bytes, opc) -> JumpLabels:
+        opc = self.opc
+        labels = JumpLabels()
+        extended_arg = 0
+        # 3.7 and 3.8 instructions are two bytes: an opcode and its argument.
+        for offset in range(0, len(code), 2):
+            op = code[offset]
+            if op < opc.HAVE_ARGUMENT:
+                continue
+            arg = code[offset + 1] | extended_arg
+            extended_arg = (arg << 8) if op == opc.EXTENDED_ARG else 0
+            if op in opc.JREL_OPS:
+                labels.add(offset + 2 + arg)
+            elif op in opc.JABS_OPS:
+                labels.add(arg)
+        return labels
+
+
+LineTuple = namedtuple("LineTuple", ["l_no", "next"])
+
+
+class OffsetIndex:
+    """
+    Maps the offset of each instruction, and of the bytes inside it, to
+    the instruction's index in a scanner's ``insts`` list.
+
+    This is used like a dict from offsets to indices, but is kept in an
+    array with one entry per two-byte code unit rather than in a dict
+    with an entry per offset. Offsets that aren't in the table raise
+    KeyError, just as a dict would.
+    """
+
+    __slots__ = ("indices",)
+
+    def __init__(self, codelen: int):
+        self.indices = array("i", [-1]) * ((codelen + 1) // 2)
+
+    def __getitem__(self, offset: int) -> int:
+        try:
+            if offset >= 0 and not offset & 1:
+                index = self.indices[offset >> 1]
+                if index >= 0:
+                    return index
+        except (IndexError, TypeError):
+            pass
+        raise KeyError(offset)
+
+    def __setitem__(self, offset: int, index: int):
+        if offset < 0 or offset & 1:
+            raise KeyError(offset)
+        self.indices[offset >> 1] = index
+
+    def __contains__(self, offset) -> bool:
+        try:
+            self[offset]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, offset, default=None):
+        try:
+            return self[offset]
+        except KeyError:
+            return default
+
+
+class LineTable:
+    """
+    Gives, for each offset in a code object, a LineTuple of the line
+    number of the instruction there and the offset of the start of the
+    next line.
+
+    This is used like a list indexed by offset, but only the offsets that
+    start lines and their line numbers are stored.
+    """
+
+    __slots__ = ("starts", "line_numbers", "codelen")
+
+    def __init__(self, linestarts: list, codelen: int):
+        self.starts = array("i", (offset for offset, _ in linestarts))
+        self.line_numbers = array("i", (line_no for _, line_no in linestarts))
+        self.codelen = codelen
+
+    def __len__(self) -> int:
+        return self.codelen
+
+    def __getitem__(self, offset: int) -> LineTuple:
+        codelen = self.codelen
+        if offset < 0:
+            offset += codelen
+        if not 0 <= offset < codelen:
+            raise IndexError("line table index out of range")
+        # Offsets before the first line start belong to the first line.
+        i = max(bisect_right(self.starts, offset) - 1, 0)
+        next_start = self.starts[i + 1] if i + 1 < len(self.starts) else codelen
+        return LineTuple(self.line_numbers[i], next_start)
+
+
+class ScannedCode:
+    """
+    What scanning one code object gives: its instructions, the tables
+    used to look them up, its tokens and its "customize" dictionary.
+
+    A scanner keeps these only until it scans the next code object. A
+    ScannedCode keeps them for as long as the code object is being
+    decompiled, and they can't be changed afterwards, so the parser and
+    the semantic actions can use them without saving and restoring
+    scanner state around nested code objects.
+
+    The tokens themselves are still changed by parsing and the semantic
+    actions, so code that parses them takes a copy of the token list.
+    """
+
+    __slots__ = (
+        "co",
+        "opc",
+        "code",
+        "insts",
+        "offset2inst_index",
+        "lines",
+        "linestarts",
+        "tokens",
+        "customize",
+    )
+
+    def __init__(self, co, scanner, tokens: list, customize: dict):
+        values = {
+            "co": co,
+            "opc": scanner.opc,
+            "code": scanner.code,
+            "insts": tuple(scanner.insts),
+            "offset2inst_index": scanner.offset2inst_index,
+            "lines": scanner.lines,
+            "linestarts": MappingProxyType(scanner.linestarts),
+            "tokens": tuple(tokens),
+            "customize": MappingProxyType(dict(customize)),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __getstate__(self) -> dict:
+        state = {name: getattr(self, name) for name in self.__slots__}
+        # Memory views and mapping proxies can't be pickled.
+        state["code"] = bytes(self.code)
+        state["linestarts"] = dict(self.linestarts)
+        state["customize"] = dict(self.customize)
+        return state
+
+    def __setstate__(self, state: dict):
+        state["code"] = memoryview(state["code"])
+        state["linestarts"] = MappingProxyType(state["linestarts"])
+        state["customize"] = MappingProxyType(state["customize"])
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"{self.__class__.__name__} can't be changed")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{self.__class__.__name__} can't be changed")
+
+
 class Code:
     """
     Class for representing code-objects.
 
     This is similar to the original code object, but additionally
     the diassembled code is stored in the attribute '_tokens'.
-    """
 
-    def __init__(self, co, scanner, classname=None, show_asm=None):
-        # Full initialization is given below, but for linters
-        # well set up some initial values.
-        self.co_code = None  # Really either bytes for >= 3.0 and string in < 3.0
+    The co_* attributes are those of the code object; the results of
+    scanning it are in the attribute 'scanned'. If the code object has
+    already been scanned, its ScannedCode can be passed as `scanned`.
+    """
 
-        for i in dir(co):
-            if i.startswith("co_"):
-                setattr(self, i, getattr(co, i))
-        self._tokens, self._customize = scanner.ingest(co, classname, show_asm=show_asm)
+    def __init__(self, co, scanner, classname=None, show_asm=None, scanned=None):
+        self.co = co
+        if scanned is None:
+            with phase("ingest", co):
+                scanned = scanner.scan(co, classname, show_asm=show_asm)
+        self.scanned = scanned
+        self._tokens = list(self.scanned.tokens)
+        self._customize = dict(self.scanned.customize)
+
+    def __getattr__(self, name: str):
+        if name.startswith("co_"):
+            return getattr(self.co, name)
+        raise AttributeError(
+            f"{self.__class__.__name__!r} object has no attribute {name!r}"
+        )
 
 
 class Scanner(ABC):
@@ -112,31 +311,103 @@ class Scanner(ABC):
         """
         # FIXME: remove this when all subsidiary functions have been removed.
         # We should be able to get everything from the self.insts list.
-        self.code = array("B", co.co_code)
+        # A memoryview reads the opcodes in place instead of copying them.
+        self.code = memoryview(co.co_code)
 
-        bytecode = Bytecode(co, self.opc)
+        bytecode = Bytecode(co, LinearLabelOpcodes(self.opc))
         self.build_prev_op()
         self.insts = self.remove_extended_args(list(bytecode))
         self.lines = self.build_lines_data(co)
-        self.offset2inst_index = {}
+        self.offset2inst_index = OffsetIndex(len(self.code))
+        indices = self.offset2inst_index.indices
         for i, inst in enumerate(self.insts):
-            self.offset2inst_index[inst.offset] = i
-            offset = inst.offset
-            inst_size = inst.inst_size
-            while inst_size > 0:
-                self.offset2inst_index[offset] = i
-                offset += 2
-                inst_size -= 2
+            first = inst.offset >> 1
+            indices[first] = i
+            for j in range(first + 1, first + (inst.inst_size >> 1)):
+                indices[j] = i
+        self.build_opcode_index()
 
         return bytecode
 
+    def build_opcode_index(self):
+        """
+        Index the code by opcode, so that first_instr(), last_instr(),
+        all_instr() and inst_matches() can find the instructions in a
+        range of offsets by bisection rather than by looking at each
+        instruction in the range.
+
+        self.opcode_offsets maps each opcode to the offsets in self.code
+        where it appears, and self.jump_sources maps each jump target to
+        the offsets of the jumps to it. self.opcode_insts maps each
+        opcode to the indices of the instructions in self.insts that
+        have it, and self.inst_offsets gives the offset of each.
+        """
+        code = self.code
+        opc = self.opc
+        jump_ops = opc.JREL_OPS | opc.JABS_OPS
+        self.opcode_offsets = opcode_offsets = {}
+        self.jump_sources = jump_sources = {}
+        extended_arg = 0
+        # 3.7 and 3.8 instructions are two bytes: an opcode and its argument.
+        for offset in range(0, len(code), 2):
+            op = code[offset]
+            offsets = opcode_offsets.get(op)
+            if offsets is None:
+                offsets = opcode_offsets[op] = array("i")
+            offsets.append(offset)
+            if op < opc.HAVE_ARGUMENT:
+                continue
+            arg = code[offset + 1] | extended_arg
+            extended_arg = (arg << 8) if op == opc.EXTENDED_ARG else 0
+            if op in jump_ops:
+                target = arg if op in opc.JABS_OPS else offset + 2 + arg
+                sources = jump_sources.get(target)
+                if sources is None:
+                    sources = jump_sources[target] = array("i")
+                sources.append(offset)
+
+        self.opcode_insts = opcode_insts = {}
+        for i, inst in enumerate(self.insts):
+            indices = opcode_insts.get(inst.opcode)
+            if indices is None:
+                indices = opcode_insts[inst.opcode] = array("i")
+            indices.append(i)
+        self.inst_offsets = array("i", (inst.offset for inst in self.insts))
+
+    def find_opcodes(self, start: int, end: int, instr, target=None) -> list:
+        """
+        Return the offsets from start up to end, in order, of the
+        instructions whose opcode is in `instr`. If `target` is given and
+        all of `instr` are jumps, only the jumps to `target` are returned.
+        """
+        ops = set(instr)
+        if target is not None and ops <= self.opc.JREL_OPS | self.opc.JABS_OPS:
+            sources = self.jump_sources.get(target, ())
+            code = self.code
+            return [
+                offset
+                for offset in sources[
+                    bisect_left(sources, start) : bisect_left(sources, end)
+                ]
+                if code[offset] in ops
+            ]
+        found = []
+        for op in ops:
+            offsets = self.opcode_offsets.get(op)
+            if offsets:
+                found.extend(
+                    offsets[bisect_left(offsets, start) : bisect_left(offsets, end)]
+                )
+        if len(ops) > 1:
+            found.sort()
+        return found
+
     def build_lines_data(self, code_obj):
         """
         Generate various line-related helper data.
         """
 
         # Offset: lineno pairs, only for offsets which start line.
-        # Locally we use list for more convenient iteration using indices
         linestarts = list(self.opc.findlinestarts(code_obj))
         self.linestarts = dict(linestarts)
         if not self.linestarts:
@@ -144,27 +415,7 @@ class Scanner(ABC):
 
         # 'List-map' which shows line number of current op and offset of
         # first op on following line, given offset of op as index
-        lines = []
-        LineTuple = namedtuple("LineTuple", ["l_no", "next"])
-
-        # Iterate through available linestarts, and fill
-        # the data for all code offsets encountered until
-        # last linestart offset
-        _, prev_line_no = linestarts[0]
-        offset = 0
-        for start_offset, line_no in linestarts[1:]:
-            while offset < start_offset:
-                lines.append(LineTuple(prev_line_no, start_offset))
-                offset += 1
-            prev_line_no = line_no
-
-        # Fill remaining offsets with reference to last line number
-        # and code length as start offset of following non-existing line
-        codelen = len(self.code)
-        while offset < codelen:
-            lines.append(LineTuple(prev_line_no, codelen))
-            offset += 1
-        return lines
+        return LineTable(linestarts, len(self.code))
 
     def build_prev_op(self):
         """
@@ -175,11 +426,10 @@ class Scanner(ABC):
         codelen = len(code)
         # 2.x uses prev 3.x uses prev_op. Sigh
         # Until we get this sorted out.
-        self.prev = self.prev_op = [0]
+        self.prev = self.prev_op = array("i", [0])
         for offset in self.op_range(0, codelen):
             op = code[offset]
-            for _ in range(instruction_size(op, self.opc)):
-                self.prev_op.append(offset)
+            self.prev_op.extend((offset,) * instruction_size(op, self.opc))
 
     def is_jump_forward(self, offset: int) -> bool:
         """
@@ -200,6 +450,37 @@ class Scanner(ABC):
         """
         raise NotImplementedError("This method should have been implemented")
 
+    def scan(self, co, classname=None, code_objects={}, show_asm=None) -> ScannedCode:
+        """
+        Tokenize code object `co` as ingest() does, and return everything
+        that came from it in a ScannedCode.
+        """
+        tokens, customize = self.ingest(co, classname, code_objects, show_asm)
+        return ScannedCode(co, self, tokens, customize)
+
+    def scan_tree(self, co, code_objects={}, show_asm=None) -> dict:
+        """
+        Scan `co` and every code object nested in its constants, however
+        deeply. The result maps the id() of each code object to its
+        ScannedCode; the ScannedCode keeps its code object alive, so the
+        ids stay valid for as long as the result is around.
+
+        Code objects are scanned in the order that they appear, outermost
+        first. A code object that appears more than once is scanned once.
+        """
+        scanned_codes = {}
+        stack = [co]
+        while stack:
+            code = stack.pop()
+            if id(code) in scanned_codes:
+                continue
+            with phase("ingest", code):
+                scanned_codes[id(code)] = self.scan(
+                    code, code_objects=code_objects, show_asm=show_asm
+                )
+            stack.extend(reversed([c for c in code.co_consts if iscode(c)]))
+        return scanned_codes
+
     def prev_offset(self, offset: int) -> int:
         return self.insts[self.offset2inst_index[offset] - 1].offset
 
@@ -280,19 +561,17 @@ class Scanner(ABC):
 
         result_offset = None
         current_distance = len(code)
-        for offset in self.op_range(start, end):
-            op = code[offset]
-            if op in instr:
-                if target is None:
-                    return offset
-                dest = self.get_target(offset)
-                if dest == target:
-                    return offset
-                elif not exact:
-                    new_distance = abs(target - dest)
-                    if new_distance < current_distance:
-                        current_distance = new_distance
-                        result_offset = offset
+        for offset in self.find_opcodes(start, end, instr, target if exact else None):
+            if target is None:
+                return offset
+            dest = self.get_target(offset)
+            if dest == target:
+                return offset
+            elif not exact:
+                new_distance = abs(target - dest)
+                if new_distance < current_distance:
+                    current_distance = new_distance
+                    result_offset = offset
         return result_offset
 
     def last_instr(
@@ -318,36 +597,26 @@ class Scanner(ABC):
         if not isinstance(instr, list):
             instr = [instr]
 
+        # EXTENDED_ARGs are part of the instruction that follows them.
+        instr = [op for op in instr if op != self.opc.EXTENDED_ARG]
+        offsets = self.find_opcodes(start, end, instr, target if exact else None)
+        if target is None:
+            return offsets[-1] if offsets else None
+
         result_offset = None
         current_distance = self.insts[-1].offset - self.insts[0].offset
-        extended_arg = 0
-        # FIXME: use self.insts rather than code[]
-        for offset in self.op_range(start, end):
-            op = code[offset]
-
-            if op == self.opc.EXTENDED_ARG:
-                arg = code2num(code, offset + 1) | extended_arg
-                extended_arg = extended_arg_val(self.opc, arg)
-                continue
-
-            if op in instr:
-                if target is None:
+        for offset in offsets:
+            dest = self.get_target(offset)
+            if dest == target:
+                current_distance = 0
+                result_offset = offset
+            elif not exact:
+                new_distance = abs(target - dest)
+                if new_distance <= current_distance:
+                    current_distance = new_distance
                     result_offset = offset
-                else:
-                    dest = self.get_target(offset, extended_arg)
-                    if dest == target:
-                        current_distance = 0
-                        result_offset = offset
-                    elif not exact:
-                        new_distance = abs(target - dest)
-                        if new_distance <= current_distance:
-                            current_distance = new_distance
-                            result_offset = offset
-                            pass
-                        pass
                     pass
                 pass
-            extended_arg = 0
             pass
         return result_offset
 
@@ -366,22 +635,32 @@ class Scanner(ABC):
             instr = [instr]
 
         first = self.offset2inst_index[start]
+        # The first instruction at or after `end` is included.
+        last = bisect_left(self.inst_offsets, end, first) + 1
+        indices = []
+        for op in set(instr):
+            op_indices = self.opcode_insts.get(op)
+            if op_indices:
+                indices.extend(
+                    op_indices[
+                        bisect_left(op_indices, first) : bisect_left(op_indices, last)
+                    ]
+                )
+        indices.sort()
+
         result = []
-        for inst in self.insts[first:]:
-            if inst.opcode in instr:
-                if target is None:
+        for i in indices:
+            inst = self.insts[i]
+            if target is None:
+                result.append(inst.offset)
+            else:
+                t = self.get_target(inst.offset)
+                if include_beyond_target and t >= target:
+                    result.append(inst.offset)
+                elif t == target:
                     result.append(inst.offset)
-                else:
-                    t = self.get_target(inst.offset)
-                    if include_beyond_target and t >= target:
-                        result.append(inst.offset)
-                    elif t == target:
-                        result.append(inst.offset)
-                        pass
                     pass
                 pass
-            if isinstance(inst.offset, int) and inst.offset >= end:
-                break
             pass
 
         # FIXME: put in a test
@@ -411,29 +690,20 @@ class Scanner(ABC):
         if not isinstance(instr, list):
             instr = [instr]
 
+        # EXTENDED_ARGs are part of the instruction that follows them.
+        instr = [op for op in instr if op != self.opc.EXTENDED_ARG]
         result = []
-        extended_arg = 0
-        for offset in self.op_range(start, end):
-            op = code[offset]
-
-            if op == self.opc.EXTENDED_ARG:
-                arg = code2num(code, offset + 1) | extended_arg
-                extended_arg = extended_arg_val(self.opc, arg)
-                continue
-
-            if op in instr:
-                if target is None:
+        for offset in self.find_opcodes(start, end, instr):
+            if target is None:
+                result.append(offset)
+            else:
+                t = self.get_target(offset)
+                if include_beyond_target and t >= target:
+                    result.append(offset)
+                elif t == target:
                     result.append(offset)
-                else:
-                    t = self.get_target(offset, extended_arg)
-                    if include_beyond_target and t >= target:
-                        result.append(offset)
-                    elif t == target:
-                        result.append(offset)
-                        pass
                     pass
                 pass
-            extended_arg = 0
             pass
 
         return result
@@ -467,10 +737,13 @@ class Scanner(ABC):
                 and i + 1 < n
                 and instructions[i + 1].opname != "MAKE_FUNCTION"
             ):
+                # With more than one EXTENDED_ARG, the instruction
+                # starts at the first.
+                if not last_was_extarg:
+                    starts_line = inst.starts_line
+                    is_jump_target = inst.is_jump_target
+                    offset = inst.offset
                 last_was_extarg = True
-                starts_line = inst.starts_line
-                is_jump_target = inst.is_jump_target
-                offset = inst.offset
                 continue
             if last_was_extarg:
                 # j = self.stmts.index(inst.offset)
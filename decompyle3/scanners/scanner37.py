@@ -22,12 +22,10 @@ This sets up opcodes Python's 3.7 and calls a generalized
 scanner routine for Python 3.
 """
 
-from typing import Tuple
-
 # bytecode verification, verify(), uses JUMP_OPs from here
 from xdis.opcodes import opcode_37 as opc
 
-from decompyle3.scanners.scanner37base import Scanner37Base
+from decompyle3.scanners.scanner37base import COLLECTION_VALUE_KINDS, Scanner37Base
 
 # bytecode verification, verify(), uses JUMP_OPS from here
 JUMP_OPs = opc.JUMP_OPS
@@ -41,9 +39,7 @@ class Scanner37(Scanner37Base):
 
     pass
 
-    def ingest(
-        self, bytecode, classname=None, code_objects={}, show_asm=None
-    ) -> Tuple[list, dict]:
+    def ingest_tokens(self, bytecode, classname=None, code_objects={}, show_asm=None):
         """
         Create "tokens" the bytecode of an Python code object. Largely these
         are the opcode name, but in some cases that has been modified to make parsing
@@ -64,12 +60,21 @@ class Scanner37(Scanner37Base):
         which will cause custom grammar rules. Specifically, variable
         arg tokens like MAKE_FUNCTION or BUILD_LIST cause specific rules
         for the specific number of arguments they take.
+
+        This is a generator, like Scanner37Base.ingest_tokens().
         """
-        tokens, customize = Scanner37Base.ingest(
-            self, bytecode, classname, code_objects, show_asm
-        )
+        # Tokens since the last one that can't be the value in a
+        # constant collection, and the tokens that we turned them into.
+        # Only these can become part of a collection.
+        tokens = []
         new_tokens = []
-        for i, t in enumerate(tokens):
+        for t in Scanner37Base.ingest_tokens(
+            self, bytecode, classname, code_objects, show_asm
+        ):
+            if t.kind in COLLECTION_VALUE_KINDS:
+                tokens.append(t)
+                new_tokens.append(t)
+                continue
             # things that smash new_tokens like BUILD_LIST have to come first.
             if t.op in (
                 self.opc.BUILD_CONST_KEY_MAP,
@@ -81,9 +86,12 @@ class Scanner37(Scanner37Base):
                     if t.kind.startswith("BUILD_CONST_KEY_MAP")
                     else t.kind.split("_")[1]
                 )
-                new_tokens = self.bound_collection_from_tokens(
-                    tokens, new_tokens, t, i, f"CONST_{collection_type}"
+                tokens.append(t)
+                yield from self.bound_collection_from_tokens(
+                    tokens, new_tokens, t, len(tokens) - 1, f"CONST_{collection_type}"
                 )
+                tokens = []
+                new_tokens = []
                 continue
 
             # The lowest bit of flags indicates whether the
@@ -103,9 +111,12 @@ class Scanner37(Scanner37Base):
                 t.kind = "BUILD_MAP_UNPACK_WITH_CALL_%d" % t.attr
             elif (not self.is_pypy) and t.op == self.opc.BUILD_TUPLE_UNPACK_WITH_CALL:
                 t.kind = "BUILD_TUPLE_UNPACK_WITH_CALL_%d" % t.attr
-            new_tokens.append(t)
+            yield from new_tokens
+            yield t
+            tokens = []
+            new_tokens = []
 
-        return new_tokens, customize
+        yield from new_tokens
 
 
 if __name__ == "__main__":
@@ -30,7 +30,10 @@ Finally we save token information.
 """
 
 import sys
-from typing import Any, Dict, List, Set, Tuple
+from array import array
+from bisect import insort
+from heapq import heappop, heappush
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
 
 import xdis
 
@@ -46,6 +49,44 @@ globals().update(op3.opmap)
 
 CONST_COLLECTIONS = ("CONST_LIST", "CONST_SET", "CONST_DICT")
 
+# Kinds of tokens which can be turned into the values of a constant
+# collection by bound_collection_from_tokens().
+COLLECTION_VALUE_KINDS = frozenset(
+    (
+        "LOAD_CODE",
+        "LOAD_CONST",
+        "LOAD_FAST",
+        "LOAD_GLOBAL",
+        "LOAD_NAME",
+        "LOAD_STR",
+    )
+)
+
+# Kinds of tokens which are the values of a constant collection that
+# bound_collection_from_tokens() collapses into a single token.
+CONST_VALUE_KINDS = frozenset(("LOAD_CONST", "LOAD_STR"))
+
+
+class ConstCollection(NamedTuple):
+    """
+    The "attr" of a CONST_LIST, CONST_SET or CONST_DICT token: a
+    collection of constants which bound_collection_from_tokens() has
+    collapsed into a single token, so the parser doesn't see a token for
+    each value.
+    """
+
+    # The source text of each value
+    values: tuple
+    # The line number that each value starts, or None
+    linestarts: tuple
+    # The keys of a dictionary; empty for lists and sets
+    keys: tuple
+
+
+# The number of the most recent tokens that ingest_tokens() may still
+# change or remove after adding a token.
+TOKEN_LOOKBACK = 3
+
 
 class Scanner37Base(Scanner):
     def __init__(
@@ -53,6 +94,7 @@ class Scanner37Base(Scanner):
     ):
         super(Scanner37Base, self).__init__(version, show_asm, is_pypy)
         self.offset2tok_index = None
+        self.customize = {}
         self.debug = debug
 
         # True is code is from PyPy
@@ -189,12 +231,24 @@ class Scanner37Base(Scanner):
 
     def bound_collection_from_tokens(
         self, tokens: list, next_tokens: list, t: Token, i: int, collection_type: str
-    ):
+    ) -> list:
+        """
+        Add collection token `t`, which is `tokens[i]`, to the end of
+        `next_tokens`, the tokens that `tokens` turned into.
+
+        If the collection is made only of constant values, its value
+        tokens at the end of `next_tokens` are replaced by a
+        COLLECTION_START token, ADD_VALUE tokens and a BUILD_CONST_...
+        token. `next_tokens` is changed in place and then returned, so
+        nothing before the collection's tokens is copied.
+
+        When all of the values are constants, the collection's tokens
+        are instead replaced by a single token whose kind is
+        `collection_type` and whose "attr" is a ConstCollection.
+        """
         count = t.attr
         assert isinstance(count, int)
 
-        assert count <= i
-
         if collection_type == "CONST_DICT":
             # constant dictionaries work via BUILD_CONST_KEY_MAP and
             # handle the values() like sets and lists.
@@ -204,26 +258,37 @@ class Scanner37Base(Scanner):
 
         # For small lists don't bother
         if count < 5:
-            return next_tokens + [t]
+            next_tokens.append(t)
+            return next_tokens
 
         collection_start = i - count
 
+        # `tokens` may be only the most recent tokens, starting after the
+        # last one that can't be a collection value.
+        if collection_start < 0:
+            next_tokens.append(t)
+            return next_tokens
+
         for j in range(collection_start, i):
-            if tokens[j].kind not in (
-                "LOAD_CODE",
-                "LOAD_CONST",
-                "LOAD_FAST",
-                "LOAD_GLOBAL",
-                "LOAD_NAME",
-                "LOAD_STR",
-            ):
-                return next_tokens + [t]
+            if tokens[j].kind not in COLLECTION_VALUE_KINDS:
+                next_tokens.append(t)
+                return next_tokens
+
+        if all(tokens[j].kind in CONST_VALUE_KINDS for j in range(collection_start, i)):
+            del next_tokens[-count:]
+            next_tokens.append(
+                self.const_collection_token(
+                    tokens[collection_start:i], t, collection_type
+                )
+            )
+            return next_tokens
 
         collection_enum = CONST_COLLECTIONS.index(collection_type)
 
         # If we get here, all instructions before tokens[i] are LOAD_CONST, and
         # we can add a boundary marker and change LOAD_CONST to something else.
-        new_tokens = next_tokens[:-count]
+        del next_tokens[-count:]
+        new_tokens = next_tokens
         start_offset = tokens[collection_start].offset
         new_tokens.append(
             Token(
@@ -265,7 +330,46 @@ class Scanner37Base(Scanner):
         )
         return new_tokens
 
-    def ingest(self, co, classname=None, code_objects={}, show_asm=None):
+    def const_collection_token(
+        self, value_tokens: list, t: Token, collection_type: str
+    ) -> Token:
+        """
+        Return the single token for the constant collection built by
+        token `t` from the constants loaded by `value_tokens`.
+        """
+        offset = value_tokens[0].offset
+        keys = ()
+        if collection_type == "CONST_DICT":
+            keys = value_tokens[-1].attr
+            value_tokens = value_tokens[:-1]
+        return Token(
+            opname=collection_type,
+            attr=ConstCollection(
+                values=tuple(
+                    token.pattr if isinstance(token.attr, str) else str(token.attr)
+                    for token in value_tokens
+                ),
+                linestarts=tuple(token.linestart for token in value_tokens),
+                keys=keys,
+            ),
+            pattr=collection_type,
+            offset=offset,
+            has_arg=True,
+            opc=self.opc,
+            has_extended_arg=False,
+        )
+
+    def ingest(
+        self, co, classname=None, code_objects={}, show_asm=None
+    ) -> Tuple[list, dict]:
+        """
+        Return the list of tokens that ingest_tokens() gives for code
+        object `co`, and the "customize" dictionary that goes with them.
+        """
+        tokens = list(self.ingest_tokens(co, classname, code_objects, show_asm))
+        return tokens, self.customize
+
+    def ingest_tokens(self, co, classname=None, code_objects={}, show_asm=None):
         """Create "tokens" the bytecode of a Python code object. Largely these
         are the opcode name, but in some cases that has been modified to make parsing
         easier.
@@ -286,17 +390,19 @@ class Scanner37Base(Scanner):
         arg tokens like MAKE_FUNCTION or BUILD_LIST cause specific
         rules for the specific number of arguments they take./src/external-vcs/github/rocky/python-decompile3
 
+        This is a generator: tokens are given in order as soon as they
+        can no longer change, and self.customize is complete once the
+        last token has been given.
         """
 
         def tokens_append(j, token):
             tokens.append(token)
             self.offset2tok_index[token.offset] = j
-            j += 1
-            assert j == len(tokens)
-            return j
+            return j + 1
 
         if not show_asm:
             show_asm = self.show_asm
+        show_tokens = show_asm in ("both", "after") and self.version < (3, 8)
 
         bytecode = self.build_instructions(co)
 
@@ -312,7 +418,7 @@ class Scanner37Base(Scanner):
             )
 
         # "customize" is in the process of going away here
-        customize = {}
+        self.customize = customize = {}
 
         if self.is_pypy:
             customize["PyPy"] = 0
@@ -322,7 +428,8 @@ class Scanner37Base(Scanner):
         # 'LOAD_ASSERT' is used in assert statements.
         self.load_asserts = set()
 
-        # list of tokens/instructions
+        # The most recent tokens, which may still be changed; earlier
+        # tokens have been given to our caller.
         tokens = []
         self.offset2tok_index = {}
 
@@ -397,8 +504,18 @@ class Scanner37Base(Scanner):
 
         last_op_was_break = False
 
+        if show_tokens:
+            print("\n# ---- tokenization:")
+
         j = 0
         for i, inst in enumerate(self.insts):
+            while len(tokens) > TOKEN_LOOKBACK:
+                token = tokens.pop(0)
+                if show_tokens:
+                    # FIXME: t.format() is changing tokens!
+                    print(token.format(line_prefix=""))
+                yield token
+
             argval = inst.argval
             op = inst.opcode
 
@@ -682,13 +799,13 @@ class Scanner37Base(Scanner):
 
             pass
 
-        if show_asm in ("both", "after") and self.version < (3, 8):
-            print("\n# ---- tokenization:")
-            # FIXME: t.format() is changing tokens!
-            for t in tokens.copy():
-                print(t.format(line_prefix=""))
+        for token in tokens:
+            if show_tokens:
+                # FIXME: t.format() is changing tokens!
+                print(token.format(line_prefix=""))
+            yield token
+        if show_tokens:
             print()
-        return tokens, customize
 
     def find_jump_targets(self, debug: str) -> dict:
         """
@@ -703,6 +820,7 @@ class Scanner37Base(Scanner):
         code = self.code
         n = len(code)
         self.structs = [{"type": "root", "start": 0, "end": n - 1}]
+        self.reset_struct_sweep()
 
         # All loop entry points
         self.loops: List[int] = []
@@ -737,10 +855,10 @@ class Scanner37Base(Scanner):
                     label = self.fixed_jumps.get(offset)
 
                 if label is not None and label != -1:
-                    targets[label] = targets.get(label, []) + [offset]
+                    targets.setdefault(label, []).append(offset)
             elif op == self.opc.END_FINALLY and offset in self.fixed_jumps:
                 label = self.fixed_jumps[offset]
-                targets[label] = targets.get(label, []) + [offset]
+                targets.setdefault(label, []).append(offset)
                 pass
 
             pass  # for loop
@@ -790,7 +908,7 @@ class Scanner37Base(Scanner):
             stmt_offset_list = prelim
         # 'List-map' which contains offset of start of
         # next statement, when op offset is passed as index
-        self.next_stmt = slist = []
+        self.next_stmt = slist = array("i")
         last_stmt_offset = -1
         i = 0
         # Go through all statement offsets
@@ -837,11 +955,69 @@ class Scanner37Base(Scanner):
                     continue
             # Add to list another list with offset of current statement,
             # equal to length of previous statement
-            slist += [stmt_offset] * (stmt_offset - i)
+            slist.extend((stmt_offset,) * (stmt_offset - i))
             last_stmt_offset = stmt_offset
             i = stmt_offset
         # Finish filling the list for last statement
-        slist += [codelen] * (codelen - len(slist))
+        slist.extend((codelen,) * (codelen - len(slist)))
+
+    def reset_struct_sweep(self) -> None:
+        """
+        Start over the sweep that parent_struct() makes through
+        self.structs.
+        """
+        # Indices of structs that may contain offsets from here on,
+        # in order of their start offset.
+        self.pending_structs: List[Tuple[int, int]] = []
+        # Number of structs in self.structs that have been put in
+        # self.pending_structs or self.active_structs.
+        self.structs_seen = 0
+        # Indices, in increasing order, of the structs that contain
+        # the last offset asked about.
+        self.active_structs: List[int] = []
+        self.struct_sweep_offset = -1
+
+    def parent_struct(self, offset: int) -> Dict[str, Any]:
+        """
+        Return the innermost structure in self.structs that contains
+        `offset`.
+
+        When structures overlap without nesting, the one picked is the
+        one that a walk through self.structs in order would settle on.
+        Offsets are usually asked about in increasing order; then
+        only the structures that contain the offset are looked at, so
+        the time taken depends on how deeply structures are nested, not
+        on how many there are.
+        """
+        structs = self.structs
+        if offset < self.struct_sweep_offset:
+            self.reset_struct_sweep()
+        self.struct_sweep_offset = offset
+
+        pending = self.pending_structs
+        for index in range(self.structs_seen, len(structs)):
+            heappush(pending, (structs[index]["start"], index))
+        self.structs_seen = len(structs)
+
+        active = self.active_structs
+        while pending and pending[0][0] <= offset:
+            insort(active, heappop(pending)[1])
+        # A structure that ends at or before this offset can't contain any
+        # offset asked about later either.
+        active[:] = [index for index in active if offset < structs[index]["end"]]
+
+        parent = structs[0]
+        start = parent["start"]
+        end = parent["end"]
+        for index in active:
+            struct = structs[index]
+            current_start = struct["start"]
+            current_end = struct["end"]
+            if current_start >= start and current_end <= end:
+                start = current_start
+                end = current_end
+                parent = struct
+        return parent
 
     def detect_control_flow(self, offset: int, inst_index: int):
         """
@@ -853,23 +1029,9 @@ class Scanner37Base(Scanner):
         inst = self.insts[inst_index]
         op = inst.opcode
 
-        # Detect parent structure
-        parent: Dict[str, Any] = self.structs[0]
-        start: int = parent["start"]
-        end: int = parent["end"]
-
-        # Pick innermost parent for our offset
-        for struct in self.structs:
-            current_start = struct["start"]
-            current_end = struct["end"]
-            if (current_start <= offset < current_end) and (
-                current_start >= start and current_end <= end
-            ):
-                start = current_start
-                end = current_end
-                parent = struct
-
         if self.version < (3, 8) and op == self.opc.SETUP_LOOP:
+            parent = self.parent_struct(offset)
+            start = parent["start"]
             # We categorize loop types: 'for', 'while', 'while 1' with
             # possibly suffixes '-loop' and '-else'
             # Try to find the jump_back instruction of the loop.
@@ -983,7 +1145,7 @@ class Scanner37Base(Scanner):
 
         elif self.version < (3, 8) and op == self.opc.SETUP_EXCEPT:
             target = self.get_target(offset)
-            end = self.restrict_to_parent(target, parent)
+            end = self.restrict_to_parent(target, self.parent_struct(offset))
             self.fixed_jumps[offset] = end
         elif self.version < (3, 8) and op == self.opc.POP_EXCEPT:
             next_offset = xdis.next_offset(op, self.opc, offset)
@@ -1000,7 +1162,7 @@ class Scanner37Base(Scanner):
 
         elif op == self.opc.SETUP_FINALLY:
             target = self.get_target(offset)
-            end = self.restrict_to_parent(target, parent)
+            end = self.restrict_to_parent(target, self.parent_struct(offset))
             self.fixed_jumps[offset] = end
         elif op in self.jump_if_pop:
             target = self.get_target(offset)
@@ -1011,7 +1173,9 @@ class Scanner37Base(Scanner):
                 if unop_target and code[unop_target + 3] != self.opc.ROT_TWO:
                     self.fixed_jumps[offset] = unop_target
                 else:
-                    self.fixed_jumps[offset] = self.restrict_to_parent(target, parent)
+                    self.fixed_jumps[offset] = self.restrict_to_parent(
+                        target, self.parent_struct(offset)
+                    )
                     pass
                 pass
         else:
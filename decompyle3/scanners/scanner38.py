@@ -22,7 +22,7 @@ This sets up opcodes Python's 3.8 and calls a generalized
 scanner routine for Python 3.7 and up.
 """
 
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 # bytecode verification, verify(), uses JUMP_OPs from here
 from xdis.opcodes import opcode_38 as opc
@@ -43,9 +43,7 @@ class Scanner38(Scanner37):
 
     pass
 
-    def ingest(
-        self, bytecode, classname=None, code_objects={}, show_asm=None
-    ) -> Tuple[list, dict]:
+    def ingest_tokens(self, bytecode, classname=None, code_objects={}, show_asm=None):
         """
         Create "tokens" the bytecode of an Python code object. Largely these
         are the opcode name, but in some cases that has been modified to make parsing
@@ -63,9 +61,15 @@ class Scanner38(Scanner37):
         Also, when we encounter certain tokens, we add them to a set which will cause custom
         grammar rules. Specifically, variable arg tokens like MAKE_FUNCTION or BUILD_LIST
         cause specific rules for the specific number of arguments they take.
+
+        This is a generator, like Scanner37Base.ingest_tokens(). Loops
+        are found from the jumps back to their start, so the tokens
+        from Scanner37 are all gathered before any are given.
         """
-        tokens, customize = super(Scanner38, self).ingest(
-            bytecode, classname, code_objects, show_asm
+        tokens = list(
+            super(Scanner38, self).ingest_tokens(
+                bytecode, classname, code_objects, show_asm
+            )
         )
 
         # Hacky way to detect loop ranges.  The key in
@@ -86,7 +90,10 @@ class Scanner38(Scanner37):
         loop_ends: List[int] = []
         next_end = tokens[len(tokens) - 1].off2int() + 10
 
-        new_tokens = []
+        show_tokens = show_asm in ("both", "after")
+        if show_tokens:
+            print("\n# ---- tokenization:")
+
         for token in tokens:
             opname = token.kind
             offset = token.offset
@@ -124,7 +131,10 @@ class Scanner38(Scanner37):
                         # Not a forward-enough jump to break out of the
                         # next loop, so continue.  FIXME: Do we need
                         # "continue" detection?
-                        new_tokens.append(token)
+                        if show_tokens:
+                            # FIXME: t.format() is changing tokens!
+                            print(token.format(line_prefix=""))
+                        yield token
                         continue
 
                     # We also want to avoid confusing BREAK_LOOPS with parts of the
@@ -166,17 +176,14 @@ class Scanner38(Scanner37):
                         token.kind = "BREAK_LOOP"
                     pass
                 pass
-            new_tokens.append(token)
+            if show_tokens:
+                # FIXME: t.format() is changing tokens!
+                print(token.format(line_prefix=""))
+            yield token
 
-        if show_asm in ("both", "after"):
-            print("\n# ---- tokenization:")
-            # FIXME: t.format() is changing tokens!
-            for t in new_tokens.copy():
-                print(t.format(line_prefix=""))
+        if show_tokens:
             print()
 
-        return new_tokens, customize
-
 
 if __name__ == "__main__":
     from xdis.version_info import PYTHON_VERSION_TRIPLE, version_tuple_to_str
@@ -45,14 +45,42 @@ def off2int(offset: int, prefer_last=True) -> int:
             return offset_1
 
 
+# The opcode module of the running Python, for tokens created without
+# one. It is found the first time it is needed.
+_std_opc = None
+
+
 class Token:
     """
     Class representing a byte-code instruction.
 
     A byte-code token is equivalent to Python 3's dis.instruction or
     the contents of one line as output by dis.dis().
+
+    Tokens are the most numerous objects made in decompiling, so their
+    attributes are kept in slots rather than in a per-instance
+    dictionary. The semantic actions set "parent", "start", "finish" and
+    "transformed_by" on some tokens; until then, these are unset.
     """
 
+    __slots__ = (
+        "attr",
+        "has_arg",
+        "kind",
+        "linestart",
+        "offset",
+        "op",
+        "opc",
+        "optype",
+        "pattr",
+        "start_offset",
+        "tos_str",
+        "parent",
+        "start",
+        "finish",
+        "transformed_by",
+    )
+
     # FIXME: match Python 3.4's terms:
     #    linestart = starts_line
     #    attr = argval
@@ -91,22 +119,25 @@ class Token:
             self.pattr = None
 
         if opc is None:
-            try:
-                from xdis.std import _std_api
-            except KeyError as e:
-                print(f"I don't know about Python version {e} yet.")
+            global _std_opc
+            if _std_opc is None:
                 try:
-                    version_tuple = tuple(int(i) for i in str(e)[1:-1].split("."))
-                except Exception:
-                    pass
-                else:
-                    if version_tuple > (3, 9):
-                        print("Python versions 3.9 and greater are not supported.")
+                    from xdis.std import _std_api
+                except KeyError as e:
+                    print(f"I don't know about Python version {e} yet.")
+                    try:
+                        version_tuple = tuple(int(i) for i in str(e)[1:-1].split("."))
+                    except Exception:
+                        pass
                     else:
-                        print(f"xdis might need to be informed about version {e}")
-                return
+                        if version_tuple > (3, 9):
+                            print("Python versions 3.9 and greater are not supported.")
+                        else:
+                            print(f"xdis might need to be informed about version {e}")
+                    return
+                _std_opc = _std_api.opc
 
-            self.opc = _std_api.opc
+            self.opc = _std_opc
         else:
             self.opc = opc
         if op is None:
@@ -222,4 +253,31 @@ class Token:
         return off2int(self.offset, prefer_last)
 
 
+class TokenNamespace(dict):
+    """
+    The names in a token, for evaluating %{...} template expressions
+    with it. Tokens have no __dict__, so names are looked up as
+    attributes of the token as they are needed.
+    """
+
+    __slots__ = ("token",)
+
+    def __init__(self, token: Token):
+        self.token = token
+
+    def __missing__(self, name: str):
+        try:
+            return getattr(self.token, name)
+        except AttributeError:
+            raise KeyError(name)
+
+
+def eval_namespace(node) -> dict:
+    """
+    Return the namespace that %{...} template expressions are evaluated
+    in for `node`, a token or a syntax tree node.
+    """
+    return TokenNamespace(node) if isinstance(node, Token) else node.__dict__
+
+
 NoneToken = Token("LOAD_CONST", offset=-1, attr=None, pattr=None)
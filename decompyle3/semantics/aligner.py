@@ -139,7 +139,8 @@ def code_deparse_align(
     # store final output stream for case of error
     scanner = get_scanner(version, is_pypy=is_pypy)
 
-    tokens, customize = scanner.ingest(co, code_objects=code_objects)
+    scanned = scanner.scan(co, code_objects=code_objects)
+    tokens, customize = list(scanned.tokens), dict(scanned.customize)
     show_asm = debug_opts.get("asm", None)
     maybe_show_asm(show_asm, tokens)
 
@@ -162,6 +163,7 @@ def code_deparse_align(
         is_pypy=is_pypy,
     )
 
+    deparsed.scanned = scanned
     is_top_level_module = co.co_name == "<module>"
     deparsed.ast = deparsed.build_ast(
         tokens, customize, co, is_top_level_module=is_top_level_module
@@ -22,19 +22,27 @@ FIXME idea: extend parsing system to do same kinds of checks or nonterminal
 before reduction and don't reduce when there is a problem.
 """
 
+# Kinds of nodes whose children are in a loop start with one of these.
+LOOP_KIND_PREFIXES = ("while", "async_for", "for")
 
-def checker(ast, in_loop: bool, errors) -> None:
-    if ast is None:
-        return
 
-    in_loop = (
-        in_loop
-        or ast.kind.startswith("while")
-        or ast.kind.startswith("async_for")
-        or ast.kind.startswith("for")
-    )
-    if ast.kind in ("aug_assign1", "aug_assign2") and ast[0][0] == "and":
-        text = str(ast)
+def check_node(node, in_loop: bool, errors) -> bool:
+    """
+    Check parse tree node `node`, adding the mistakes found to
+    `errors`. `in_loop` tells whether `node` is inside a loop. Return
+    whether the children of `node` are.
+
+    TreeTransform calls this for each node as it walks the parse tree,
+    so the tree isn't walked again just to check it.
+    """
+    kind = node.kind
+    if not in_loop and kind in ("continue", "break"):
+        text = str(node)
+        error_text = "\n# not in loop:\n#\t" + "\n# ".join(text.split("\n"))
+        errors.append(error_text)
+
+    if kind in ("aug_assign1", "aug_assign2") and node[0][0] == "and":
+        text = str(node)
         error_text = (
             "\n# improper augmented assignment (e.g. +=, *=, ...):\n#\t"
             + "\n# ".join(text.split("\n"))
@@ -42,10 +50,22 @@ def checker(ast, in_loop: bool, errors) -> None:
         )
         errors.append(error_text)
 
-    for node in ast:
-        if not in_loop and node.kind in ("continue", "break"):
-            text = str(node)
-            error_text = "\n# not in loop:\n#\t" + "\n# ".join(text.split("\n"))
-            errors.append(error_text)
-        if hasattr(node, "__repr1__"):
-            checker(node, in_loop, errors)
+    return in_loop or kind.startswith(LOOP_KIND_PREFIXES)
+
+
+def checker(ast, in_loop: bool, errors) -> None:
+    if ast is None:
+        return
+
+    # The tree is walked with an explicit stack rather than by recursion.
+    # Each entry is an iterator over the children of a node and whether
+    # they are in a loop.
+    stack = [(iter(ast), check_node(ast, in_loop, errors))]
+    while stack:
+        children, in_loop = stack[-1]
+        for node in children:
+            if hasattr(node, "__repr1__"):
+                stack.append((iter(node), check_node(node, in_loop, errors)))
+                break
+        else:
+            stack.pop()
@@ -50,9 +50,13 @@ PARENTHESIS_ALWAYS = -2
 # fmt: off
 PRECEDENCE = {
     "named_expr":             40,  # :=
-    "dict_unpack":            38,  # **kwargs
     "list_unpack":            38,  # *args
     "yield_from":             38,
+
+    # f"...". This has to be below "named_expr" to make f'{(x := 10)}'
+    # preserve parenthesis
+    "formatted_value1":       38,
+    "formatted_value2":       38,  # See above
     "tuple_list_starred":     38,  # *x, *y, *z - about at the level of yield?
     "unpack":                 38,  # A guess. Used in "async with ... as ...
                                    # This might also get used in tuple assignment?
@@ -68,6 +72,8 @@ PRECEDENCE = {
     "if_exp_not":             28,  # IfExp ( a if not x else b)
     "if_exp_true":            28,  # (a if True else b)
     "if_exp_ret":             28,
+    "if_exp_37a":             28,
+    "if_exp_37b":             28,
 
     "or":                     26,  # Boolean OR
 
@@ -108,9 +114,16 @@ PRECEDENCE = {
     "await_expr":             3,   # await x, *
 
     "attribute":              2,   # x.attribute
+    "attribute37":            2,
     "buildslice2":            2,   # x[index]
     "buildslice3":            2,   # x[index:index]
     "call":                   2,   # x(arguments...)
+    "call_ex":                1,
+    "call_ex_kw":             1,
+    "call_ex_kw2":            1,
+    "call_ex_kw3":            1,
+    "call_ex_kw4":            1,
+    "call_kw36":              1,
     "delete_subscript":       2,
     "slice0":                 2,
     "slice1":                 2,
@@ -119,7 +132,9 @@ PRECEDENCE = {
     "store_subscript":        2,
     "subscript":              2,
 
+    "call_kw":                0,
     "dict":                   0,   # {expressions...}
+    "dict_unpack":            0,   # **{...}
     "dict_comp":              0,
     "generator_exp":          0,   # (expressions...)
     "list":                   0,   # [expressions...]
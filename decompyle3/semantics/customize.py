@@ -22,7 +22,6 @@ from decompyle3.semantics.consts import (
     INDENT_PER_LEVEL,
     NO_PARENTHESIS_EVER,
     PRECEDENCE,
-    TABLE_DIRECT,
 )
 from decompyle3.semantics.helper import flatten_list
 
@@ -33,7 +32,7 @@ def customize_for_version(self, python_implementation, version):
         # PyPy changes
         #######################
         # fmt: off
-        TABLE_DIRECT.update(
+        self.TABLE_DIRECT.update(
             {
                 "assert":       ("%|assert %c\n", 0),
                 # This can happen as a result of an if transformation
@@ -111,7 +110,7 @@ def customize_for_version(self, python_implementation, version):
         ########################
         # Without PyPy
         #######################
-        TABLE_DIRECT.update(
+        self.TABLE_DIRECT.update(
             {
                 # "assert" and "assert_expr" are added via transform rules.
                 "assert": ("%|assert %c\n", 0),
@@ -130,7 +129,7 @@ def customize_for_version(self, python_implementation, version):
         )
 
     if version >= (3, 2):
-        TABLE_DIRECT.update(
+        self.TABLE_DIRECT.update(
             {
                 "del_deref_stmt": ("%|del %c\n", 0),
                 "DELETE_DEREF": ("%{pattr}", 0),
@@ -23,12 +23,7 @@ from xdis.version_info import PythonImplementation
 
 from decompyle3.parsers.treenode import SyntaxTree
 from decompyle3.scanners.tok import Token
-from decompyle3.semantics.consts import (
-    INDENT_PER_LEVEL,
-    PRECEDENCE,
-    TABLE_DIRECT,
-    TABLE_R,
-)
+from decompyle3.semantics.consts import INDENT_PER_LEVEL, PRECEDENCE
 from decompyle3.semantics.helper import escape_string, flatten_list, strip_quotes
 
 
@@ -50,25 +45,7 @@ def customize_for_version37(self, version):
     # Python 3.7+ changes
     #######################
 
-    # fmt: off
-    PRECEDENCE["attribute37"]      =   2
-    PRECEDENCE["call_ex"]          =   1
-    PRECEDENCE["call_ex_kw"]       =   1
-    PRECEDENCE["call_ex_kw2"]      =   1
-    PRECEDENCE["call_ex_kw3"]      =   1
-    PRECEDENCE["call_ex_kw4"]      =   1
-    PRECEDENCE["call_kw"]          =   0
-    PRECEDENCE["call_kw36"]        =   1
-    # f"...". This has to be below "named_expr" to make f'{(x := 10)}'
-    # preserve parenthesis
-    PRECEDENCE["formatted_value1"] =  38
-    PRECEDENCE["formatted_value2"] =  38  # See above
-    PRECEDENCE["if_exp_37a"]       =  28
-    PRECEDENCE["if_exp_37b"]       =  28
-    PRECEDENCE["dict_unpack"]      =   0  # **{...}
-
-    # fmt: on
-    TABLE_DIRECT.update(
+    self.TABLE_DIRECT.update(
         {
             "and_parts": (
                 "%P and %p",
@@ -420,7 +397,7 @@ def customize_for_version37(self, version):
         }
     )
 
-    TABLE_R.update(
+    self.TABLE_R.update(
         {
             "CALL_FUNCTION_EX": ("%c(*%P)", 0, (1, 2, ", ", 100)),
             # Not quite right
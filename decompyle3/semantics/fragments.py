@@ -82,18 +82,18 @@ import decompyle3.parsers.main as python_parser
 import decompyle3.parsers.parse_heads as heads
 from decompyle3.parsers.main import get_python_parser
 from decompyle3.parsers.treenode import SyntaxTree
-from decompyle3.scanner import Code, Token, get_scanner
+from decompyle3.scanner import Token, get_scanner
+from decompyle3.scanners.tok import eval_namespace
 from decompyle3.semantics import pysource
 from decompyle3.semantics.check_ast import checker
 from decompyle3.semantics.consts import (
     INDENT_PER_LEVEL,
-    MAP,
     NONE,
     PASS,
     PRECEDENCE,
-    TABLE_DIRECT,
     escape,
 )
+from decompyle3.semantics.helper import find_globals_and_nonlocals
 from decompyle3.semantics.make_function36 import make_function36
 from decompyle3.semantics.pysource import (
     DEFAULT_DEBUG_OPTS,
@@ -195,8 +195,6 @@ class FragmentsWalker(pysource.SourceWalker, object):
         self.last_finish = -1
         self.python_implementation = python_implementation
 
-        # FIXME: is there a better way?
-        self.TABLE_DIRECT = TABLE_DIRECT.copy()
         self.MAP_DIRECT_FRAGMENT = (dict(self.TABLE_DIRECT, **TABLE_DIRECT_FRAGMENT),)
         return
 
@@ -243,13 +241,11 @@ class FragmentsWalker(pysource.SourceWalker, object):
         node.finish = finish
         self.last_finish = finish
 
-    def preorder(self, node=None):
+    def visit(self, node):
         start = len(self.f.getvalue())
-        super(pysource.SourceWalker, self).preorder(node)
+        yield from self.node_steps(node)
         self.set_pos_info(node, start, len(self.f.getvalue()))
 
-        return
-
     def table_r_node(self, node):
         """General pattern where the last node should should
         get the text span attributes of the entire tree"""
@@ -431,7 +427,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
             self.write("(")
             node[0].parent = node
             self.last_finish = len(self.f.getvalue())
-            self.preorder(node[0])
+            yield node[0]
             finish = len(self.f.getvalue())
             if hasattr(node[0], "offset"):
                 self.set_pos_info(node[0], start, len(self.f.getvalue()))
@@ -440,7 +436,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
         else:
             node[0].parent = node
             start = len(self.f.getvalue())
-            self.preorder(node[0])
+            yield node[0]
             if hasattr(node[0], "offset"):
                 self.set_pos_info(node[0], start, len(self.f.getvalue()))
         self.prec = p
@@ -449,7 +445,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
     def n_return_expr(self, node):
         start = len(self.f.getvalue())
-        super(FragmentsWalker, self).n_return_expr(node)
+        yield from super(FragmentsWalker, self).n_return_expr(node)
         self.set_pos_info(node, start, len(self.f.getvalue()))
 
     def n_bin_op(self, node):
@@ -459,7 +455,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
             n.parent = node
         self.last_finish = len(self.f.getvalue())
         try:
-            super(FragmentsWalker, self).n_bin_op(node)
+            yield from super(FragmentsWalker, self).n_bin_op(node)
         except GenericASTTraversalPruningException:
             pass
         self.set_pos_info(node, start, len(self.f.getvalue()))
@@ -643,7 +639,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
         assert iscode(cn.attr)
 
-        code = Code(cn.attr, self.scanner, self.currentclass)
+        code = self.nested_code(cn.attr)
         ast = self.build_ast(code._tokens, code._customize, code)
         self.customize(code._customize)
 
@@ -709,7 +705,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
         assert iscode(code), node[code_index]
         code_name = code.co_name
-        code = Code(code, self.scanner, self.currentclass, self.debug_opts["asm"])
+        code = self.nested_code(code, self.debug_opts["asm"])
 
         ast = self.build_ast(code._tokens, code._customize, code)
 
@@ -832,7 +828,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.nested_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize, code)
         self.customize(code._customize)
         if node == "set_comp":
@@ -962,7 +958,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
         p = self.prec
         self.prec = 27
 
-        code = Code(node[1].attr, self.scanner, self.currentclass)
+        code = self.nested_code(node[1].attr)
         ast = self.build_ast(code._tokens, code._customize, code)
         self.customize(code._customize)
         ast = ast[0][0][0]
@@ -1155,8 +1151,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                         python_implementation=self.python_implementation,
                     )
                 p = self.p_lambda
-                p.insts = self.scanner.insts
-                p.offset2inst_index = self.scanner.offset2inst_index
+                p.set_scanned_code(self.scanned_code(code))
                 parse_tree = python_parser.parse(p, tokens, customize, is_lambda)
                 self.customize(customize)
 
@@ -1196,16 +1191,10 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
         # Build a parse tree from tokenized and massaged disassembly.
         try:
-            # FIXME: have p.insts update in a better way
-            # modularity is broken here
-            p_insts = self.p.insts
-            self.p.insts = self.scanner.insts
-            self.p.offset2inst_index = self.scanner.offset2inst_index
-            self.p.opc = self.scanner.opc
+            self.p.set_scanned_code(self.scanned_code(code))
             parse_tree = python_parser.parse(
                 self.p, tokens, customize, is_lambda=is_lambda
             )
-            self.p.insts = p_insts
         except (heads.ParserError, AssertionError) as e:
             raise ParserError(e, tokens, self.debug_parser.get("reduce", False))
 
@@ -1652,10 +1641,13 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
     n_set = n_tuple = n_build_set = n_list
 
-    def template_engine(self, entry, startnode):
+    def template_steps(self, entry, startnode):
         """The format template interpretation engine.  See the comment at the
         beginning of this module for how we interpret format
         specifications such as %c, %C, and so on.
+
+        This is a generator that yields the nodes to walk; see
+        SourceWalker.run().
         """
 
         # print("-----")
@@ -1685,7 +1677,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                     node = node[int(m.group("child"))]
                     node.parent = startnode
             except Exception:
-                print(node.__dict__)
+                print(eval_namespace(node))
                 raise
 
             if typ == "%":
@@ -1751,7 +1743,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                         {index} is invalid; has only {len(node)} entries
                         """
                     )
-                self.preorder(node[index])
+                yield node[index]
 
                 finish = len(self.f.getvalue())
                 self.set_pos_info(node, start, finish)
@@ -1785,7 +1777,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
 
                 node[index].parent = node
                 start = len(self.f.getvalue())
-                self.preorder(node[index])
+                yield node[index]
                 self.set_pos_info(node, start, len(self.f.getvalue()))
                 self.prec = p
                 arg += 1
@@ -1794,7 +1786,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                 lastC = remaining = len(node[low:high])
                 start = len(self.f.getvalue())
                 for subnode in node[low:high]:
-                    self.preorder(subnode)
+                    yield subnode
                     remaining -= 1
                     if remaining > 0:
                         self.write(sep)
@@ -1807,7 +1799,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                 for subnode in node[low:high]:
                     remaining -= 1
                     if len(subnode) > 0:
-                        self.preorder(subnode)
+                        yield subnode
                         if remaining > 0:
                             self.write(sep)
                             pass
@@ -1828,7 +1820,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                 lastC = remaining = len(node[low:high])
                 start = self.last_finish
                 for subnode in node[low:high]:
-                    self.preorder(subnode)
+                    yield subnode
                     remaining -= 1
                     if remaining > 0:
                         self.write(sep)
@@ -1836,7 +1828,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
                 arg += 1
 
             elif typ == "{":
-                d = node.__dict__
+                d = eval_namespace(node)
                 expr = m.group("expr")
 
                 # Line mapping stuff
@@ -1881,7 +1873,7 @@ class FragmentsWalker(pysource.SourceWalker, object):
             and not hasattr(node[-1], "parent")
         ):
             node[-1].parent = node
-        return MAP.get(node, self.MAP_DIRECT_FRAGMENT)
+        return self.MAP.get(node, self.MAP_DIRECT_FRAGMENT)
 
     pass
 
@@ -1958,7 +1950,8 @@ def code_deparse(
     scanner = get_scanner(version, is_pypy=is_pypy, show_asm=debug_opts["asm"])
 
     show_asm = debug_opts.get("asm", None)
-    tokens, customize = scanner.ingest(co, code_objects=code_objects, show_asm=show_asm)
+    scanned = scanner.scan(co, code_objects=code_objects, show_asm=show_asm)
+    tokens, customize = list(scanned.tokens), dict(scanned.customize)
 
     if start_offset > 0:
         for i, t in enumerate(tokens):
@@ -1989,6 +1982,7 @@ def code_deparse(
         linestarts=linestarts,
     )
 
+    deparsed.scanned = scanned
     is_top_level_module = co.co_name == "<module>"
     deparsed.ast = deparsed.build_ast(
         tokens, customize, co, is_top_level_module=is_top_level_module
@@ -2002,7 +1996,7 @@ def code_deparse(
     # convert leading '__doc__ = "..." into doc string
     assert deparsed.ast == "stmts"
 
-    (deparsed.mod_globs, _) = pysource.find_globals_and_nonlocals(
+    (deparsed.mod_globs, _) = find_globals_and_nonlocals(
         deparsed.ast, set(), set(), co, version
     )
 
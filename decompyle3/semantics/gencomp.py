@@ -24,7 +24,6 @@ from xdis import iscode
 from xdis.version_info import PythonImplementation
 
 from decompyle3.parsers.main import get_python_parser
-from decompyle3.scanner import Code
 from decompyle3.scanners.tok import Token
 from decompyle3.semantics.consts import PRECEDENCE
 from decompyle3.semantics.helper import is_lambda_mode
@@ -167,7 +166,7 @@ class ComprehensionMixin:
 
         assert iscode(cn.attr)
 
-        code = Code(cn.attr, self.scanner, self.currentclass, self.debug_opts["asm"])
+        code = self.nested_code(cn.attr, self.debug_opts["asm"])
 
         # FIXME: is there a way we can avoid this?
         # The problem is that in filter in top-level list comprehensions we can
@@ -701,7 +700,7 @@ class ComprehensionMixin:
         code_obj = code_node.attr
         assert iscode(code_obj), code_node
 
-        code = Code(code_obj, self.scanner, self.currentclass, self.debug_opts["asm"])
+        code = self.nested_code(code_obj, self.debug_opts["asm"])
 
         # FIXME: is there a way we can avoid this?
         # The problem is that in filter in top-level list comprehensions we can
@@ -1,8 +1,9 @@
 import sys
+from typing import NamedTuple
 
 from xdis import iscode
 
-from decompyle3.parsers.treenode import SyntaxTree
+from decompyle3.parsers.treenode import tree_tokens
 
 minint = -sys.maxsize - 1
 maxint = sys.maxsize
@@ -14,6 +15,21 @@ read_global_ops = frozenset(("STORE_GLOBAL", "DELETE_GLOBAL"))
 nonglobal_ops = frozenset(("STORE_DEREF", "DELETE_DEREF"))
 
 
+class TreeNames(NamedTuple):
+    """
+    The variable names that TreeTransform finds in a tree as it
+    transforms it; the same names that find_all_globals() and
+    find_globals_and_nonlocals() find.
+    """
+
+    # Names that are global: loaded, stored or deleted
+    all_globals: set
+    # Names that need a "global" statement: stored or deleted
+    globals: set
+    # Names that need a "nonlocal" statement
+    nonlocals: set
+
+
 def escape_string(s: str, quotes=('"', "'", '"""', "'''")):
     quote = None
     for q in quotes:
@@ -34,10 +50,8 @@ def escape_string(s: str, quotes=('"', "'", '"""', "'''")):
 # above global ops.
 def find_all_globals(node, globs):
     """Search Syntax Tree node to find variable names that are global."""
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            globs = find_all_globals(n, globs)
-        elif n.kind in read_write_global_ops:
+    for n in tree_tokens(node):
+        if n.kind in read_write_global_ops:
             globs.add(n.pattr)
     return globs
 
@@ -55,12 +69,8 @@ def find_code_node(node, start: int):
 def find_globals_and_nonlocals(node, globs, nonlocals, code, version):
     """search a node of parse tree to find variable names that need a
     either 'global' or 'nonlocal' statements added."""
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            globs, nonlocals = find_globals_and_nonlocals(
-                n, globs, nonlocals, code, version
-            )
-        elif n.kind in read_global_ops:
+    for n in tree_tokens(node):
+        if n.kind in read_global_ops:
             globs.add(n.pattr)
         elif (
             version >= (3, 0)
@@ -73,6 +83,19 @@ def find_globals_and_nonlocals(node, globs, nonlocals, code, version):
     return globs, nonlocals
 
 
+def tree_names(tree, code, version: tuple) -> TreeNames:
+    """
+    Return the TreeNames of `tree`, the tree of `code`: those that
+    TreeTransform saved in it or, for a tree that wasn't transformed,
+    those found by walking it.
+    """
+    names = getattr(tree, "names", None)
+    if names is None:
+        globs, nonlocals = find_globals_and_nonlocals(tree, set(), set(), code, version)
+        names = TreeNames(find_all_globals(tree, set()), globs, nonlocals)
+    return names
+
+
 # def find_globals(node, globs, global_ops=mkfunc_globals):
 #     """Find globals in this statement."""
 #     for n in node:
@@ -89,12 +112,8 @@ def find_globals_and_nonlocals(node, globs, nonlocals, code, version):
 
 
 def find_none(node):
-    for n in node:
-        if isinstance(n, SyntaxTree):
-            if n not in ("return_stmt", "return_if_stmt"):
-                if find_none(n):
-                    return True
-        elif n.kind == "LOAD_CONST" and n.pattr is None:
+    for n in tree_tokens(node, ("return_stmt", "return_if_stmt")):
+        if n.kind == "LOAD_CONST" and n.pattr is None:
             return True
     return False
 
@@ -41,12 +41,12 @@ class LineMapWalker(SourceWalker):
 
     # Note n_expr needs treatment too
 
-    def default(self, node):
+    def default_steps(self, node):
         """Augment default-write routine to record line number changes."""
         if hasattr(node, "linestart"):
             if node.linestart:
                 self.source_linemap[self.current_line_number] = node.linestart
-        return super().default(node)
+        return super().default_steps(node)
 
     def n_LOAD_CONST(self, node):
         if hasattr(node, "linestart"):
@@ -15,6 +15,9 @@
 """
 All the crazy things we have to do to handle Python functions.
 """
+import json
+from io import StringIO
+
 from xdis import (
     CO_ASYNC_GENERATOR,
     CO_GENERATOR,
@@ -24,14 +27,102 @@ from xdis import (
 )
 
 from decompyle3.parsers.parse_heads import ParserError as ParserError2
-from decompyle3.scanner import Code
-from decompyle3.semantics.helper import (
-    find_all_globals,
-    find_globals_and_nonlocals,
-    find_none,
-)
+from decompyle3.result_cache import RecordingStream, code_hash
+from decompyle3.semantics.helper import find_none, tree_names
 from decompyle3.semantics.parser_error import ParserError
 from decompyle3.show import maybe_show_tree_param_default
+from decompyle3.timings import phase
+
+
+def function_body_cache_key(self, code) -> str:
+    """
+    Return the result-cache key for the body of function `code`.
+    Besides the code, this includes the parts of the walker's state
+    that the text of the body depends on. Keep this in step with the
+    attributes set in SourceWalker.__init__().
+    """
+    return code_hash(
+        code,
+        self.version,
+        self.python_implementation,
+        "function",
+        self.compile_mode,
+        self.currentclass,
+        self.indent,
+        self.in_format_string,
+        self.hide_internal,
+        self.FUTURE_UNICODE_LITERALS,
+        self.prec,
+        self.pending_newlines,
+        self.line_number - code.co_firstlineno,
+        sorted(self.mod_globs),
+    )
+
+
+def start_function_body(self) -> tuple:
+    """
+    Start recording what is written for a function body. The value
+    returned is passed to finish_function_body().
+    """
+    recording = RecordingStream(self.f)
+    self.f = recording
+    return recording, self.ERROR, len(self.ast_errors)
+
+
+def finish_function_body(self, code, recording, cache_key: str) -> None:
+    """
+    Stop recording the output of a function body and, if there were no
+    errors in it, save what was written in the result cache.
+    """
+    stream, error, ast_error_count = recording
+    self.f = stream.out
+    if self.ERROR is not error or len(self.ast_errors) != ast_error_count:
+        return
+    result = {
+        "writes": stream.writes,
+        "prec": self.prec,
+        "pending_newlines": self.pending_newlines,
+        "line_number": self.line_number - code.co_firstlineno,
+        "mod_globs": sorted(self.mod_globs),
+    }
+    self.result_cache.put(cache_key, json.dumps(result).encode("utf-8"))
+
+
+def replay_function_body(self, code, cached: bytes) -> None:
+    """
+    Write the body of a function saved in the result cache and update
+    the walker's state as deparsing the function would have.
+    """
+    result = json.loads(cached.decode("utf-8"))
+    for s in result["writes"]:
+        self.f.write(s)
+    self.prec = result["prec"]
+    self.pending_newlines = result["pending_newlines"]
+    self.line_number = code.co_firstlineno + result["line_number"]
+    self.mod_globs = set(result["mod_globs"])
+
+
+def parse_function_body(self, code, is_lambda: bool):
+    """
+    Return the scanned code and parse tree of the body of function
+    `code`, or None after writing the parse error if it can't be parsed.
+    """
+    debug_asm_opts = self.debug_opts["asm"] if self.debug_opts else None
+    try:
+        scanner_code = self.nested_code(code, debug_asm_opts)
+        tree = self.build_ast(
+            scanner_code._tokens,
+            scanner_code._customize,
+            scanner_code,
+            is_lambda=is_lambda,
+            noneInNames=("None" in code.co_names),
+        )
+    except (ParserError, ParserError2) as p:
+        self.write(str(p))
+        if not self.tolerate_errors:
+            self.ERROR = p
+        return None
+    return scanner_code, tree
 
 
 def make_function36(self, node, is_lambda, nested=1, code_node=None):
@@ -48,26 +139,6 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
 
     # Thank you, Python.
 
-    def build_param(ast, name, default, annotation=None):
-        """build parameters:
-        - handle defaults
-        - handle format tuple parameters
-        """
-        value = default
-        maybe_show_tree_param_default(self.showast, name, value)
-        if annotation:
-            result = "%s: %s=%s" % (name, annotation, value)
-        else:
-            result = "%s=%s" % (name, value)
-
-        # The below can probably be removed. This is probably
-        # a holdover from days when LOAD_CONST erroneously
-        # didn't handle LOAD_CONST None properly
-        if result[-2:] == "= ":  # default was 'LOAD_CONST None'
-            result += "None"
-
-        return result
-
     # MAKE_FUNCTION_... or MAKE_CLOSURE_...
     assert node[-1].kind.startswith("MAKE_")
 
@@ -137,33 +208,159 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
         code = code_node.attr
 
     assert iscode(code)
-    debug_asm_opts = self.debug_opts["asm"] if self.debug_opts else None
-    scanner_code = Code(code, self.scanner, self.currentclass, debug_asm_opts)
+
+    if self.result_cache is not None and not (is_lambda or self.tolerate_errors):
+        # With a result cache we may not need to parse the body at all, so
+        # the header is written aside until we know whether it is needed.
+        header_start = (self.pending_newlines, self.line_number)
+        header = write_aside(
+            self,
+            make_function36_header,
+            node,
+            is_lambda,
+            code,
+            annotate_dict,
+            defparams,
+        )
+        cache_key = function_body_cache_key(self, code)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            self.f.write(header)
+            replay_function_body(self, code, cached)
+            return
+        header_end = (self.pending_newlines, self.line_number)
+        self.pending_newlines, self.line_number = header_start
+        parsed = parse_function_body(self, code, is_lambda)
+        if parsed is None:
+            return
+        self.pending_newlines, self.line_number = header_end
+        self.f.write(header)
+        recording = start_function_body(self)
+    else:
+        # Parse the body first, so that if it can't be parsed, only the
+        # parse error is shown.
+        cache_key = None
+        parsed = parse_function_body(self, code, is_lambda)
+        if parsed is None:
+            return
+        make_function36_header(self, node, is_lambda, code, annotate_dict, defparams)
+    scanner_code, tree = parsed
+
+    if is_lambda:
+        # If the last statement is None (which is the
+        # same thing as "return None" in a lambda) and the
+        # next to last statement is a "yield". Then we want to
+        # drop the (return) None since that was just put there
+        # to have something to after the yield finishes.
+        # FIXME: this is a bit hoaky and not general
+        if (
+            len(tree) > 1
+            and self.traverse(tree[-1]) == "None"
+            and self.traverse(tree[-2]).strip().startswith("yield")
+        ):
+            del tree[-1]
+            # Now pick out the expr part of the last statement
+            tree_expr = tree[-1]
+            while tree_expr.kind != "expr":
+                tree_expr = tree_expr[0]
+            tree[-1] = tree_expr
+            pass
+
+    assert tree in ("stmts", "lambda_start")
+
+    with phase("globals", code):
+        all_globals, globals, nonlocals = tree_names(tree, code, self.version)
+
+    for g in sorted((all_globals & self.mod_globs) | globals):
+        self.println(self.indent, "global ", g)
+
+    for nl in sorted(nonlocals):
+        self.println(self.indent, "nonlocal ", nl)
+
+    self.mod_globs -= all_globals
+    has_none = "None" in code.co_names
+    rn = has_none and not find_none(tree)
+    with phase("gen_source", code):
+        self.gen_source(
+            tree,
+            code.co_name,
+            scanner_code._customize,
+            is_lambda=is_lambda,
+            returnNone=rn,
+            debug_opts=self.debug_opts,
+        )
+
+    # In obscure cases, a function may be a generator but the "yield"
+    # was optimized away. Here, we need to put in unreachable code to
+    # add in "yield" just so that the compiler will mark
+    # the GENERATOR bit of the function. See for example
+    # Python 3.x's test_connection.py and test_contexlib_async test programs.
+    if not is_lambda and code.co_flags & (CO_GENERATOR | CO_ASYNC_GENERATOR):
+        need_bogus_yield = True
+        for token in scanner_code._tokens:
+            if token == "YIELD_VALUE":
+                need_bogus_yield = False
+                break
+            pass
+        if need_bogus_yield:
+            self.template_engine(("%|if False:\n%+%|yield None%-",), node)
+
+    scanner_code._tokens = None  # save memory
+    scanner_code._customize = None  # save memory
+
+    if cache_key is not None:
+        finish_function_body(self, code, recording, cache_key)
+
+
+def write_aside(self, write_fn, *args) -> str:
+    """
+    Call write_fn(self, *args) and return what it writes, instead of
+    writing it to self.f.
+    """
+    out = self.f
+    self.f = StringIO()
+    try:
+        write_fn(self, *args)
+        return self.f.getvalue()
+    finally:
+        self.f = out
+
+
+def make_function36_header(self, node, is_lambda, code, annotate_dict, defparams):
+    """Dump the parameter list of function `code`, along with its
+    doc string, after "lambda" or "def name".
+    """
+
+    def build_param(name, default, annotation=None):
+        """build parameters:
+        - handle defaults
+        - handle format tuple parameters
+        """
+        value = default
+        maybe_show_tree_param_default(self.showast, name, value)
+        if annotation:
+            result = "%s: %s=%s" % (name, annotation, value)
+        else:
+            result = "%s=%s" % (name, value)
+
+        # The below can probably be removed. This is probably
+        # a holdover from days when LOAD_CONST erroneously
+        # didn't handle LOAD_CONST None properly
+        if result[-2:] == "= ":  # default was 'LOAD_CONST None'
+            result += "None"
+
+        return result
 
     # add defaults values to parameter names
     argc = code.co_argcount
     kwonlyargcount = code.co_kwonlyargcount
 
-    paramnames = list(scanner_code.co_varnames[:argc])
-    kwargs = list(scanner_code.co_varnames[argc: argc + kwonlyargcount])
+    paramnames = list(code.co_varnames[:argc])
+    kwargs = list(code.co_varnames[argc: argc + kwonlyargcount])
 
     paramnames.reverse()
     defparams.reverse()
 
-    try:
-        tree = self.build_ast(
-            scanner_code._tokens,
-            scanner_code._customize,
-            scanner_code,
-            is_lambda=is_lambda,
-            noneInNames=("None" in code.co_names),
-        )
-    except (ParserError, ParserError2) as p:
-        self.write(str(p))
-        if not self.tolerate_errors:
-            self.ERROR = p
-        return
-
     i = len(paramnames) - len(defparams)
 
     # build parameters
@@ -171,9 +368,7 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
     if defparams:
         for i, defparam in enumerate(defparams):
             params.append(
-                build_param(
-                    tree, paramnames[i], defparam, annotate_dict.get(paramnames[i])
-                )
+                build_param(paramnames[i], defparam, annotate_dict.get(paramnames[i]))
             )
 
         for param in paramnames[i + 1:]:
@@ -207,25 +402,6 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
         elif kwonlyargcount > 0 and not (4 & code.co_flags):
             assert argc == 0
             self.write(" ")
-
-        # If the last statement is None (which is the
-        # same thing as "return None" in a lambda) and the
-        # next to last statement is a "yield". Then we want to
-        # drop the (return) None since that was just put there
-        # to have something to after the yield finishes.
-        # FIXME: this is a bit hoaky and not general
-        if (
-            len(tree) > 1
-            and self.traverse(tree[-1]) == "None"
-            and self.traverse(tree[-2]).strip().startswith("yield")
-        ):
-            del tree[-1]
-            # Now pick out the expr part of the last statement
-            tree_expr = tree[-1]
-            while tree_expr.kind != "expr":
-                tree_expr = tree_expr[0]
-            tree[-1] = tree_expr
-            pass
     else:
         self.write("(", ", ".join(params))
     # self.println(indent, '#flags:\t', int(code.co_flags))
@@ -272,7 +448,10 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
         if kw_dict:
             assert kw_dict == "dict"
             const_list = kw_dict[0]
-            if kw_dict[0] == "const_list":
+            if kw_dict[0] == "const_list" and len(const_list) == 1:
+                names = const_list[0].attr.keys
+                defaults = list(const_list[0].attr.values)
+            elif kw_dict[0] == "const_list":
                 add_consts = const_list[1]
                 assert add_consts == "add_consts"
                 names = add_consts[-1].attr
@@ -330,46 +509,3 @@ def make_function36(self, node, is_lambda, nested=1, code_node=None):
     if node[-2] == "docstring" and not is_lambda:
         # docstring exists, dump it
         self.println(self.traverse(node[-2]))
-
-    assert tree in ("stmts", "lambda_start")
-
-    all_globals = find_all_globals(tree, set())
-    globals, nonlocals = find_globals_and_nonlocals(
-        tree, set(), set(), code, self.version
-    )
-
-    for g in sorted((all_globals & self.mod_globs) | globals):
-        self.println(self.indent, "global ", g)
-
-    for nl in sorted(nonlocals):
-        self.println(self.indent, "nonlocal ", nl)
-
-    self.mod_globs -= all_globals
-    has_none = "None" in code.co_names
-    rn = has_none and not find_none(tree)
-    self.gen_source(
-        tree,
-        code.co_name,
-        scanner_code._customize,
-        is_lambda=is_lambda,
-        returnNone=rn,
-        debug_opts=self.debug_opts,
-    )
-
-    # In obscure cases, a function may be a generator but the "yield"
-    # was optimized away. Here, we need to put in unreachable code to
-    # add in "yield" just so that the compiler will mark
-    # the GENERATOR bit of the function. See for example
-    # Python 3.x's test_connection.py and test_contexlib_async test programs.
-    if not is_lambda and code.co_flags & (CO_GENERATOR | CO_ASYNC_GENERATOR):
-        need_bogus_yield = True
-        for token in scanner_code._tokens:
-            if token == "YIELD_VALUE":
-                need_bogus_yield = False
-                break
-            pass
-        if need_bogus_yield:
-            self.template_engine(("%|if False:\n%+%|yield None%-",), node)
-
-    scanner_code._tokens = None  # save memory
-    scanner_code._customize = None  # save memory
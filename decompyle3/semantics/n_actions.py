@@ -106,13 +106,15 @@ class NonterminalActions:
 
     def n_bin_op(self, node: SyntaxTree):
         """bin_op (formerly "binary_expr") is the Python AST BinOp"""
-        self.preorder(node[0])
+        # Operands can nest deeply, so they are yielded to be walked
+        # rather than walked here; see SourceWalker.run().
+        yield node[0]
         self.write(" ")
-        self.preorder(node[-1])
+        yield node[-1]
         self.write(" ")
         # Try to avoid a trailing parentheses by lowering the priority a little
         self.prec -= 1
-        self.preorder(node[1])
+        yield node[1]
         self.prec += 1
         self.prune()
 
@@ -207,8 +209,34 @@ class NonterminalActions:
         """
         p = self.prec
 
-        lastnodetype = node[2].kind
-        flat_elems = node[1]
+        if len(node) == 1:
+            # The scanner has made the collection into a single token,
+            # with the source text of its values.
+            collection = node[0]
+            lastnodetype = collection.kind
+            values = collection.attr.values
+            linestarts = collection.attr.linestarts
+            keys = collection.attr.keys
+        else:
+            lastnodetype = node[2].kind
+            flat_elems = node[1]
+            keys = ()
+            if lastnodetype.endswith("DICT"):
+                keys = flat_elems[-1].attr
+                assert isinstance(keys, tuple)
+                assert len(keys) == len(flat_elems) - 1
+                flat_elems = flat_elems[:-1]
+            values = []
+            for elem in flat_elems:
+                assert elem.kind == "ADD_VALUE"
+                if elem.optype in ("local", "name"):
+                    value = elem.attr
+                elif elem.optype == "const" and not isinstance(elem.attr, str):
+                    value = elem.attr
+                else:
+                    value = elem.pattr
+                values.append(value)
+            linestarts = [elem.linestart for elem in flat_elems]
         is_dict = lastnodetype.endswith("DICT")
 
         if lastnodetype.endswith("LIST"):
@@ -225,48 +253,20 @@ class NonterminalActions:
 
         self.indent_more(INDENT_PER_LEVEL)
         sep = ""
-        if is_dict:
-            keys = flat_elems[-1].attr
-            assert isinstance(keys, tuple)
-            assert len(keys) == len(flat_elems) - 1
-
-            for i, elem in enumerate(flat_elems[:-1]):
-                assert elem.kind == "ADD_VALUE"
-                if elem.optype in ("local", "name"):
-                    value = elem.attr
-                elif elem.optype == "const" and not isinstance(elem.attr, str):
-                    value = elem.attr
+        for i, value in enumerate(values):
+            linestart = linestarts[i]
+            if linestart is not None:
+                if linestart != self.line_number:
+                    sep += "\n" + self.indent + INDENT_PER_LEVEL[:-1]
+                    self.line_number = linestart
                 else:
-                    value = elem.pattr
-
-                if elem.linestart is not None:
-                    if elem.linestart != self.line_number:
-                        sep += "\n" + self.indent + INDENT_PER_LEVEL[:-1]
-                        self.line_number = elem.linestart
-                    else:
-                        if sep != "":
-                            sep += " "
+                    if sep != "":
+                        sep += " "
+            if is_dict:
                 self.write(f"{sep} {repr(keys[i])}: {value}")
-                sep = ","
-        else:
-            for elem in flat_elems:
-                assert elem.kind == "ADD_VALUE"
-                if elem.optype in ("local", "name"):
-                    value = elem.attr
-                elif elem.optype == "const" and not isinstance(elem.attr, str):
-                    value = elem.attr
-                else:
-                    value = elem.pattr
-
-                if elem.linestart is not None:
-                    if elem.linestart != self.line_number:
-                        sep += "\n" + self.indent + INDENT_PER_LEVEL[:-1]
-                        self.line_number = elem.linestart
-                    else:
-                        if sep != "":
-                            sep += " "
+            else:
                 self.write(sep, value)
-                sep = ","
+            sep = ","
         self.write(endchar)
         self.indent_less(INDENT_PER_LEVEL)
 
@@ -670,10 +670,10 @@ class NonterminalActions:
         if p < self.prec:
             # print(f"PREC {p}, {node[0].kind}")
             self.write("(")
-            self.preorder(node[0])
+            yield node[0]
             self.write(")")
         else:
-            self.preorder(node[0])
+            yield node[0]
         self.prec = p
         self.prune()
 
@@ -1034,9 +1034,9 @@ class NonterminalActions:
         if len(node) == 1 and node[0] == "expr":
             # If expr is yield we want parens.
             self.prec = PRECEDENCE["yield"] - 1
-            self.n_expr(node[0])
+            yield from self.n_expr(node[0])
         else:
-            self.n_expr(node)
+            yield from self.n_expr(node)
 
     n_return_expr_or_cond = n_expr
 
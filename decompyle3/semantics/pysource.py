@@ -131,9 +131,11 @@ Python.
 
 import sys
 from io import StringIO
+from types import GeneratorType
 from typing import Optional
 
 from spark_parser import GenericASTTraversal
+from spark_parser.ast import GenericASTTraversalPruningException
 from xdis import COMPILER_FLAG_BIT, iscode
 from xdis.version_info import PYTHON_IMPLEMENTATION, PYTHON_VERSION_TRIPLE
 
@@ -141,30 +143,31 @@ import decompyle3.parsers.main as python_parser
 import decompyle3.parsers.parse_heads as heads
 from decompyle3.parsers.main import get_python_parser
 from decompyle3.parsers.treenode import SyntaxTree
-from decompyle3.scanner import Code, get_scanner
-from decompyle3.scanners.tok import Token
-from decompyle3.semantics.check_ast import checker
+from decompyle3.scanner import Code, ScannedCode, get_scanner
+from decompyle3.scanners.tok import Token, eval_namespace
 from decompyle3.semantics.consts import (
     INDENT_PER_LEVEL,
     LINE_LENGTH,
     MAP,
-    MAP_DIRECT,
+    MAP_R,
     NAME_MODULE,
     NO_PARENTHESIS_EVER,
     NONE,
     PASS,
     PRECEDENCE,
     TAB,
+    TABLE_DIRECT,
     TABLE_R,
-    escape,
 )
 from decompyle3.semantics.customize import customize_for_version
 from decompyle3.semantics.gencomp import ComprehensionMixin
-from decompyle3.semantics.helper import find_globals_and_nonlocals, is_lambda_mode
+from decompyle3.semantics.helper import is_lambda_mode, tree_names
 from decompyle3.semantics.n_actions import NonterminalActions
 from decompyle3.semantics.parser_error import ParserError
+from decompyle3.semantics.templates import Template, compile_template
 from decompyle3.semantics.transform import TreeTransform
 from decompyle3.show import maybe_show_tree
+from decompyle3.timings import phase
 from decompyle3.util import better_repr
 
 PARSER_DEFAULT_DEBUG = {
@@ -261,10 +264,6 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             str_with_template=self.str_with_template,
         )
 
-        # FIXME: have p.insts update in a better way
-        # modularity is broken here
-        self.p.insts = scanner.insts
-
         self.ERROR = None
         self.ast_errors = []
         self.classes = []
@@ -277,11 +276,24 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         self.linestarts = linestarts
         self.mod_globs = set()
         self.name = None
-        self.offset2inst_index = scanner.offset2inst_index
         self.param_stack = []
         self.params = params
         self.pending_newlines = 0
         self.prec = NO_PARENTHESIS_EVER
+        # A decompyle3.result_cache.ResultCache in which the text of
+        # function bodies is saved and looked up, or None. The text is
+        # looked up by the walker state that it depends on, which
+        # function_body_cache_key() in make_function36 lists. State added
+        # here that changes how a function body is written must be added
+        # there too, and state that writing a body changes must be saved
+        # and restored by finish_function_body() and replay_function_body().
+        self.result_cache = None
+        # The ScannedCode of the code object given to code_deparse().
+        # Nested code objects have theirs in their Code.
+        self.scanned = None
+        # The ScannedCodes of the code objects nested in that one, by the
+        # id() of the code object. See nested_code().
+        self.scanned_codes = {}
         self.return_none = False
         self.showast = showast
         self.source_linemap = {}
@@ -307,6 +319,19 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         # An example is:
         # __module__ = __name__
         self.hide_internal = True
+
+        # Each walker has its own copy of the semantic-action tables.
+        # customize_for_version() and customize() add entries to them, so
+        # that walkers for different Python versions, or walkers running in
+        # different threads, don't change each other's tables.
+        self.TABLE_DIRECT = dict(TABLE_DIRECT)
+        self.TABLE_R = dict(TABLE_R)
+        self.MAP_DIRECT = (self.TABLE_DIRECT,)
+        self.MAP_R = (self.TABLE_R, -1)
+        self.MAP = {
+            kind: self.MAP_R if mapping is MAP_R else self.MAP_DIRECT
+            for kind, mapping in MAP.items()
+        }
         customize_for_version(self, python_implementation, version)
         return
 
@@ -409,9 +434,78 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             self.line_number = node.linestart
 
     def preorder(self, node=None):
-        super(SourceWalker, self).preorder(node)
+        """Walk the tree in roughly 'preorder' (a bit of a lie explained
+        in GenericASTTraversal.preorder()).
+
+        The tree is walked with an explicit stack of generators rather
+        than by recursion: see run().
+        """
+        if node is None:
+            node = self.ast
+        self.run(self.visit(node))
+
+    def run(self, steps):
+        """Run generator `steps` to its end. Each node that it yields is
+        walked, by the generator that visit() gives for it, before `steps`
+        goes on; the nodes that generator yields are walked in turn, and so
+        on. So semantic actions and templates yield a node where they would
+        otherwise call preorder() on it, and how deeply a tree can nest
+        isn't limited by the Python stack.
+
+        An exception raised while walking a node is raised in the generator
+        that yielded the node, as it would be in a recursive walk.
+        """
+        stack = [steps]
+        exception = None
+        while stack:
+            try:
+                if exception is None:
+                    node = next(stack[-1])
+                else:
+                    node = stack[-1].throw(exception)
+            except StopIteration:
+                stack.pop()
+                exception = None
+            except BaseException as e:
+                stack.pop()
+                if not stack:
+                    raise
+                exception = e
+            else:
+                exception = None
+                stack.append(self.visit(node))
+
+    def visit(self, node):
+        """A generator that walks `node`; see run()."""
+        yield from self.node_steps(node)
         self.set_pos_info(node)
 
+    def node_steps(self, node):
+        """
+        A generator that walks `node` the way GenericASTTraversal.preorder()
+        does: its semantic action, n_*name* or default(), is run and, unless
+        that prunes, its children are walked and n_*name*_exit is called.
+        Semantic actions that are generators are run by run().
+        """
+        name = "n_" + self.typestring(node)
+        try:
+            func = getattr(self, name, None)
+            if func is None:
+                yield from self.default_steps(node)
+            else:
+                steps = func(node)
+                if isinstance(steps, GeneratorType):
+                    yield from steps
+        except GenericASTTraversalPruningException:
+            return
+
+        for kid in node:
+            yield kid
+
+        func = getattr(self, name + "_exit", None)
+        if func is not None:
+            func(node)
+
     def indent_more(self, indent=TAB):
         self.indent += indent
 
@@ -618,179 +712,141 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         beginning of this module for how we interpret format
         specifications such as %c, %C, and so on.
         """
+        self.run(self.template_steps(entry, startnode))
 
-        # print("-----")
-        # print(startnode.kind)
-        # print(entry[0])
-        # print('======')
-
-        fmt = entry[0]
-        arg = 1
-        i = 0
+    def template_steps(self, entry, startnode):
+        """A generator that interprets format template `entry` for
+        `startnode`, yielding the nodes to walk; see template_engine()
+        and run(). The entry is compiled into a Template the first time
+        that it is used.
+        """
+        return self.compiled_template_steps(compile_template(entry), startnode)
 
-        m = escape.search(fmt)
-        while m:
-            i = m.end()
-            self.write(m.group("prefix"))
+    def compiled_template_steps(self, template: Template, startnode):
+        """A generator that interprets compiled template `template` for
+        `startnode`; see template_steps().
+        """
+        write = self.write
+        for prefix, typ, child, arg, position in template.ops:
+            write(prefix)
 
-            typ = m.group("type") or "{"
-            node = startnode
-            if m.group("child"):
-                node = node[int(m.group("child"))]
+            node = startnode if child is None else startnode[child]
 
-            if typ == "%":
-                self.write("%")
-            elif typ == "+":
-                self.line_number += 1
-                self.indent_more()
-            elif typ == "-":
-                self.line_number += 1
-                self.indent_less()
-            elif typ == "|":
-                self.line_number += 1
-                self.write(self.indent)
-            # Used mostly on the LHS of an assignment
-            # BUILD_TUPLE_n is pretty printed and may take care of other uses.
-            elif typ == ",":
-                if node.kind in ("unpack", "unpack_w_parens") and node[0].attr == 1:
-                    self.write(",")
-            elif typ == "c":
-                index = entry[arg]
-                if isinstance(index, tuple):
-                    if isinstance(index[1], str):
+            if typ == "c":
+                index, expected = arg
+                if expected is not None:
+                    if isinstance(expected, str):
                         assert (
-                            node[index[0]] == index[1]
+                            node[index] == expected
                         ), "at %s[%d], expected '%s' node; got '%s'" % (
                             node.kind,
-                            arg,
-                            index[1],
-                            node[index[0]].kind,
+                            position,
+                            expected,
+                            node[index].kind,
                         )
                     else:
                         assert (
-                            node[index[0]] in index[1]
+                            node[index] in expected
                         ), "at %s[%d], expected to be in '%s' node; got '%s'" % (
                             node.kind,
-                            arg,
-                            index[1],
-                            node[index[0]].kind,
+                            position,
+                            expected,
+                            node[index].kind,
                         )
-
-                    index = index[0]
-                assert isinstance(
-                    index, int
-                ), "at %s[%d], %s should be int or tuple" % (
-                    node.kind,
-                    arg,
-                    type(index),
-                )
-
                 try:
-                    node[index]
+                    kid = node[index]
                 except IndexError:
                     raise RuntimeError(
                         f"""
-                        Expanding '{node.kind}' in template '{entry}[{arg}]':
+                        Expanding '{node.kind}' in template '{template.entry}[{position}]':
                         {index} is invalid; has only {len(node)} entries
                         """
                     )
-                self.preorder(node[index])
-
-                arg += 1
+                yield kid
             elif typ == "p":
                 p = self.prec
-                # entry[arg]
-                tup = entry[arg]
-                assert isinstance(tup, tuple)
-                if len(tup) == 3:
-                    (index, nonterm_name, self.prec) = tup
-                    if isinstance(tup[1], str):
+                index, expected, self.prec = arg
+                if expected is not None:
+                    if isinstance(expected, str):
                         assert (
-                            node[index] == nonterm_name
+                            node[index] == expected
                         ), "at %s[%d], expected '%s' node; got '%s'" % (
                             node.kind,
-                            arg,
-                            nonterm_name,
+                            position,
+                            expected,
                             node[index].kind,
                         )
                     else:
-                        assert node[tup[0]] in tup[1], (
-                            f"at {node.kind}[{tup[0]}], expected to be in '{tup[1]}' "
-                            f"node; got '{node[tup[0]].kind}'"
+                        assert node[index] in expected, (
+                            f"at {node.kind}[{index}], expected to be in '{expected}' "
+                            f"node; got '{node[index].kind}'"
                         )
+                yield node[index]
+                self.prec = p
+            elif typ == "{":
+                # Line mapping stuff
+                if (
+                    hasattr(node, "linestart")
+                    and node.linestart
+                    and hasattr(node, "current_line_number")
+                ):
+                    self.source_linemap[self.current_line_number] = node.linestart
 
+                if isinstance(arg, Template):
+                    yield from self.compiled_template_steps(arg, node)
                 else:
-                    assert len(tup) == 2
-                    (index, self.prec) = entry[arg]
-
-                self.preorder(node[index])
-                self.prec = p
-                arg += 1
+                    d = eval_namespace(node)
+                    write(eval(arg, d, d))
+            elif typ == "|":
+                self.line_number += 1
+                write(self.indent)
             elif typ == "C":
-                low, high, sep = entry[arg]
+                low, high, sep = arg
                 remaining = len(node[low:high])
                 for subnode in node[low:high]:
-                    self.preorder(subnode)
+                    yield subnode
                     remaining -= 1
                     if remaining > 0:
-                        self.write(sep)
-                        pass
-                    pass
-                arg += 1
-            elif typ == "D":
-                low, high, sep = entry[arg]
-                remaining = len(node[low:high])
-                for subnode in node[low:high]:
-                    remaining -= 1
-                    if len(subnode) > 0:
-                        self.preorder(subnode)
-                        if remaining > 0:
-                            self.write(sep)
-                            pass
-                        pass
-                    pass
-                arg += 1
-            elif typ == "x":
-                # This code is only used in fragments
-                assert isinstance(entry[arg], tuple)
-                arg += 1
+                        write(sep)
             elif typ == "P":
                 p = self.prec
-                low, high, sep, self.prec = entry[arg]
+                low, high, sep, self.prec = arg
                 remaining = len(node[low:high])
-                # remaining = len(node[low:high])
                 for subnode in node[low:high]:
-                    self.preorder(subnode)
+                    yield subnode
                     remaining -= 1
                     if remaining > 0:
-                        self.write(sep)
+                        write(sep)
                 self.prec = p
-                arg += 1
-            elif typ == "{":
-                expr = m.group("expr")
-
-                # Line mapping stuff
-                if (
-                    hasattr(node, "linestart")
-                    and node.linestart
-                    and hasattr(node, "current_line_number")
-                ):
-                    self.source_linemap[self.current_line_number] = node.linestart
-
-                if expr[0] == "%":
-                    index = entry[arg]
-                    self.template_engine((expr, index), node)
-                    arg += 1
-                else:
-                    d = node.__dict__
-                    try:
-                        self.write(eval(expr, d, d))
-                    except Exception:
-                        raise
-            m = escape.search(fmt, i)
-        self.write(fmt[i:])
+            elif typ == "+":
+                self.line_number += 1
+                self.indent_more()
+            elif typ == "-":
+                self.line_number += 1
+                self.indent_less()
+            elif typ == "D":
+                low, high, sep = arg
+                remaining = len(node[low:high])
+                for subnode in node[low:high]:
+                    remaining -= 1
+                    if len(subnode) > 0:
+                        yield subnode
+                        if remaining > 0:
+                            write(sep)
+            # Used mostly on the LHS of an assignment
+            # BUILD_TUPLE_n is pretty printed and may take care of other uses.
+            elif typ == ",":
+                if node.kind in ("unpack", "unpack_w_parens") and node[0].attr == 1:
+                    write(",")
+            elif typ == "%":
+                write("%")
+        write(template.tail)
 
     def default(self, node):
+        self.run(self.default_steps(node))
+
+    def default_steps(self, node):
+        """A generator form of default(); see run()."""
         mapping = self._get_mapping(node)
         table = mapping[0]
         key = node
@@ -800,7 +856,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             pass
 
         if key.kind in table:
-            self.template_engine(table[key.kind], node)
+            yield from self.template_steps(table[key.kind], node)
             self.prune()
 
     def customize(self, customize):
@@ -808,6 +864,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         Special handling for opcodes, such as those that take a variable number
         of arguments -- we add a new entry for each in TABLE_R.
         """
+        TABLE_R = self.TABLE_R
         for k, v in list(customize.items()):
             if k in TABLE_R:
                 continue
@@ -893,7 +950,7 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
 
         assert iscode(code)
         self.classes.append(self.currentclass)
-        code = Code(code, self.scanner, self.currentclass)
+        code = self.nested_code(code)
 
         indent = self.indent
         # self.println(indent, '#flags:\t', int(code.co_flags))
@@ -939,9 +996,8 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
                 del tree[0]
             pass
 
-        globals, nonlocals = find_globals_and_nonlocals(
-            tree, set(), set(), code, self.version
-        )
+        with phase("globals", code):
+            _, globals, nonlocals = tree_names(tree, code, self.version)
         # Add "global" declaration statements at the top
         # of the function
         for g in sorted(globals):
@@ -951,7 +1007,8 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
             self.println(indent, "nonlocal ", nl)
 
         old_name = self.name
-        self.gen_source(tree, code.co_name, code._customize)
+        with phase("gen_source", code):
+            self.gen_source(tree, code.co_name, code._customize)
         self.name = old_name
 
         # save memory by deleting no-longer-used structures
@@ -995,6 +1052,28 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
         self.name = old_name
         self.return_none = rn
 
+    def nested_code(self, co, show_asm=None) -> Code:
+        """
+        Return a Code for `co`, a code object nested in the one given to
+        code_deparse(). If `co` was scanned before decompiling started,
+        its ScannedCode is used, otherwise it is scanned now.
+
+        Parsing changes tokens, so a ScannedCode is handed out only once;
+        a code object that is decompiled again is scanned again.
+        """
+        scanned = self.scanned_codes.pop(id(co), None)
+        return Code(co, self.scanner, self.currentclass, show_asm, scanned)
+
+    def scanned_code(self, code) -> ScannedCode:
+        """
+        Return the ScannedCode for `code`, either a Code or the code
+        object given to code_deparse().
+        """
+        if isinstance(code, Code):
+            return code.scanned
+        assert self.scanned is not None and self.scanned.co is code
+        return self.scanned
+
     def build_ast(
         self,
         tokens,
@@ -1024,17 +1103,18 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
                         python_implementation=self.python_implementation,
                     )
                 p = self.p_lambda
-                p.insts = self.scanner.insts
-                p.offset2inst_index = self.scanner.offset2inst_index
-                parse_tree = python_parser.parse(p, tokens, customize, is_lambda)
+                p.set_scanned_code(self.scanned_code(code))
+                with phase("parse", code):
+                    parse_tree = python_parser.parse(p, tokens, customize, is_lambda)
                 self.customize(customize)
 
             except (heads.ParserError, AssertionError) as e:
                 raise ParserError(e, tokens, self.p.debug["reduce"])
 
-            transform_tree = self.treeTransform.transform(
-                parse_tree, code, self.println
-            )
+            with phase("transform", code):
+                transform_tree = self.treeTransform.transform(
+                    parse_tree, code, self.println
+                )
 
             del parse_tree  # Save memory
             return transform_tree
@@ -1062,32 +1142,26 @@ class SourceWalker(GenericASTTraversal, NonterminalActions, ComprehensionMixin):
 
         # Build a parse tree from a tokenized and massaged disassembly.
         try:
-            # FIXME: have p.insts update in a better way
-            # Modularity is broken here.
-            p_insts = self.p.insts
-            self.p.insts = self.scanner.insts
-            self.p.offset2inst_index = self.scanner.offset2inst_index
-            self.p.opc = self.scanner.opc
-            parse_tree = python_parser.parse(
-                self.p, tokens, customize, is_lambda=is_lambda
-            )
-
-            self.p.insts = p_insts
+            self.p.set_scanned_code(self.scanned_code(code))
+            with phase("parse", code):
+                parse_tree = python_parser.parse(
+                    self.p, tokens, customize, is_lambda=is_lambda
+                )
         except (ParserError, AssertionError) as e:
             raise ParserError(e, tokens, self.p.debug["reduce"])
 
-        checker(parse_tree, False, self.ast_errors)
-
         self.customize(customize)
 
-        transform_tree = self.treeTransform.transform(parse_tree, code, self.println)
+        with phase("transform", code):
+            transform_tree = self.treeTransform.transform(
+                parse_tree, code, self.println, self.ast_errors
+            )
 
         del parse_tree  # Save memory
         return transform_tree
 
-    @classmethod
-    def _get_mapping(cls, node):
-        return MAP.get(node, MAP_DIRECT)
+    def _get_mapping(self, node):
+        return self.MAP.get(node, self.MAP_DIRECT)
 
 
 def code_deparse(
@@ -1101,10 +1175,19 @@ def code_deparse(
     walker=SourceWalker,
     start_offset: int = 0,
     stop_offset: int = -1,
+    result_cache=None,
+    scanned_codes: Optional[dict] = None,
 ) -> Optional[SourceWalker]:
     """
     ingests and deparses a given code block 'co'. If version is None,
     we will use the current Python interpreter version.
+
+    If `result_cache` is a decompyle3.result_cache.ResultCache, the text of
+    function bodies is looked up and saved there.
+
+    If `co` has already been scanned, `scanned_codes` maps the id() of it
+    and of the code objects nested in it to their ScannedCodes, as
+    Scanner.scan_tree() does, and the scanner isn't run.
     """
 
     assert iscode(co)
@@ -1120,14 +1203,32 @@ def code_deparse(
         version, python_implementation=python_implementation, show_asm=debug_opts["asm"]
     )
 
-    tokens, customize = scanner.ingest(
-        co, code_objects=code_objects, show_asm=debug_opts["asm"]
-    )
+    if scanned_codes is not None:
+        scanned_codes = dict(scanned_codes)
+        scanned = scanned_codes.pop(id(co))
+    elif debug_opts["asm"] or result_cache is not None:
+        # Scan each code object as it is decompiled: that way its assembly
+        # is shown alongside its grammar and tree output, and functions
+        # whose text is found in the result cache aren't scanned at all.
+        with phase("ingest", co):
+            scanned = scanner.scan(
+                co, code_objects=code_objects, show_asm=debug_opts["asm"]
+            )
+        scanned_codes = {}
+    else:
+        scanned_codes = scanner.scan_tree(co, code_objects=code_objects)
+        scanned = scanned_codes.pop(id(co))
+    tokens, customize = list(scanned.tokens), dict(scanned.customize)
 
     if start_offset > 0:
         for i, t in enumerate(tokens):
-            # If t.offset is a string, we want to skip this.
-            if isinstance(t.offset, int) and t.offset >= start_offset:
+            # If t.offset is a string for a pseudo instruction such as
+            # COME_FROM, we want to skip this. An instruction with
+            # EXTENDED_ARGs has a string offset too, but that starts
+            # where its first EXTENDED_ARG is.
+            first_offset = t.off2int(prefer_last=False)
+            is_instruction = isinstance(t.offset, int) or first_offset != t.off2int()
+            if is_instruction and first_offset >= start_offset:
                 tokens = tokens[i:]
                 break
 
@@ -1154,6 +1255,10 @@ def code_deparse(
         linestarts=linestarts,
     )
 
+    deparsed.result_cache = result_cache
+    deparsed.scanned = scanned
+    deparsed.scanned_codes = scanned_codes
+
     is_top_level_module = co.co_name == "<module>"
     if compile_mode == "eval":
         deparsed.hide_internal = False
@@ -1192,9 +1297,8 @@ def code_deparse(
     # save memory
     del tokens
 
-    deparsed.mod_globs, nonlocals = find_globals_and_nonlocals(
-        deparsed.ast, set(), set(), co, version
-    )
+    with phase("globals", co):
+        _, deparsed.mod_globs, nonlocals = tree_names(deparsed.ast, co, version)
 
     deparsed.is_module = compile_mode not in (
         "dictcomp",
@@ -1213,13 +1317,14 @@ def code_deparse(
     )
 
     # What we've been waiting for: Generate source from Syntax Tree!
-    deparsed.gen_source(
-        deparsed.ast,
-        name=co.co_name,
-        customize=customize,
-        is_lambda=is_lambda_mode(compile_mode),
-        debug_opts=debug_opts,
-    )
+    with phase("gen_source", co):
+        deparsed.gen_source(
+            deparsed.ast,
+            name=co.co_name,
+            customize=customize,
+            is_lambda=is_lambda_mode(compile_mode),
+            debug_opts=debug_opts,
+        )
 
     for g in sorted(deparsed.mod_globs):
         deparsed.write("# global %s ## Warning: Unused global\n" % g)
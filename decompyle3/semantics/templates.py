@@ -0,0 +1,153 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compiled format templates.
+
+A template entry of TABLE_DIRECT, TABLE_R and the tables that the
+customize modules add to, such as ("%c(%P)", 0, (1, -1, ", ", 100)),
+is a format string followed by the arguments of its escapes; see the
+comment at the beginning of pysource.py. SourceWalker writes a node
+with a template by interpreting it.
+
+So that the format string isn't scanned, and the arguments of its
+escapes aren't checked, each time a node is written, a template entry
+is compiled the first time it is used into a Template: the list of what
+each escape does, with its argument, and %{...} expressions compiled
+into code objects. Template entries are compiled by value rather than
+by table, since the customize modules add entries as tables are
+customized for the code being decompiled, and semantic actions build
+some entries as they go.
+"""
+
+from typing import NamedTuple, Optional
+
+from decompyle3.semantics.consts import escape
+
+
+class TemplateOp(NamedTuple):
+    """What an escape of a format string does."""
+
+    # The text before the escape
+    prefix: str
+    # The escape's type: "c", "p", "{" and so on. "{" is for a %{...}
+    # expression, whose argument is its code object, or for a %{%...}
+    # template, whose argument is its Template. "" is for escapes that
+    # do nothing.
+    typ: str
+    # The index of the child of the node to use instead of the node, if any
+    child: Optional[int]
+    # The escape's argument, checked; for example (index, prec) for "p"
+    arg: object
+    # The position of the argument in the template entry, for messages
+    position: int
+
+
+class Template(NamedTuple):
+    """A compiled template entry."""
+
+    ops: tuple
+    # The text after the last escape
+    tail: str
+    # The template entry compiled, for messages
+    entry: tuple
+
+
+# Templates compiled so far, by entry
+TEMPLATES = {}
+
+
+def compile_template(entry: tuple) -> Template:
+    """
+    Return the Template for template entry `entry`, compiling it if it
+    hasn't been already.
+    """
+    try:
+        template = TEMPLATES.get(entry)
+    except TypeError:
+        # An entry that can't be a key, because it has a list in it,
+        # is compiled each time.
+        return make_template(entry)
+    if template is None:
+        template = TEMPLATES[entry] = make_template(entry)
+    return template
+
+
+def make_template(entry: tuple) -> Template:
+    """Compile template entry `entry` into a Template."""
+    fmt = entry[0]
+    arg = 1
+    i = 0
+    ops = []
+
+    m = escape.search(fmt)
+    while m:
+        i = m.end()
+        typ = m.group("type") or "{"
+        child = m.group("child")
+        if child is not None:
+            child = int(child)
+        position = arg
+
+        if typ in "%+-|,":
+            op_arg = None
+        elif typ == "c":
+            index = entry[arg]
+            expected = None
+            if isinstance(index, tuple):
+                index, expected = index[0], index[1]
+            assert isinstance(index, int), "at %s[%d], %s should be int or tuple" % (
+                fmt,
+                arg,
+                type(index),
+            )
+            op_arg = (index, expected)
+            arg += 1
+        elif typ == "p":
+            tup = entry[arg]
+            assert isinstance(tup, tuple)
+            if len(tup) == 3:
+                op_arg = tup
+            else:
+                assert len(tup) == 2
+                index, prec = tup
+                op_arg = (index, None, prec)
+            arg += 1
+        elif typ in ("C", "D"):
+            low, high, sep = entry[arg]
+            op_arg = (low, high, sep)
+            arg += 1
+        elif typ == "P":
+            low, high, sep, prec = entry[arg]
+            op_arg = (low, high, sep, prec)
+            arg += 1
+        elif typ == "x":
+            # This code is only used in fragments
+            assert isinstance(entry[arg], tuple)
+            typ, op_arg = "", None
+            arg += 1
+        elif typ == "{":
+            expr = m.group("expr")
+            if expr[0] == "%":
+                op_arg = compile_template((expr, entry[arg]))
+                arg += 1
+            else:
+                op_arg = compile(expr, f"<template {expr}>", "eval")
+        else:
+            typ, op_arg = "", None
+
+        ops.append(TemplateOp(m.group("prefix"), typ, child, op_arg, position))
+        m = escape.search(fmt, i)
+
+    return Template(tuple(ops), fmt[i:], entry)
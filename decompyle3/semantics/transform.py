@@ -20,8 +20,15 @@ from spark_parser import GenericASTTraversal, GenericASTTraversalPruningExceptio
 
 from decompyle3.parsers.treenode import SyntaxTree
 from decompyle3.scanners.tok import NoneToken, Token
+from decompyle3.semantics.check_ast import check_node
 from decompyle3.semantics.consts import ASSIGN_DOC_STRING, RETURN_NONE
-from decompyle3.semantics.helper import find_code_node
+from decompyle3.semantics.helper import (
+    TreeNames,
+    find_code_node,
+    nonglobal_ops,
+    read_global_ops,
+    read_write_global_ops,
+)
 from decompyle3.show import maybe_show_tree
 
 # Eventually we won't need STRIPPED_NODES because all semantic
@@ -101,6 +108,26 @@ class TreeTransform(GenericASTTraversal, object):
         self.version = version
         self.str_with_template_for_later = str_with_template
         self.str_with_template = None
+
+        # What is done at each node of a tree is registered here by the
+        # kind of node, so a tree is walked only once, when it is
+        # transformed. The n_ methods transform nonterminals; the token
+        # hooks collect variable names.
+        self.transform_hooks = {
+            name[len("n_") :]: getattr(self, name)
+            for name in dir(self)
+            if name.startswith("n_")
+        }
+        self.token_hooks = {}
+        for kind in read_write_global_ops:
+            self.token_hooks[kind] = self.add_global
+        for kind in nonglobal_ops:
+            self.token_hooks[kind] = self.add_nonlocal
+
+        # Set while a tree is transformed
+        self.code = None
+        self.errors = None
+        self.names = None
         return
 
     def maybe_show_tree(self, tree, phase: str, print_fn: Callable):
@@ -113,35 +140,89 @@ class TreeTransform(GenericASTTraversal, object):
             print_fn(f"""\n# ---- {phase_name}:\n """)
             maybe_show_tree(self, tree)
 
-    def preorder(self, node=None):
-        """Walk the tree in roughly 'preorder' (a bit of a lie explained below).
-        For each node with typestring name *name* if the
+    def preorder(self, node=None, in_loop: bool = False):
+        """Walk the tree in preorder, transforming each node as it is
+        reached. For each node with typestring name *name* if the
         node has a method called n_*name*, call that before walking
-        children.
+        children. The node returned takes the place of the node in the
+        tree, and it is its children that are walked.
+
+        The tree is walked with an explicit stack rather than by
+        recursion, so how deeply a tree can nest isn't limited by
+        the Python stack.
 
-        In typical use a node with children can call "preorder" in any
-        order it wants which may skip children or order then in ways
-        other than first to last.  In fact, this this happens.  So in
-        this sense this function not strictly preorder.
+        Before a nonterminal is transformed, it is checked with
+        check_node(), if we are collecting errors; `in_loop` tells
+        whether it is inside a loop. The names in the tokens of the
+        transformed tree are collected as they are reached.
         """
         if node is None:
             node = self.ast
 
-        try:
-            name = "n_" + self.typestring(node)
-            if hasattr(self, name):
-                func = getattr(self, name)
-                node = func(node)
-        except GenericASTTraversalPruningException:
-            return
-
-        if node.kind in STRIPPED_NODES:
-            return self.strip_pseudo_ops(node)
+        node, in_loop = self.transform_node(node, in_loop)
+        if in_loop is None:
+            return node
 
-        for i, kid in enumerate(node):
-            node[i] = self.preorder(kid)
+        # Each entry is a node whose children are being transformed,
+        # the iterator over those children, and whether they are in a loop.
+        stack = [(node, enumerate(node), in_loop)]
+        while stack:
+            parent, kids, in_loop = stack[-1]
+            for i, kid in kids:
+                kid, kids_in_loop = self.transform_node(kid, in_loop)
+                parent[i] = kid
+                if kids_in_loop is not None:
+                    stack.append((kid, enumerate(kid), kids_in_loop))
+                    break
+            else:
+                stack.pop()
         return node
 
+    def transform_node(self, node, in_loop: bool) -> tuple:
+        """
+        Check and transform `node`, but not its children. Return the
+        node that takes the place of `node` and whether its children
+        are in a loop, or None if its children aren't to be walked.
+        """
+        if isinstance(node, Token):
+            return self.visit_token(node), None
+
+        if self.errors is not None:
+            in_loop = check_node(node, in_loop, self.errors)
+
+        hook = self.transform_hooks.get(node.kind)
+        if hook is not None:
+            try:
+                node = hook(node)
+            except GenericASTTraversalPruningException:
+                return None, None
+            if isinstance(node, Token):
+                return self.visit_token(node), None
+
+        if node.kind in STRIPPED_NODES:
+            node = self.strip_pseudo_ops(node)
+        return node, in_loop
+
+    def visit_token(self, token: Token) -> Token:
+        hook = self.token_hooks.get(token.kind)
+        if hook is not None:
+            hook(token)
+        return token
+
+    def add_global(self, token: Token):
+        self.names.all_globals.add(token.pattr)
+        if token.kind in read_global_ops:
+            self.names.globals.add(token.pattr)
+
+    def add_nonlocal(self, token: Token):
+        code = self.code
+        if (
+            token.pattr in code.co_freevars
+            and token.pattr != code.co_name
+            and code.co_name != "<lambda>"
+        ):
+            self.names.nonlocals.add(token.pattr)
+
     def n_await_expr(self, node):
         """Here we check for await(await)"""
 
@@ -529,12 +610,30 @@ class TreeTransform(GenericASTTraversal, object):
         return node
 
     def transform(
-        self, parse_tree: GenericASTTraversal, code, print_fn: Callable
+        self,
+        parse_tree: GenericASTTraversal,
+        code,
+        print_fn: Callable,
+        errors: Optional[list] = None,
     ) -> GenericASTTraversal:
+        """
+        Return the abstract tree for `parse_tree`, the parse tree of
+        `code`. The tree is walked once: as it is transformed, its
+        nodes are checked, with the mistakes found added to `errors`
+        when that is given, and the TreeNames of the tree are collected
+        and saved in the "names" attribute of the tree returned.
+        """
         self.maybe_show_tree(parse_tree, "before", print_fn)
         self.ast = copy(parse_tree)
         del parse_tree
-        self.ast = self.traverse(self.ast)
+        self.code = code
+        self.errors = errors
+        self.names = TreeNames(set(), set(), set())
+        try:
+            self.ast = self.traverse(self.ast)
+        finally:
+            self.code = self.errors = None
+        self.ast.names = self.names
         n = len(self.ast)
 
         try:
@@ -574,12 +673,13 @@ class TreeTransform(GenericASTTraversal, object):
     # Write template_engine
     # def template_engine
     def strip_pseudo_ops(self, node: SyntaxTree) -> SyntaxTree:
+        """
+        Return a copy of `node` without its pseudo-op children. The
+        children left are walked afterwards, like any node's.
+        """
         new_node = SyntaxTree(node.kind)
-        for i, kid in enumerate(node):
+        for kid in node:
             if hasattr(kid, "optype") and kid.optype == "pseudo":
                 continue
-            new_kid = self.preorder(kid)
-            new_node.data.append(new_kid)
-
-        del node
+            new_node.data.append(kid)
         return new_node
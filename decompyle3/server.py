@@ -0,0 +1,280 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+A long-running decompile server.
+
+Starting Python, importing xdis's opcode modules and building grammars
+often takes longer than decompiling a file. The server pays for these
+once: it starts a pool of worker processes that keep their scanners and
+parsers, and hands requests to them.
+
+Requests and responses are JSON objects, one per line. The server reads
+them from stdin and writes responses to stdout, or, when given a socket
+path, accepts connections on a Unix-domain socket and talks the same
+protocol over each connection.
+
+A request has:
+
+  "path":     the name of a .pyc file to decompile, or
+  "pyc":      the contents of a .pyc file, base64 encoded
+  "id":       optional; copied to the response
+  "linemap":  optional; when true, include line-number pairs
+  "timeout":  optional; a positive number of seconds to allow instead
+              of the server's default
+
+A response has "id" and "status", which is one of "ok", "failed",
+"timeout" or "invalid". When decompiling was started, "source" has the
+text written. If the status is not "ok", "error" has a message.
+
+Requests are answered as they finish, which need not be the order they
+were sent in; use "id" to match them up. A worker which runs over the
+time limit is killed and replaced by a new one.
+"""
+
+import base64
+import io
+import json
+import math
+import os
+import queue
+import socketserver
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Optional
+
+from xdis.version_info import PythonImplementation
+
+from decompyle3.main import decompile_file, source_linemap
+from decompyle3.parsers.main import get_python_parser
+from decompyle3.scanner import get_scanner
+
+# Seconds a request may take when neither the server nor the request
+# says otherwise.
+DEFAULT_TIMEOUT = 60.0
+
+# Workers are started from threads, sometimes while other threads are
+# in the middle of something; forking then isn't safe.
+_mp_context = get_context("spawn")
+
+
+def warm_up() -> None:
+    """
+    Import the scanners and build the parsers that decompiling is likely
+    to need, so that the first request doesn't pay for this.
+    """
+    for version in ((3, 7), (3, 8)):
+        get_scanner(version, PythonImplementation.CPython)
+        for compile_mode in ("exec", "lambda"):
+            get_python_parser(version, compile_mode=compile_mode)
+
+
+def decompile_request(request: dict) -> dict:
+    """
+    Decompile what `request` asks for and return the response for it,
+    less "id".
+    """
+    path = request.get("path")
+    pyc = request.get("pyc")
+    if (path is None) == (pyc is None):
+        return {"status": "invalid", "error": 'give one of "path" or "pyc"'}
+
+    tmp_path = None
+    if pyc is not None:
+        try:
+            data = base64.b64decode(pyc, validate=True)
+        except ValueError as e:
+            return {"status": "invalid", "error": f'bad "pyc": {e}'}
+        fd, tmp_path = tempfile.mkstemp(suffix=".pyc")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        path = tmp_path
+
+    out = io.StringIO()
+    mapstream = io.StringIO() if request.get("linemap") else None
+    try:
+        deparsed = decompile_file(path, out, mapstream=mapstream)
+    except Exception as e:
+        return {"status": "failed", "source": out.getvalue(), "error": str(e)}
+    finally:
+        if tmp_path is not None:
+            os.unlink(tmp_path)
+
+    response = {"status": "ok", "source": out.getvalue()}
+    if mapstream is not None:
+        response["linemap"] = [
+            pair for d in deparsed if d is not None for pair in source_linemap(d)
+        ]
+    return response
+
+
+def _worker_main(conn) -> None:
+    warm_up()
+    # Tell the server that we are ready.
+    conn.send(None)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        conn.send(decompile_request(request))
+
+
+class Worker:
+    """
+    A process that decompiles the requests sent to it, one at a time.
+    """
+
+    def __init__(self):
+        self.conn, child_conn = _mp_context.Pipe()
+        self.process = _mp_context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        # Set when the worker can't be used any more.
+        self.broken = False
+
+    def run(self, request: dict, timeout: float) -> dict:
+        """
+        Return the response to `request`, less "id". The time it takes the
+        worker to start up doesn't count against `timeout`.
+        """
+        try:
+            if not self.ready:
+                self.conn.recv()
+                self.ready = True
+            self.conn.send(request)
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+        except (EOFError, OSError):
+            self.broken = True
+            return {"status": "failed", "error": "worker process exited"}
+        self.broken = True
+        return {"status": "timeout", "error": f"no result after {timeout} seconds"}
+
+    def stop(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class WorkerPool:
+    """
+    `jobs` workers, and the threads that hand requests to them.
+    """
+
+    def __init__(self, jobs: int, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        for _ in range(jobs):
+            self.idle.put(Worker())
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def handle(self, line: str) -> dict:
+        """
+        Return the response to the JSON request in `line`.
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                request = {}
+                raise ValueError("a request must be a JSON object")
+            timeout = float(request.get("timeout", self.timeout))
+            if not 0 < timeout < math.inf:
+                raise ValueError(f"timeout must be a positive number, not {timeout}")
+        except (TypeError, ValueError) as e:
+            return {"id": request.get("id"), "status": "invalid", "error": str(e)}
+
+        worker = self.idle.get()
+        try:
+            response = worker.run(request, timeout)
+        finally:
+            if worker.broken:
+                worker.stop()
+                worker = Worker()
+            self.idle.put(worker)
+        return {"id": request.get("id"), **response}
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        while not self.idle.empty():
+            self.idle.get().stop()
+
+
+def serve_stream(pool: WorkerPool, instream, outstream) -> None:
+    """
+    Read requests from `instream`, one per line, and write the responses
+    to `outstream`, until the end of `instream`.
+    """
+    lock = threading.Lock()
+
+    def respond(response: dict) -> None:
+        text = json.dumps(response) + "\n"
+        with lock:
+            outstream.write(text)
+            outstream.flush()
+
+    pending = []
+    for line in instream:
+        if line.strip():
+            pending.append(
+                pool.executor.submit(lambda line=line: respond(pool.handle(line)))
+            )
+    for future in pending:
+        future.result()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        serve_stream(
+            self.server.pool,
+            io.TextIOWrapper(self.rfile, encoding="utf-8"),
+            io.TextIOWrapper(self.wfile, encoding="utf-8"),
+        )
+
+
+def serve(
+    socket_path: Optional[str] = None,
+    jobs: Optional[int] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> None:
+    """
+    Run the decompile server with `jobs` worker processes, by default one
+    per CPU. Requests come from stdin, or from connections to the
+    Unix-domain socket `socket_path` if that is given.
+    """
+    pool = WorkerPool(jobs or os.cpu_count() or 1, timeout)
+    try:
+        if socket_path is None:
+            serve_stream(pool, sys.stdin, sys.stdout)
+        else:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            with socketserver.ThreadingUnixStreamServer(
+                socket_path, _RequestHandler
+            ) as server:
+                server.pool = pool
+                try:
+                    server.serve_forever()
+                finally:
+                    os.unlink(socket_path)
+    finally:
+        pool.close()
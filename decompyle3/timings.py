@@ -0,0 +1,306 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Where does the time go when decompiling?
+
+Decompiling goes through these phases for each code object:
+
+  ingest             scanning bytecode into tokens
+  customize_grammar  adding grammar rules for the tokens seen
+  parse              Earley parsing, less the reduction checks
+  reduce_check       reduction checks (reduce_is_invalid)
+  transform          tree transformations
+  globals            finding global and nonlocal names
+  gen_source         turning the tree into text, less the phases of
+                     nested code objects
+
+Timings records the wall time spent and the number of times each phase
+was entered, both over all and for each code object. The time of a phase
+does not include the time of phases started inside it, so the phase
+times add up to the total time. For each code object it also counts
+tokens, grammar rules added by customization and Earley items.
+
+Use it like this:
+
+    with collect_timings() as timings:
+        decompile_file(...)
+        ...
+    report = timings.report()
+
+Timings are collected for the thread that called collect_timings().
+When no Timings is being collected, the instrumentation in the rest of
+decompyle3 costs a function call per phase.
+"""
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Optional
+
+PHASES = (
+    "ingest",
+    "customize_grammar",
+    "parse",
+    "reduce_check",
+    "transform",
+    "globals",
+    "gen_source",
+)
+
+COUNTERS = ("tokens", "rules_added", "earley_items")
+
+_local = threading.local()
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("timings", "name", "record")
+
+    def __init__(self, timings, name: str, record: Optional[dict]):
+        self.timings = timings
+        self.name = name
+        self.record = record
+
+    def __enter__(self):
+        self.timings._enter(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings._exit()
+        return False
+
+
+def _new_phases() -> dict:
+    return {name: {"calls": 0, "seconds": 0.0} for name in PHASES}
+
+
+class Timings:
+    """
+    Phase timings and counters for one or more decompilations.
+    """
+
+    def __init__(self):
+        self.phases = _new_phases()
+        # Records for code objects, keyed by (file name, first line, name).
+        self.code_objects = {}
+        self._stack = []
+        self._last = 0.0
+
+    def code_record(self, code) -> dict:
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        record = self.code_objects.get(key)
+        if record is None:
+            record = self.code_objects[key] = {
+                "filename": code.co_filename,
+                "firstlineno": code.co_firstlineno,
+                "name": code.co_name,
+                "seconds": 0.0,
+                "phases": _new_phases(),
+                **{counter: 0 for counter in COUNTERS},
+            }
+        return record
+
+    def phase(self, name: str, code=None) -> _Phase:
+        """
+        Return a context manager for phase `name`. The time is charged to
+        code object `code`, or if that is None, to the code object of the
+        phase this one is started in.
+        """
+        if code is not None:
+            record = self.code_record(code)
+        elif self._stack:
+            record = self._stack[-1].record
+        else:
+            record = None
+        return _Phase(self, name, record)
+
+    def count(self, **counts) -> None:
+        """
+        Add `counts` to the counters of the code object of the current
+        phase.
+        """
+        if self._stack and self._stack[-1].record is not None:
+            record = self._stack[-1].record
+            for counter, n in counts.items():
+                record[counter] += n
+
+    def _charge(self, now: float) -> None:
+        if self._stack:
+            top = self._stack[-1]
+            elapsed = now - self._last
+            self.phases[top.name]["seconds"] += elapsed
+            if top.record is not None:
+                top.record["phases"][top.name]["seconds"] += elapsed
+                top.record["seconds"] += elapsed
+        self._last = now
+
+    def _enter(self, phase: _Phase) -> None:
+        self._charge(perf_counter())
+        self._stack.append(phase)
+        self.phases[phase.name]["calls"] += 1
+        if phase.record is not None:
+            phase.record["phases"][phase.name]["calls"] += 1
+
+    def _exit(self) -> None:
+        self._charge(perf_counter())
+        self._stack.pop()
+
+    def merge(self, report: dict) -> None:
+        """
+        Add in `report`, which is what report() returned for another
+        Timings, possibly in another process.
+        """
+        for name, phase in report["phases"].items():
+            self.phases[name]["calls"] += phase["calls"]
+            self.phases[name]["seconds"] += phase["seconds"]
+        for code in report["code_objects"]:
+            key = (code["filename"], code["firstlineno"], code["name"])
+            record = self.code_objects.get(key)
+            if record is None:
+                self.code_objects[key] = {
+                    **code,
+                    "phases": {
+                        name: dict(phase) for name, phase in code["phases"].items()
+                    },
+                }
+                continue
+            record["seconds"] += code["seconds"]
+            for counter in COUNTERS:
+                record[counter] += code[counter]
+            for name, phase in code["phases"].items():
+                record["phases"][name]["calls"] += phase["calls"]
+                record["phases"][name]["seconds"] += phase["seconds"]
+
+    def report(self) -> dict:
+        """
+        Return the timings as a dictionary of plain values:
+
+          "phases":       {phase: {"calls": int, "seconds": float}}
+          "code_objects": a list of dictionaries with "filename",
+                          "firstlineno", "name", "seconds", "phases"
+                          and the counters, slowest first
+          "totals":       "seconds", "code_objects" and the counters
+                          summed over all code objects
+        """
+        code_objects = sorted(
+            self.code_objects.values(), key=lambda record: -record["seconds"]
+        )
+        totals = {
+            "seconds": sum(phase["seconds"] for phase in self.phases.values()),
+            "code_objects": len(code_objects),
+        }
+        for counter in COUNTERS:
+            totals[counter] = sum(record[counter] for record in code_objects)
+        return {
+            "phases": {name: dict(phase) for name, phase in self.phases.items()},
+            "code_objects": [
+                {
+                    **record,
+                    "phases": {
+                        name: dict(phase) for name, phase in record["phases"].items()
+                    },
+                }
+                for record in code_objects
+            ],
+            "totals": totals,
+        }
+
+    def format(self, top: int = 10) -> str:
+        """
+        Return the timings as text, with the `top` slowest code objects.
+        """
+        report = self.report()
+        totals = report["totals"]
+        total_seconds = totals["seconds"] or 1.0
+        lines = ["# phase               calls    seconds      %"]
+        for name, phase in report["phases"].items():
+            lines.append(
+                "# %-17s %8d %10.3f %6.1f"
+                % (
+                    name,
+                    phase["calls"],
+                    phase["seconds"],
+                    100.0 * phase["seconds"] / total_seconds,
+                )
+            )
+        lines.append(
+            "# %d code objects, %.3f seconds, %d tokens, %d grammar rules added, "
+            "%d Earley items"
+            % (
+                totals["code_objects"],
+                totals["seconds"],
+                totals["tokens"],
+                totals["rules_added"],
+                totals["earley_items"],
+            )
+        )
+        if report["code_objects"][:top]:
+            lines.append("# slowest code objects:")
+            for record in report["code_objects"][:top]:
+                lines.append(
+                    "#  %8.3fs %7d tokens  %s:%d %s"
+                    % (
+                        record["seconds"],
+                        record["tokens"],
+                        record["filename"],
+                        record["firstlineno"],
+                        record["name"],
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+
+def current_timings() -> Optional[Timings]:
+    """
+    Return the Timings being collected in this thread, or None.
+    """
+    return getattr(_local, "timings", None)
+
+
+def phase(name: str, code=None):
+    """
+    Return a context manager that times phase `name` for code object
+    `code` if timings are being collected; see Timings.phase().
+    """
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        return _NULL_PHASE
+    return timings.phase(name, code)
+
+
+@contextmanager
+def collect_timings(timings: Optional[Timings] = None):
+    """
+    Collect timings in `timings`, or in a new Timings, for the duration
+    of the with statement.
+    """
+    if timings is None:
+        timings = Timings()
+    previous = getattr(_local, "timings", None)
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
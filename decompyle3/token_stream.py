@@ -0,0 +1,323 @@
+#  Copyright (c) 2025 Rocky Bernstein
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Saving the results of scanning a bytecode file, so that it can be
+decompiled later without the file and without scanning it again.
+
+A token-stream file holds, for a module's code object and each code
+object nested in it, what the parser and the semantic actions need from
+scanning it: the code object, its tokens and its "customize"
+dictionary. Along with these go the things from the bytecode file's
+header that decompiling writes out. Scanning and decompiling can then
+be done on different machines, and parses that are slow can be replayed
+without keeping the bytecode around.
+
+To keep the file small, tokens are saved as tuples of their attributes,
+and a code object is saved as its attributes, with the code objects
+nested in it referred to by their place in the file. The instructions
+and tables that go with a code object are not saved: they come from
+disassembling its bytecode again when the file is loaded, which is
+quick next to the rest of scanning.
+
+The file starts with TOKEN_STREAM_MAGIC and is followed by a pickle,
+compressed with zlib. It is loaded with an unpickler that makes only
+the objects a token stream is made of: it finds only the classes in
+ALLOWED_GLOBALS. Anything else is a malformed stream, for which load()
+raises ValueError.
+
+"decompyle3-tokenize --dump" writes these files, and
+decompile_token_stream() in decompyle3.main, or "decompyle3
+--from-tokens", decompiles them. Files are never taken to be token
+streams because of what they start with.
+"""
+
+import io
+import pickle
+import struct
+import sys
+import zlib
+from collections import namedtuple
+from typing import BinaryIO
+
+from xdis import check_object_path, iscode
+from xdis.codetype import to_portable
+
+from decompyle3.load import load_module_mapped
+from decompyle3.scanner import ScannedCode, get_scanner
+from decompyle3.scanners.tok import Token
+
+# Change the number at the end when the format of what we save changes.
+TOKEN_STREAM_MAGIC = b"decompyle3 token stream 2\n"
+
+PICKLE_PROTOCOL = 4
+
+# `scanned_codes` is a list of ScannedCodes; the first one is for the
+# module's code object and the others are for the code objects nested
+# in it, in the order Scanner.scan_tree() gives them.
+TokenStream = namedtuple(
+    "TokenStream",
+    [
+        "version",
+        "timestamp",
+        "magic_int",
+        "python_implementation",
+        "source_size",
+        "scanned_codes",
+    ],
+)
+
+# The attributes of a code object that to_portable() accepts, along
+# with the values to use when a code object doesn't have one.
+CODE_FIELDS = (
+    ("co_argcount", 0),
+    ("co_posonlyargcount", -1),
+    ("co_kwonlyargcount", -1),
+    ("co_nlocals", 0),
+    ("co_stacksize", -1),
+    ("co_flags", 0),
+    ("co_code", b""),
+    ("co_consts", ()),
+    ("co_names", ()),
+    ("co_varnames", ()),
+    ("co_filename", "??"),
+    ("co_name", "??"),
+    ("co_firstlineno", -1),
+    ("co_lnotab", b""),
+    ("co_freevars", ()),
+    ("co_cellvars", ()),
+)
+CODE_FIELD_NAMES = frozenset(name for name, _ in CODE_FIELDS)
+
+# The attributes of a Token that are saved, in the order they are saved
+# in. Its "opc" is that of the scanner.
+TOKEN_FIELDS = (
+    "kind",
+    "attr",
+    "pattr",
+    "offset",
+    "linestart",
+    "op",
+    "has_arg",
+    "optype",
+    "start_offset",
+    "tos_str",
+)
+
+# The classes that a token stream refers to, by module, and so all that
+# TokenStreamUnpickler finds.
+ALLOWED_GLOBALS = {
+    "builtins": {"complex", "frozenset", "set"},
+    "decompyle3.scanners.scanner37base": {"ConstCollection"},
+    "xdis.cross_types": {"UnicodeForPython3"},
+    "xdis.version_info": {"PythonImplementation"},
+}
+
+
+class CodeRef:
+    """
+    Stands for the code object of the index'th ScannedCode of a token
+    stream while the stream is loaded.
+    """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class TokenStreamPickler(pickle.Pickler):
+    """
+    Pickles the parts of a token stream, saving code objects as
+    references to the code objects of its ScannedCodes, whose indices by
+    id() are in `code_indices`.
+    """
+
+    def __init__(self, fp: BinaryIO, code_indices: dict):
+        super().__init__(fp, protocol=PICKLE_PROTOCOL)
+        self.code_indices = code_indices
+
+    def persistent_id(self, obj):
+        if iscode(obj):
+            index = self.code_indices.get(id(obj))
+            if index is None:
+                raise pickle.PicklingError(f"{obj} wasn't scanned")
+            return ("code", index)
+        return None
+
+
+class TokenStreamUnpickler(pickle.Unpickler):
+    """
+    Unpickles what TokenStreamPickler pickles, and nothing else.
+    """
+
+    def find_class(self, module: str, name: str):
+        if name not in ALLOWED_GLOBALS.get(module, ()):
+            raise pickle.UnpicklingError(f"{module}.{name} is not in a token stream")
+        return super().find_class(module, name)
+
+    def persistent_load(self, pid):
+        if (
+            not isinstance(pid, tuple)
+            or len(pid) != 2
+            or pid[0] != "code"
+            or not isinstance(pid[1], int)
+        ):
+            raise pickle.UnpicklingError(f"unknown persistent id {pid!r}")
+        return CodeRef(pid[1])
+
+
+def scan_file(filename: str) -> TokenStream:
+    """
+    Scan the code objects in bytecode file `filename`.
+
+    If given a Python source file (".py"), we'll try to find the
+    corresponding compiled object.
+    """
+    filename = check_object_path(filename)
+    (
+        version,
+        timestamp,
+        magic_int,
+        co,
+        python_implementation,
+        source_size,
+        _,
+        _,
+    ) = load_module_mapped(filename)
+    if isinstance(co, list):
+        raise ValueError(f"{filename} holds more than one module")
+    scanner = get_scanner(version, python_implementation)
+    scanned_codes = list(scanner.scan_tree(co).values())
+    return TokenStream(
+        version,
+        timestamp,
+        magic_int,
+        python_implementation,
+        source_size,
+        scanned_codes,
+    )
+
+
+def dump(stream: TokenStream, fp: BinaryIO) -> None:
+    """
+    Write `stream` to binary file `fp`.
+    """
+    code_indices = {id(scanned.co): i for i, scanned in enumerate(stream.scanned_codes)}
+    codes = []
+    for scanned in stream.scanned_codes:
+        co = scanned.co
+        fields = {name: getattr(co, name, default) for name, default in CODE_FIELDS}
+        tokens = [
+            tuple(getattr(token, name) for name in TOKEN_FIELDS)
+            for token in scanned.tokens
+        ]
+        codes.append((fields, tokens, dict(scanned.customize)))
+
+    data = io.BytesIO()
+    TokenStreamPickler(data, code_indices).dump(
+        (
+            stream.version,
+            stream.timestamp,
+            stream.magic_int,
+            stream.python_implementation,
+            stream.source_size,
+            codes,
+        )
+    )
+    fp.write(TOKEN_STREAM_MAGIC)
+    fp.write(zlib.compress(data.getvalue(), 9))
+
+
+def _scanned_codes(version: tuple, python_implementation, codes: list) -> list:
+    """
+    Make the ScannedCodes of a token stream from the (code fields,
+    tokens, customize) that dump() saved for each.
+    """
+    if not isinstance(codes, list) or not codes:
+        raise ValueError("no code objects")
+
+    # A code object refers only to code objects after it, so they are
+    # made from last to first.
+    code_objects = [None] * len(codes)
+
+    def resolve(value, i: int):
+        if isinstance(value, CodeRef):
+            if not i < value.index < len(codes):
+                raise ValueError(f"bad code object reference {value.index}")
+            return code_objects[value.index]
+        return value
+
+    for i in reversed(range(len(codes))):
+        fields, _, _ = codes[i]
+        if not isinstance(fields, dict) or not CODE_FIELD_NAMES.issuperset(fields):
+            raise ValueError("malformed code object")
+        fields["co_consts"] = tuple(resolve(c, i) for c in fields["co_consts"])
+        code_objects[i] = to_portable(version_triple=version, **fields)
+
+    scanner = get_scanner(version, python_implementation)
+    scanned_codes = []
+    for i, (_, token_fields, customize) in enumerate(codes):
+        if not isinstance(customize, dict):
+            raise ValueError("malformed customize dictionary")
+        tokens = []
+        for values in token_fields:
+            if len(values) != len(TOKEN_FIELDS) or not isinstance(values[0], str):
+                raise ValueError("malformed token")
+            token = Token.__new__(Token)
+            for name, value in zip(TOKEN_FIELDS, values):
+                setattr(token, name, value)
+            token.kind = sys.intern(token.kind)
+            token.attr = resolve(token.attr, i)
+            token.opc = scanner.opc
+            tokens.append(token)
+        co = code_objects[i]
+        scanner.build_instructions(co)
+        scanned_codes.append(ScannedCode(co, scanner, tokens, customize))
+    return scanned_codes
+
+
+def load(fp: BinaryIO) -> TokenStream:
+    """
+    Read a TokenStream that dump() wrote from binary file `fp`.
+    Raise ValueError if `fp` doesn't hold one.
+    """
+    magic = fp.read(len(TOKEN_STREAM_MAGIC))
+    if magic != TOKEN_STREAM_MAGIC:
+        raise ValueError("not a decompyle3 token stream, or one in an older format")
+    try:
+        data = io.BytesIO(zlib.decompress(fp.read()))
+        fields = TokenStreamUnpickler(data).load()
+        stream = TokenStream(*fields)
+        if not isinstance(stream.version, tuple):
+            raise ValueError("malformed version")
+        stream = stream._replace(
+            scanned_codes=_scanned_codes(
+                stream.version, stream.python_implementation, stream.scanned_codes
+            )
+        )
+    except (
+        pickle.UnpicklingError,
+        AttributeError,
+        EOFError,
+        ImportError,
+        IndexError,
+        KeyError,
+        TypeError,
+        ValueError,
+        struct.error,
+        zlib.error,
+    ) as e:
+        raise ValueError(f"malformed decompyle3 token stream: {e}") from e
+    return stream
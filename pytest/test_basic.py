@@ -1,6 +1,11 @@
-from xdis.version_info import PythonImplementation
+import os
+import pickle
+import threading
 
-from decompyle3.parsers.main import get_python_parser
+from xdis.version_info import PYTHON_VERSION_TRIPLE, PythonImplementation
+
+import pytest
+from decompyle3.parsers.main import get_python_parser, parse
 from decompyle3.scanner import get_scanner
 
 
@@ -13,3 +18,105 @@ def test_get_scanner():
 def test_get_parser():
     # See that we can retrieve a sparser using a full version number
     assert get_python_parser((3, 7, 3))
+
+
+def test_parser_cache():
+    # Parsers of the same kind come from a cache, but customizing one
+    # must not change another.
+    p1 = get_python_parser((3, 8, 0))
+    p2 = get_python_parser((3, 8, 0))
+    assert p1 is not p2
+    assert p1.rules == p2.rules
+
+    p1.add_unique_rule("expr ::= SOME_NEW_OPCODE", "SOME_NEW_OPCODE", 0, {})
+    assert ("expr", ("SOME_NEW_OPCODE",)) in p1.rule2func
+    assert ("expr", ("SOME_NEW_OPCODE",)) not in p2.rule2func
+    p3 = get_python_parser((3, 8, 0))
+    assert ("expr", ("SOME_NEW_OPCODE",)) not in p3.rules["expr"]
+
+
+def test_parser_clone_tables():
+    # Copies of a parser made in one thread share their Earley tables;
+    # those made in another thread, even one that reuses the identifier
+    # of a thread that has ended, don't.
+    p1 = get_python_parser((3, 8, 0))
+    p2 = get_python_parser((3, 8, 0))
+    assert p1.grammar_tables is p2.grammar_tables
+
+    tables = []
+    for _ in range(2):
+        thread = threading.Thread(
+            target=lambda: tables.append(get_python_parser((3, 8, 0)).grammar_tables)
+        )
+        thread.start()
+        thread.join()
+    assert tables[0] is not p1.grammar_tables
+    assert tables[1] is not tables[0]
+
+
+def test_grammar_cache(tmp_path, monkeypatch):
+    # A parser whose grammar is read back from the on-disk cache
+    # should be the same as one built from the grammar rules.
+    from decompyle3.parsers.grammar_cache import load_parser, save_parser
+    from decompyle3.parsers.main import build_python_parser, get_parser_class
+
+    monkeypatch.setenv("DECOMPYLE3_CACHE_DIR", str(tmp_path))
+    debug_parser = get_python_parser((3, 8)).debug
+    parser_class = get_parser_class((3, 8), "lambda")
+    assert load_parser(parser_class, debug_parser) is None
+
+    built = build_python_parser((3, 8), debug_parser, "lambda")
+    save_parser(built, debug_parser)
+    loaded = load_parser(parser_class, debug_parser)
+    assert loaded is not None
+    assert isinstance(loaded, parser_class)
+    assert loaded.rules == built.rules
+    assert loaded.rule2name == built.rule2name
+    assert loaded.rule2func.keys() == built.rule2func.keys()
+    assert loaded.check_reduce == built.check_reduce
+    assert loaded.optional_nt == built.optional_nt
+
+    # A cache file that someone else could have written isn't loaded,
+    # and nor is one with classes that a grammar doesn't have.
+    (path,) = tmp_path.glob("grammar/*.pickle")
+    path.chmod(0o664)
+    assert load_parser(parser_class, debug_parser) is None
+    path.chmod(0o600)
+    path.write_bytes(pickle.dumps({"rules": os.system}))
+    assert load_parser(parser_class, debug_parser) is None
+
+    # Where file owners can't be checked, nothing is loaded or saved.
+    path.unlink()
+    monkeypatch.delattr(os, "getuid")
+    save_parser(built, debug_parser)
+    assert not list(tmp_path.glob("grammar/*.pickle"))
+    assert load_parser(parser_class, debug_parser) is None
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_customization_undo():
+    # The rules added in customizing the grammar for a code object are
+    # removed after it has been parsed.
+    async def f(a, *args, **kwargs):
+        return [x async for x in a], {1: 2, **kwargs}, g(*args)
+
+    p = get_python_parser(PYTHON_VERSION_TRIPLE)
+    rules = {lhs: list(rules) for lhs, rules in p.rules.items()}
+    rule2name = dict(p.rule2name)
+    check_reduce = dict(p.check_reduce)
+    new_rules = set(p.new_rules)
+
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE, PythonImplementation.CPython)
+    for i in range(2):
+        tokens, customize = scanner.ingest(f.__code__)
+        p.insts = scanner.insts
+        p.offset2inst_index = scanner.offset2inst_index
+        assert parse(p, tokens, customize, is_lambda=False)
+        assert p.rules == rules
+        assert p.rule2name == rule2name
+        assert p.rule2func.keys() == rule2name.keys()
+        assert p.check_reduce == check_reduce
+        assert p.new_rules == new_rules
+        assert p.grammar_delta is None
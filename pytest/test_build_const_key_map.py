@@ -15,6 +15,9 @@ TESTS = (
     "{'a': 1, 'b': 2}",  # BUILD_CONST_KEY_MAP
     "{'a':'b','c':'d'}",  # BUILD_CONST_KEY_MAP
     "{0.0:'b',0.1:'d'}",  # BUILD_CONST_KEY_MAP
+    "{'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5}",  # CONST_DICT
+    "{0: 'a', 1: None, 2: 2.5, 3: b'x', 4: (1, 2)}",  # CONST_DICT
+    "{'a': x, 'b': 2, 'c': 3, 'd': 4, 'e': 5}",  # BUILD_CONST_DICT
 )
 
 
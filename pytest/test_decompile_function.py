@@ -0,0 +1,108 @@
+import py_compile
+from io import StringIO
+
+import pytest
+from click.testing import CliRunner
+from xdis import load_module
+from xdis.version_info import PYTHON_VERSION_TRIPLE
+
+from decompyle3.bin.decompile import main_bin
+from decompyle3.code_fns import code_qualnames, decompile_function
+
+SOURCE = """
+def deco(f):
+    return f
+
+
+@deco
+def top(a, b=2, *args, c=None, **kw):
+    def inner(y):
+        return y + a
+
+    return inner(b)
+
+
+class K:
+    def meth(self, q=lambda: 5):
+        return q()
+
+    class Nested:
+        def deep(self):
+            return 42
+"""
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_decompile_function(tmp_path):
+    source_path = tmp_path / "module.py"
+    source_path.write_text(SOURCE)
+    pyc_path = str(tmp_path / "module.pyc")
+    py_compile.compile(str(source_path), pyc_path)
+
+    co = load_module(pyc_path)[3]
+    assert [qualname for qualname, _, _ in code_qualnames(co)] == [
+        "deco",
+        "top",
+        "K",
+        "top.<locals>.inner",
+        "K.<lambda>",
+        "K.meth",
+        "K.Nested",
+        "K.Nested.deep",
+    ]
+
+    def decompiled(qualname: str) -> str:
+        out = StringIO()
+        decompile_function(pyc_path, qualname, out)
+        return out.getvalue().strip()
+
+    assert decompiled("top") == (
+        "@deco\n"
+        "def top(a, b=2, *args, c=None, **kw):\n"
+        "\n"
+        "    def inner(y):\n"
+        "        return y + a\n"
+        "\n"
+        "    return inner(b)"
+    )
+    assert decompiled("top.<locals>.inner") == "def inner(y):\n    return y + a"
+    assert decompiled("K.meth") == "def meth(self, q=lambda: 5):\n    return q()"
+    assert decompiled("K.Nested.deep") == "def deep(self):\n    return 42"
+    assert decompiled("K.<lambda>") == "5"
+
+    out = StringIO()
+    decompile_function(pyc_path, "top", out)
+    assert out.getvalue().startswith("@deco\n")
+
+    with pytest.raises(ValueError):
+        decompiled("missing")
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_decompile_function_options(tmp_path):
+    source_path = tmp_path / "module.py"
+    source_path.write_text(SOURCE)
+    pyc_path = str(tmp_path / "module.pyc")
+    py_compile.compile(str(source_path), pyc_path)
+
+    result = CliRunner().invoke(main_bin, ["--function", "K.meth", pyc_path])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("# decompyle3 version ")
+    assert "bytes\n\ndef meth(self, q=lambda: 5):\n" in result.output
+
+    for options in (
+        ["--linemaps"],
+        ["--start-offset", "2"],
+        ["--stop-offset", "10"],
+        ["--cache"],
+        ["--from-tokens"],
+    ):
+        result = CliRunner().invoke(
+            main_bin, ["--function", "K.meth"] + options + [pyc_path]
+        )
+        assert result.exit_code == 2
+        assert f"--function can't be used with {options[0]}" in result.output
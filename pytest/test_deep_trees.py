@@ -0,0 +1,80 @@
+"""
+Trees nest more deeply than the Python stack allows recursion, so
+they must be walked without recursing.
+"""
+
+import sys
+from io import StringIO
+
+from xdis.version_info import PythonImplementation
+
+from decompyle3.parsers.treenode import SyntaxTree
+from decompyle3.scanner import get_scanner
+from decompyle3.scanners.tok import Token
+from decompyle3.semantics.check_ast import checker
+from decompyle3.semantics.helper import (
+    find_all_globals,
+    find_globals_and_nonlocals,
+    find_none,
+)
+from decompyle3.semantics.pysource import SourceWalker
+from decompyle3.semantics.transform import TreeTransform
+
+DEPTH = 10_000
+
+
+def token(kind: str, pattr=None, offset=0) -> Token:
+    return Token(kind, attr=pattr, pattr=pattr, offset=offset, has_arg=True)
+
+
+def sum_tree(n: int) -> SyntaxTree:
+    """The tree of g + a1 + ... + an: n bin_ops, each nested in the next."""
+    tree = SyntaxTree("expr", [token("LOAD_GLOBAL", "g")])
+    for i in range(1, n + 1):
+        tree = SyntaxTree(
+            "expr",
+            [
+                SyntaxTree(
+                    "bin_op",
+                    [
+                        tree,
+                        SyntaxTree("expr", [token("LOAD_FAST", f"a{i}", i)]),
+                        SyntaxTree("binary_operator", [token("BINARY_ADD")]),
+                    ],
+                )
+            ],
+        )
+    return tree
+
+
+def test_deep_tree_passes():
+    assert DEPTH > sys.getrecursionlimit()
+    tree = sum_tree(DEPTH)
+
+    assert tree.first_child() == "LOAD_GLOBAL"
+    assert tree.last_child() == "BINARY_ADD"
+    text = repr(tree)
+    assert text.startswith("expr\n    bin_op (3)\n         0. expr\n")
+    assert text.count("\n") == 6 * DEPTH + 1
+
+    errors = []
+    checker(tree, False, errors)
+    assert errors == []
+    assert find_all_globals(tree, set()) == {"g"}
+    assert find_globals_and_nonlocals(tree, set(), set(), None, (3, 8)) == (
+        set(),
+        set(),
+    )
+    assert not find_none(tree)
+
+    transform = TreeTransform(version=(3, 8), str_with_template=None)
+    transformed = transform.transform(tree, test_deep_tree_passes.__code__, print)
+    assert transformed.names == ({"g"}, set(), set())
+
+
+def test_deep_tree_source():
+    scanner = get_scanner((3, 8), PythonImplementation.CPython)
+    out = StringIO()
+    walker = SourceWalker((3, 8), out, scanner)
+    walker.preorder(sum_tree(DEPTH))
+    assert out.getvalue() == "g + " + " + ".join(f"a{i}" for i in range(1, DEPTH + 1))
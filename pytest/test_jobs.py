@@ -0,0 +1,51 @@
+import os
+import os.path as osp
+from glob import glob
+
+from click.testing import CliRunner
+
+from decompyle3.bin.decompile import main_bin
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8", "run")
+
+
+def decompile_to_dir(out_dir, files, jobs: int):
+    result = CliRunner().invoke(
+        main_bin, ["--jobs", str(jobs), "-o", str(out_dir)] + files
+    )
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_jobs(tmp_path):
+    """Check that decompiling with several processes gives the same
+    results as decompiling serially."""
+    files = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[:4]
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    serial_dir.mkdir()
+    parallel_dir.mkdir()
+
+    decompile_to_dir(serial_dir, files, 1)
+    output = decompile_to_dir(parallel_dir, files, 2)
+    assert f"decompiled {len(files)} files: {len(files)} okay, 0 failed" in output
+
+    serial_files = sorted(os.listdir(serial_dir))
+    assert serial_files == sorted(os.listdir(parallel_dir))
+    for name in serial_files:
+        with open(serial_dir / name) as f1, open(parallel_dir / name) as f2:
+            assert f1.read() == f2.read(), name
+
+
+def test_jobs_stdout_order():
+    """Without -o, files are written to stdout in the order given."""
+    files = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[:6]
+    files.reverse()
+    result = CliRunner().invoke(main_bin, ["--jobs", "3"] + files)
+    assert result.exit_code == 0, result.output
+    done = [
+        line[len("# okay decompiling ") :]
+        for line in result.output.splitlines()
+        if line.startswith("# okay decompiling ")
+    ]
+    assert done == files
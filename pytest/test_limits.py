@@ -0,0 +1,106 @@
+import os
+import os.path as osp
+import time
+
+import pytest
+from click.testing import CliRunner
+
+import decompyle3.main
+from decompyle3.bin.decompile import main_bin, process_file, run_in_workers
+from decompyle3.limits import (
+    HAVE_LIMITS,
+    MEMORY_RLIMIT,
+    DecompileTimeout,
+    MemoryLimitExceeded,
+    file_limits,
+)
+from decompyle3.main import main
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8", "run")
+
+resource = pytest.importorskip("resource")
+
+pytestmark = pytest.mark.skipif(not HAVE_LIMITS, reason="needs setitimer()")
+
+
+def test_file_limits():
+    with pytest.raises(DecompileTimeout):
+        with file_limits(timeout=0.1):
+            while True:
+                time.sleep(0.01)
+
+    # The memory limit stops an allocation however quickly it is made, and
+    # is put back afterwards.
+    old_rlimit = resource.getrlimit(MEMORY_RLIMIT)
+    with pytest.raises(MemoryLimitExceeded):
+        with file_limits(max_memory=1024 * 1024 * 1024):
+            bytearray(2 * 1024 * 1024 * 1024)
+    assert resource.getrlimit(MEMORY_RLIMIT) == old_rlimit
+
+    # Nothing is raised once the with statement is left.
+    with file_limits(timeout=0.1):
+        pass
+    time.sleep(0.2)
+
+
+def test_process_file_timeout():
+    _, counts, _, err, _ = process_file(
+        "01_and_not_else.pyc", SRC_DIR, None, {}, file_timeout=1e-6
+    )
+    assert counts == (1, 0, 1, 0, 1, 0)
+    assert "no result after" in err
+
+    # Later files in the same process are decompiled as usual.
+    _, counts, out, _, _ = process_file("01_and_not_else.pyc", SRC_DIR, None, {})
+    assert counts == (1, 1, 0, 0, 0, 0)
+    assert "def " in out or "if " in out
+
+
+def test_limits_cli(tmp_path):
+    files = [
+        osp.join(SRC_DIR, name)
+        for name in ("01_and_not_else.pyc", "00_chained-compare.pyc")
+    ]
+    result = CliRunner().invoke(
+        main_bin, ["--file-timeout", "1e-6", "-o", str(tmp_path)] + files
+    )
+    assert result.exit_code == 0, result.output
+    assert "decompiled 2 files: 0 okay, 2 failed (2 timed out, 0 out of memory)" in (
+        result.output
+    )
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".py")]
+
+
+def test_partial_output(tmp_path, monkeypatch):
+    """Output written before a limit stops decompiling is set aside."""
+
+    def stopped(filename, outstream, *args):
+        outstream.write("def f(")
+        raise DecompileTimeout("no result")
+
+    monkeypatch.setattr(decompyle3.main, "decompile_file", stopped)
+    with pytest.raises(DecompileTimeout):
+        main(SRC_DIR, str(tmp_path), ["01_and_not_else.pyc"], [])
+    assert os.listdir(tmp_path) == ["01_and_not_else.py_failed"]
+
+
+def die_on_b(filename, is_source=False):
+    if filename == "b":
+        os._exit(1)
+    return filename, (1, 1, 0, 0, 0, 0), "", "", None
+
+
+def test_run_in_workers():
+    """A file whose worker process dies is reported, and the other files are
+    still run."""
+    jobs = [(name, False) for name in "abcdef"]
+    results = list(run_in_workers(die_on_b, jobs, 2))
+    assert [result[0] for result in results] == list("abcdef")
+    assert [result[1] is None for result in results] == [
+        False,
+        True,
+        False,
+        False,
+        False,
+        False,
+    ]
@@ -0,0 +1,41 @@
+import os.path as osp
+from glob import glob
+
+import pytest
+from xdis import iscode, load_module
+
+from decompyle3.load import load_module_mapped
+
+TEST_DIR = osp.join(osp.dirname(__file__), "..", "test")
+
+
+def code_fields(co):
+    fields = [co.co_code, co.co_names, co.co_varnames, co.co_name, co.co_flags]
+    for const in co.co_consts:
+        fields.append(code_fields(const) if iscode(const) else repr(const))
+    return fields
+
+
+def test_load_module_mapped():
+    """Check that loading through a memory map gives what xdis gives."""
+    files = []
+    for corpus in ("3.7", "3.8", "3.8pypy"):
+        pattern = osp.join(TEST_DIR, f"bytecode_{corpus}", "run", "*.pyc")
+        files += sorted(glob(pattern))[:3]
+    assert files
+    for filename in files:
+        expected = load_module(filename)
+        got = load_module_mapped(filename)
+        assert got[:3] + got[4:7] == expected[:3] + expected[4:7], filename
+        assert type(got[3]) is type(expected[3])
+        assert code_fields(got[3]) == code_fields(expected[3])
+
+
+def test_load_truncated(tmp_path):
+    """A malformed file gets the error that xdis gives for it."""
+    filename = sorted(glob(osp.join(TEST_DIR, "bytecode_3.8", "run", "*.pyc")))[0]
+    truncated = tmp_path / "truncated.pyc"
+    with open(filename, "rb") as fp:
+        truncated.write_bytes(fp.read(40))
+    with pytest.raises(ImportError, match="too short to be a valid pyc file"):
+        load_module_mapped(str(truncated))
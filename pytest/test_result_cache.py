@@ -0,0 +1,62 @@
+import os.path as osp
+from glob import glob
+from io import StringIO
+
+from decompyle3.main import decompile_file
+from decompyle3.result_cache import ResultCache, code_hash
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8", "run")
+
+
+def decompile_text(filename: str, result_cache=None) -> str:
+    out = StringIO()
+    decompile_file(filename, out, result_cache=result_cache)
+    return out.getvalue()
+
+
+def test_result_cache(tmp_path):
+    """Check that results which come from the cache are the same as
+    those that don't."""
+    files = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[:4]
+    expected = [decompile_text(filename) for filename in files]
+
+    cache = ResultCache(str(tmp_path))
+    assert [decompile_text(filename, cache) for filename in files] == expected
+    assert cache.hits == 0
+
+    # A new cache object has to read results from disk.
+    cache = ResultCache(str(tmp_path))
+    assert [decompile_text(filename, cache) for filename in files] == expected
+    assert cache.hits == len(files) and cache.misses == 0
+
+
+def test_result_cache_prune(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size=100)
+    for i in range(10):
+        cache.put("%064x" % i, b"x" * 30)
+    assert cache.size <= 75
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("%064x" % 9) == b"x" * 30
+    assert cache.get("%064x" % 0) is None
+
+    # Saving a result again doesn't count its old size as well.
+    cache = ResultCache(str(tmp_path), max_size=100)
+    cache.put("%064x" % 9, b"y" * 30)
+    size = cache.size
+    cache.put("%064x" % 9, b"z" * 20)
+    assert cache.size == size - 10
+
+
+def test_code_hash():
+    def f(a):
+        return a + 1
+
+    def g(a):
+        return a + 2
+
+    version = (3, 8, 0)
+    key = code_hash(f.__code__, version, "CPython")
+    assert key == code_hash(f.__code__, version, "CPython")
+    assert key != code_hash(g.__code__, version, "CPython")
+    assert key != code_hash(f.__code__, (3, 7, 0), "CPython")
+    assert key != code_hash(f.__code__, version, "CPython", "function")
@@ -0,0 +1,284 @@
+import os.path as osp
+from glob import glob
+from io import StringIO
+
+import pytest
+from xdis import iscode, load_module
+from xdis.version_info import PYTHON_IMPLEMENTATION, PYTHON_VERSION_TRIPLE
+
+from decompyle3.disas import disassemble_file
+from decompyle3.scanner import LinearLabelOpcodes, get_scanner
+
+TEST_DIR = osp.join(osp.dirname(__file__), "..", "test")
+
+
+def code_objects(co):
+    yield co
+    for const in co.co_consts:
+        if iscode(const):
+            yield from code_objects(const)
+
+
+def test_findlabels():
+    for version in ("3.7", "3.8"):
+        scanner = get_scanner(version, PYTHON_IMPLEMENTATION)
+        opc = scanner.opc
+        for filename in sorted(
+            glob(osp.join(TEST_DIR, f"bytecode_{version}", "*", "*.pyc"))
+        ):
+            for co in code_objects(load_module(filename)[3]):
+                labels = LinearLabelOpcodes(opc).findlabels(co.co_code, opc)
+                assert labels == set(opc.findlabels(co.co_code, opc)), filename
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_large_loop():
+    # The loop's FOR_ITER jumps more than 65535 bytes, so it has two
+    # EXTENDED_ARGs in front of it.
+    lines = ["def loop(items):", "    total = 0", "    for x in items:"]
+    for i in range(4000):
+        lines += [
+            f"        if x == {i}:",
+            f"            total += {i}",
+            "            continue",
+        ]
+    lines.append("    return total")
+    module = compile("\n".join(lines) + "\n", "<generated>", "exec")
+    co = module.co_consts[0]
+
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE[:2], PYTHON_IMPLEMENTATION)
+    tokens, _ = scanner.ingest(co)
+    for_iter = [token for token in tokens if token.kind == "FOR_ITER"]
+    assert len(for_iter) == 1
+    # The instruction starts at the first EXTENDED_ARG.
+    assert co.co_code[for_iter[0].off2int()] == scanner.opc.EXTENDED_ARG
+
+
+def table_code(n: int):
+    lines = ["def table(x):"]
+    for i in range(n):
+        if i % 2:
+            values = ", ".join(str(i + j) for j in range(5))
+            lines.append(f"    t{i} = {{{values}}}")
+        else:
+            values = ", ".join(str(i + j) for j in range(1, 5))
+            lines.append(f"    t{i} = [x, {values}]")
+    lines.append("    return t0")
+    module = compile("\n".join(lines) + "\n", "<generated>", "exec")
+    return module.co_consts[0]
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_many_collections():
+    # Each collection is bound without copying the tokens before it, so
+    # the work done grows linearly with the number of collections.
+    # Rather than time it, count the tokens in the buffers that binding
+    # is given; test/benchmarks/scaling.py measures the time.
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE[:2], PYTHON_IMPLEMENTATION)
+    bound = scanner.bound_collection_from_tokens
+    buffered = []
+
+    def counting_bound(tokens, next_tokens, *args):
+        buffered.append(len(tokens) + len(next_tokens))
+        result = bound(tokens, next_tokens, *args)
+        assert result is next_tokens
+        return result
+
+    scanner.bound_collection_from_tokens = counting_bound
+    work = []
+    for n in (1000, 10000):
+        buffered.clear()
+        tokens, _ = scanner.ingest(table_code(n))
+        assert len(buffered) == n
+        # Only the collection's own tokens, each made of six
+        # instructions, are ever buffered.
+        assert max(buffered) == 6 + 5
+        work.append(sum(buffered))
+    assert work[1] == 10 * work[0]
+
+    kinds = [t.kind for t in tokens]
+    # Lists with a variable get a token for each value; sets of
+    # constants are made into a single token.
+    assert kinds.count("COLLECTION_START") == 5000
+    assert kinds.count("ADD_VALUE") == 25000
+    assert kinds.count("BUILD_CONST_LIST") == kinds.count("CONST_SET") == 5000
+    assert "LOAD_CONST" not in kinds[: kinds.index("RETURN_VALUE")]
+    assert kinds[:10] == ["COLLECTION_START"] + ["ADD_VALUE"] * 5 + [
+        "BUILD_CONST_LIST",
+        "STORE_FAST",
+        "CONST_SET",
+        "STORE_FAST",
+    ]
+    const_set = tokens[8]
+    assert const_set.attr.values == ("1", "2", "3", "4", "5")
+    assert const_set.attr.keys == ()
+    assert const_set.offset == tokens[9].off2int() - 12
+
+
+@pytest.mark.skipif(
+    not (3, 7) <= PYTHON_VERSION_TRIPLE < (3, 9), reason="asssume Python 3.7 or 3.8"
+)
+def test_side_tables():
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE[:2], PYTHON_IMPLEMENTATION)
+    co = test_side_tables.__code__
+    scanner.ingest(co)
+    codelen = len(co.co_code)
+
+    for i, inst in enumerate(scanner.insts):
+        assert scanner.offset2inst_index[inst.offset] == i
+        assert inst.offset in scanner.offset2inst_index
+    for offset in (-2, 1, codelen, "10_0"):
+        assert offset not in scanner.offset2inst_index
+        with pytest.raises(KeyError):
+            scanner.offset2inst_index[offset]
+    assert scanner.offset2inst_index.get(codelen, -1) == -1
+
+    linestarts = sorted(scanner.linestarts.items())
+    for offset in range(codelen):
+        line_starts = [start for start in linestarts if start[0] <= offset]
+        after = [start for start, _ in linestarts if start > offset]
+        assert scanner.lines[offset] == (line_starts[-1][1], (after + [codelen])[0])
+    assert scanner.lines[-1] == scanner.lines[codelen - 1]
+    with pytest.raises(IndexError):
+        scanner.lines[codelen]
+
+    assert len(scanner.prev_op) == codelen + 1
+    assert scanner.prev_op[2] == 0
+
+
+def scan_first_last(scanner, start, end, instr, target, exact):
+    """first_instr() and last_instr() by looking at every instruction."""
+    found = []
+    for offset in range(start, end, 2):
+        op = scanner.code[offset]
+        if op in instr and op != scanner.opc.EXTENDED_ARG:
+            found.append((offset, scanner.get_target(offset)))
+    first = last = None
+    if target is None:
+        if found:
+            first, last = found[0][0], found[-1][0]
+        return first, last
+    exact_matches = [offset for offset, dest in found if dest == target]
+    if exact_matches:
+        return exact_matches[0], exact_matches[-1]
+    if exact or not found:
+        return None, None
+    distances = [abs(target - dest) for _, dest in found]
+    closest = min(distances)
+    closest_offsets = [o for (o, _), d in zip(found, distances) if d == closest]
+    # Only jumps closer than the length of the code count.
+    if closest < len(scanner.code):
+        first = closest_offsets[0]
+    if closest <= scanner.insts[-1].offset - scanner.insts[0].offset:
+        last = closest_offsets[-1]
+    return first, last
+
+
+def test_instruction_search():
+    for version in ("3.7", "3.8"):
+        scanner = get_scanner(version, PYTHON_IMPLEMENTATION)
+        opc = scanner.opc
+        jumps = sorted(opc.JREL_OPS | opc.JABS_OPS)
+        for filename in sorted(
+            glob(osp.join(TEST_DIR, f"bytecode_{version}", "*", "*.pyc"))
+        )[:40]:
+            for co in code_objects(load_module(filename)[3]):
+                scanner.ingest(co)
+                insts = scanner.insts
+                end = len(scanner.code)
+                for inst in insts[:: max(1, len(insts) // 8)]:
+                    start = inst.offset
+                    assert scanner.inst_matches(start, end, jumps) == [
+                        i.offset
+                        for i in insts
+                        if i.offset >= start and i.opcode in jumps
+                    ]
+                    for op in jumps:
+                        for target, exact in (
+                            (None, True),
+                            (start, True),
+                            (end, False),
+                        ):
+                            if target is not None and op == opc.EXTENDED_ARG:
+                                continue
+                            first, last = scan_first_last(
+                                scanner, start, end, [op], target, exact
+                            )
+                            assert (
+                                scanner.last_instr(start, end, op, target, exact)
+                                == last
+                            )
+                            if op != opc.EXTENDED_ARG:
+                                assert (
+                                    scanner.first_instr(start, end, op, target, exact)
+                                    == first
+                                )
+
+
+def test_ingest_tokens():
+    for version in ("3.7", "3.8"):
+        scanner = get_scanner(version, PYTHON_IMPLEMENTATION)
+        for filename in sorted(
+            glob(osp.join(TEST_DIR, f"bytecode_{version}", "*", "*.pyc"))
+        )[:20]:
+            for co in code_objects(load_module(filename)[3]):
+                tokens, customize = scanner.ingest(co)
+                streamed = [
+                    (t.kind, t.offset, t.pattr) for t in scanner.ingest_tokens(co)
+                ]
+                assert streamed == [(t.kind, t.offset, t.pattr) for t in tokens]
+                assert scanner.customize == customize
+
+
+def test_disassemble_file():
+    filename = osp.join(TEST_DIR, "bytecode_3.8", "run", "01_and_not_else.pyc")
+    out = StringIO()
+    disassemble_file(filename, out)
+    assert "# Python (3, 8" in out.getvalue()
+    assert "COME_FROM" in out.getvalue()
+
+
+def test_scanned_code():
+    filename = osp.join(TEST_DIR, "bytecode_3.8", "run", "01_and_not_else.pyc")
+    version, _, _, co, python_implementation = load_module(filename)[:5]
+    scanner = get_scanner(version, python_implementation)
+    outer = scanner.scan(co)
+    tokens = [(t.kind, t.offset) for t in outer.tokens]
+    insts = outer.insts
+
+    # Scanning a nested code object leaves the first results alone.
+    inner_co = next(c for c in co.co_consts if iscode(c))
+    inner = scanner.scan(inner_co)
+    assert inner.insts is not outer.insts
+    assert [(t.kind, t.offset) for t in outer.tokens] == tokens
+    assert outer.insts is insts
+    assert outer.insts[outer.offset2inst_index[0]].offset == 0
+
+    with pytest.raises(AttributeError):
+        outer.insts = inner.insts
+    with pytest.raises(TypeError):
+        outer.customize["x"] = 1
+
+
+def test_scan_tree():
+    filename = osp.join(TEST_DIR, "bytecode_3.8", "run", "01_and_not_else.pyc")
+    version, _, _, co, python_implementation = load_module(filename)[:5]
+    scanner = get_scanner(version, python_implementation)
+    scanned_codes = scanner.scan_tree(co)
+
+    # Every code object in the tree is scanned, outermost first, and
+    # gives the same tokens as scanning it on its own does.
+    assert len(scanned_codes) > 1
+    assert [id(c) for c in code_objects(co)] == list(scanned_codes)
+    for c in code_objects(co):
+        scanned = scanned_codes[id(c)]
+        assert scanned.co is c
+        tokens, customize = get_scanner(version, python_implementation).ingest(c)
+        assert [(t.kind, t.offset, t.attr) for t in scanned.tokens] == [
+            (t.kind, t.offset, t.attr) for t in tokens
+        ]
+        assert dict(scanned.customize) == customize
@@ -0,0 +1,61 @@
+import base64
+import json
+import os.path as osp
+from io import StringIO
+
+from decompyle3.main import decompile_file
+from decompyle3.server import WorkerPool, decompile_request, serve_stream
+
+PYC = osp.join(
+    osp.dirname(__file__), "..", "test", "bytecode_3.8", "run", "01_and_not_else.pyc"
+)
+
+
+def test_decompile_request():
+    out = StringIO()
+    decompile_file(PYC, out)
+    expected = out.getvalue()
+
+    assert decompile_request({"path": PYC}) == {"status": "ok", "source": expected}
+
+    with open(PYC, "rb") as fp:
+        pyc = base64.b64encode(fp.read()).decode("ascii")
+    response = decompile_request({"pyc": pyc, "linemap": True})
+    assert response["status"] == "ok"
+    assert response["linemap"]
+
+    assert decompile_request({})["status"] == "invalid"
+    assert decompile_request({"path": "/does/not/exist.pyc"})["status"] == "failed"
+
+
+def test_serve_stream():
+    requests = [
+        {"id": 1, "path": PYC},
+        "not JSON",
+        {"id": 3, "path": PYC, "timeout": 1e-6},
+        {"id": 4, "path": PYC},
+        {"id": 5, "path": PYC, "timeout": None},
+        {"id": 6, "path": PYC, "timeout": [1]},
+        {"id": 7, "path": PYC, "timeout": -1},
+    ]
+    instream = StringIO(
+        "".join((r if isinstance(r, str) else json.dumps(r)) + "\n" for r in requests)
+    )
+    outstream = StringIO()
+    pool = WorkerPool(1)
+    try:
+        serve_stream(pool, instream, outstream)
+    finally:
+        pool.close()
+
+    responses = [json.loads(line) for line in outstream.getvalue().splitlines()]
+    status = {response["id"]: response["status"] for response in responses}
+    assert status == {
+        1: "ok",
+        None: "invalid",
+        3: "timeout",
+        4: "ok",
+        5: "invalid",
+        6: "invalid",
+        7: "invalid",
+    }
@@ -0,0 +1,49 @@
+from io import StringIO
+
+from xdis.version_info import PythonImplementation
+
+from decompyle3.parsers.treenode import SyntaxTree
+from decompyle3.scanner import get_scanner
+from decompyle3.scanners.tok import Token
+from decompyle3.semantics.pysource import SourceWalker
+from decompyle3.semantics.templates import compile_template
+
+
+def name(kind: str, pattr: str) -> SyntaxTree:
+    return SyntaxTree(
+        "expr", [Token(kind, attr=pattr, pattr=pattr, offset=0, has_arg=True)]
+    )
+
+
+def test_compile_template():
+    entry = ("%c(%P)%{%[1]c}", 0, (1, -1, ", ", 100), 0)
+    template = compile_template(entry)
+    assert compile_template(entry) is template
+    assert compile_template(tuple(list(entry))) is template
+    assert [op.typ for op in template.ops] == ["c", "P", "{"]
+    assert template.ops[0].arg == (0, None)
+    assert template.ops[1].arg == (1, -1, ", ", 100)
+    assert template.ops[2].arg.ops[0] == ("", "c", 1, (0, None), 1)
+    assert template.tail == ""
+
+    # Entries that can't be cached are still compiled.
+    listed = compile_template(("%C", [0, 2, ", "]))
+    assert listed.ops[0].arg == (0, 2, ", ")
+
+
+def test_template_engine():
+    scanner = get_scanner((3, 8), PythonImplementation.CPython)
+    out = StringIO()
+    walker = SourceWalker((3, 8), out, scanner)
+    node = SyntaxTree(
+        "call",
+        [
+            name("LOAD_GLOBAL", "f"),
+            name("LOAD_FAST", "a"),
+            Token("LOAD_FAST", attr="b", pattr="b", offset=0, has_arg=True),
+        ],
+    )
+    walker.template_engine(
+        ("%c(%C) %[1]{%c} %% %[2]{pattr}.", (0, "expr"), (1, 3, ", "), 0), node
+    )
+    assert out.getvalue() == "f(a, b) a % b."
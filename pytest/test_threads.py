@@ -0,0 +1,37 @@
+import os.path as osp
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from io import StringIO
+
+from decompyle3.main import decompile_file
+
+TEST_DIR = osp.join(osp.dirname(__file__), "..", "test")
+
+
+def decompile_text(filename: str) -> str:
+    out = StringIO()
+    decompile_file(filename, out)
+    return out.getvalue()
+
+
+def test_threads():
+    """Check that decompiling in several threads at once, and for more
+    than one Python version, gives the same results as decompiling
+    one file at a time."""
+    files = []
+    for version in ("3.7", "3.8"):
+        files += sorted(
+            glob(osp.join(TEST_DIR, f"bytecode_{version}", "run", "*.pyc"))
+        )[:6]
+    expected = [decompile_text(filename) for filename in files]
+
+    # Switch threads often, so that they interleave in many places.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            got = list(executor.map(decompile_text, files * 3))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert got == expected * 3
@@ -0,0 +1,48 @@
+import os.path as osp
+from io import StringIO
+
+from decompyle3.main import decompile_file
+from decompyle3.timings import PHASES, Timings, collect_timings, current_timings
+
+PYC = osp.join(
+    osp.dirname(__file__), "..", "test", "bytecode_3.8", "run", "01_and_not_else.pyc"
+)
+
+
+def test_timings():
+    with collect_timings() as timings:
+        decompile_file(PYC, StringIO())
+    assert current_timings() is None
+
+    report = timings.report()
+    assert set(report["phases"]) == set(PHASES)
+    for name in ("ingest", "customize_grammar", "parse", "gen_source"):
+        assert report["phases"][name]["calls"] > 0
+
+    totals = report["totals"]
+    assert totals["code_objects"] == len(report["code_objects"]) > 0
+    assert totals["tokens"] > 0
+    assert totals["rules_added"] > 0
+    assert totals["earley_items"] > totals["tokens"]
+
+    # Phase times don't overlap, so they add up to the code object's time.
+    for record in report["code_objects"]:
+        assert (
+            abs(
+                sum(phase["seconds"] for phase in record["phases"].values())
+                - record["seconds"]
+            )
+            < 1e-6
+        )
+
+    # Reports from several decompilations add up.
+    merged = Timings()
+    merged.merge(report)
+    merged.merge(report)
+    merged_report = merged.report()
+    assert merged_report["totals"]["tokens"] == 2 * totals["tokens"]
+    assert (
+        merged_report["phases"]["parse"]["calls"]
+        == 2 * report["phases"]["parse"]["calls"]
+    )
+    assert "code objects" in merged.format()
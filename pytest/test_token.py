@@ -1,4 +1,6 @@
-from decompyle3.scanners.tok import Token
+import pytest
+
+from decompyle3.scanners.tok import Token, eval_namespace
 
 
 def test_token():
@@ -24,5 +26,24 @@ def test_token():
     assert t.format(token_num=5) == expect, t.format(token_num=5)
 
 
+def test_token_slots():
+    t = Token("LOAD_FAST", offset=4, attr="x", pattr="x", has_arg=True)
+    assert not hasattr(t, "__dict__")
+    with pytest.raises(AttributeError):
+        t.no_such_attribute = 1
+
+    # Semantic actions set these on some tokens; they start out unset.
+    assert not hasattr(t, "parent")
+    t.parent = None
+    assert hasattr(t, "parent")
+
+    # %{...} template expressions are evaluated with a token's attributes.
+    d = eval_namespace(t)
+    assert eval("pattr", d, d) == "x"
+    assert eval("str(offset + 2)", d, d) == "6"
+    with pytest.raises(NameError):
+        eval("no_such_attribute", d, d)
+
+
 if __name__ == "__main__":
     test_token()
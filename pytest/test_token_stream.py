@@ -0,0 +1,116 @@
+import os
+import os.path as osp
+import pickle
+import zlib
+from glob import glob
+from io import BytesIO, StringIO
+
+import pytest
+
+from decompyle3.main import decompile_file, decompile_token_stream, main
+from decompyle3.scanners.scanner37base import Scanner37Base
+from decompyle3.token_stream import TOKEN_STREAM_MAGIC, dump, load, scan_file
+
+SRC_DIR = osp.join(osp.dirname(__file__), "..", "test", "bytecode_3.8", "run")
+
+
+def decompile_text(filename: str, from_tokens: bool = False) -> str:
+    out = StringIO()
+    if from_tokens:
+        decompile_token_stream(filename, out)
+    else:
+        decompile_file(filename, out)
+    return out.getvalue()
+
+
+def test_token_stream(tmp_path, monkeypatch):
+    """Check that decompiling saved tokens gives the same text as
+    decompiling the bytecode file they came from, without scanning."""
+    files = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[:4]
+    expected = [decompile_text(filename) for filename in files]
+
+    dump_paths = []
+    for i, filename in enumerate(files):
+        dump_path = str(tmp_path / f"{i}.tokens")
+        with open(dump_path, "wb") as fp:
+            dump(scan_file(filename), fp)
+        dump_paths.append(dump_path)
+
+    def no_scanning(*args, **kwargs):
+        raise AssertionError("the scanner was run")
+
+    monkeypatch.setattr(Scanner37Base, "ingest", no_scanning)
+    assert [
+        decompile_text(dump_path, from_tokens=True) for dump_path in dump_paths
+    ] == expected
+
+
+def test_token_stream_load(tmp_path):
+    filename = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[0]
+    stream = scan_file(filename)
+    dump_path = tmp_path / "module.tokens"
+    with open(dump_path, "wb") as fp:
+        dump(stream, fp)
+    with open(dump_path, "rb") as fp:
+        loaded = load(fp)
+
+    assert loaded.version == stream.version
+    assert len(loaded.scanned_codes) == len(stream.scanned_codes)
+    for scanned, loaded_scanned in zip(stream.scanned_codes, loaded.scanned_codes):
+        assert [(t.kind, t.offset, t.pattr) for t in loaded_scanned.tokens] == [
+            (t.kind, t.offset, t.pattr) for t in scanned.tokens
+        ]
+        assert loaded_scanned.customize == scanned.customize
+
+    # Streams are kept to about the size of the bytecode they came from.
+    annotate_filename = osp.join(SRC_DIR, "04_def_annotate.pyc")
+    data = BytesIO()
+    dump(scan_file(annotate_filename), data)
+    assert len(data.getvalue()) < 2 * osp.getsize(annotate_filename)
+
+    with open(filename, "rb") as fp:
+        with pytest.raises(ValueError):
+            load(fp)
+
+
+class Exploit:
+    def __reduce__(self):
+        return os.system, ("touch exploited",)
+
+
+def test_token_stream_untrusted(tmp_path, monkeypatch):
+    """Token streams are only read when asked for, and then only
+    the objects that a token stream is made of are made."""
+    monkeypatch.chdir(tmp_path)
+    evil_path = tmp_path / "evil.pyc"
+    evil_path.write_bytes(TOKEN_STREAM_MAGIC + zlib.compress(pickle.dumps(Exploit())))
+
+    with pytest.raises(Exception):
+        decompile_file(str(evil_path), StringIO())
+    with pytest.raises(ValueError):
+        decompile_token_stream(str(evil_path), StringIO())
+    assert not (tmp_path / "exploited").exists()
+
+    # Nothing but code objects is referred to outside of the pickle.
+    module = object()
+
+    class ModulePickler(pickle.Pickler):
+        def persistent_id(self, obj):
+            return ("module", "antigravity") if obj is module else None
+
+    data = BytesIO()
+    ModulePickler(data).dump(module)
+    with pytest.raises(ValueError):
+        load(BytesIO(TOKEN_STREAM_MAGIC + zlib.compress(data.getvalue())))
+
+    # Streams that are cut short are malformed; main() reports them.
+    filename = sorted(glob(osp.join(SRC_DIR, "*.pyc")))[0]
+    data = BytesIO()
+    dump(scan_file(filename), data)
+    truncated_path = tmp_path / "truncated.tokens"
+    truncated_path.write_bytes(data.getvalue()[:200])
+    with pytest.raises(ValueError):
+        decompile_token_stream(str(truncated_path), StringIO())
+    assert main(str(tmp_path), None, ["truncated.tokens"], [], from_tokens=True)[
+        :3
+    ] == (1, 0, 1)
@@ -0,0 +1,72 @@
+from decompyle3.parsers.treenode import SyntaxTree
+from decompyle3.scanners.tok import Token
+from decompyle3.semantics.check_ast import checker
+from decompyle3.semantics.helper import (
+    find_all_globals,
+    find_globals_and_nonlocals,
+    tree_names,
+)
+from decompyle3.semantics.transform import TreeTransform
+
+
+def closure_code():
+    c = 1
+
+    def inner():
+        nonlocal c
+        c = 2
+
+    return inner.__code__
+
+
+def token(kind: str, pattr=None) -> Token:
+    return Token(kind, attr=pattr, pattr=pattr, offset=0, has_arg=True)
+
+
+def parse_tree() -> SyntaxTree:
+    return SyntaxTree(
+        "stmts",
+        [
+            SyntaxTree("continue", [token("CONTINUE")]),
+            SyntaxTree(
+                "for",
+                [
+                    SyntaxTree("break", [token("BREAK_LOOP")]),
+                    SyntaxTree(
+                        "assign",
+                        [
+                            token("LOAD_GLOBAL", "a"),
+                            SyntaxTree("store", [token("STORE_GLOBAL", "b")]),
+                        ],
+                    ),
+                    SyntaxTree("store", [token("STORE_DEREF", "c")]),
+                    SyntaxTree("store", [token("STORE_DEREF", "d")]),
+                ],
+            ),
+            SyntaxTree("delete", [token("DELETE_GLOBAL", "e")]),
+        ],
+    )
+
+
+def test_transform_checks_and_names():
+    """Checking and finding names happen as the tree is transformed."""
+    code = closure_code()
+
+    expected_errors = []
+    checker(parse_tree(), False, expected_errors)
+    assert len(expected_errors) == 1 and "not in loop" in expected_errors[0]
+    globs, nonlocals = find_globals_and_nonlocals(
+        parse_tree(), set(), set(), code, (3, 8)
+    )
+    all_globals = find_all_globals(parse_tree(), set())
+
+    errors = []
+    transform = TreeTransform(version=(3, 8), str_with_template=None)
+    tree = transform.transform(parse_tree(), code, print, errors)
+    assert errors == expected_errors
+    assert tree.names == (all_globals, globs, nonlocals)
+    assert tree.names == ({"a", "b", "e"}, {"b", "e"}, {"c"})
+    assert tree_names(tree, code, (3, 8)) is tree.names
+
+    # Trees that weren't transformed are walked.
+    assert tree_names(parse_tree(), code, (3, 8)) == tree.names
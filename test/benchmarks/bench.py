@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# emacs-mode: -*-python-*-
+"""
+bench.py -- measure how fast decompyle3 decompiles the bundled bytecode
+
+Usage-Examples:
+
+  # Decompile the 3.7 and 3.8 corpora and save the results
+  bench.py run --output before.json
+
+  # Just the 3.8 files, best of 3 runs of each
+  bench.py run --corpus 3.8 --repeat 3 --output after.json
+
+  # Peak traced memory for each file too (much slower)
+  bench.py run --memory --output after.json
+
+  # Show what got slower by more than 10%
+  bench.py compare before.json after.json --threshold 10
+
+"run" decompiles each .pyc file in the corpora under test/bytecode_<corpus>,
+in this process, and reports the time taken in each phase of
+decompiling (see decompyle3.timings), the files that took longest,
+tokens per second and peak memory. With --output, the results are saved
+as JSON.
+
+"compare" reads two such JSON files and lists the phases, totals and
+files whose time went up by more than the threshold percentage. It exits
+with status 1 if there are any, so it can be used to check a change.
+Files that took less than --min-seconds in both runs are ignored, since
+their times are mostly noise.
+"""
+
+import argparse
+import json
+import os.path as osp
+import platform
+import sys
+import tracemalloc
+from glob import glob
+from io import StringIO
+from time import perf_counter
+
+from xdis.version_info import PYTHON_IMPLEMENTATION
+
+from decompyle3.main import decompile_file
+from decompyle3.parsers.main import get_python_parser
+from decompyle3.timings import PHASES, Timings, collect_timings
+from decompyle3.version import __version__
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TEST_DIR = osp.normpath(osp.join(osp.dirname(__file__), ".."))
+
+CORPORA = ("3.7", "3.8", "3.7pypy", "3.8pypy")
+DEFAULT_CORPORA = ("3.7", "3.8")
+
+
+def corpus_files(corpus: str) -> list:
+    """
+    Return the .pyc files of `corpus`, relative to the test directory.
+    Code fragments are left out; they aren't whole modules.
+    """
+    pattern = osp.join(TEST_DIR, f"bytecode_{corpus}", "**", "*.pyc")
+    return sorted(
+        osp.relpath(path, TEST_DIR)
+        for path in glob(pattern, recursive=True)
+        if "code-fragment" not in path
+    )
+
+
+def peak_rss() -> int:
+    """
+    Return the largest resident set size this process has had, in bytes,
+    or 0 if that can't be found.
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def warm_up() -> float:
+    """
+    Build the parsers that decompiling the corpora needs, and return the
+    time that took. This is paid once per process, so it is kept out of
+    the times for each file.
+    """
+    start = perf_counter()
+    for version in ((3, 7), (3, 8)):
+        for compile_mode in ("exec", "lambda"):
+            get_python_parser(version, compile_mode=compile_mode)
+    return perf_counter() - start
+
+
+def bench_file(path: str, repeat: int, trace_memory: bool) -> dict:
+    """
+    Decompile `path` `repeat` times and return the figures for the
+    fastest run.
+    """
+    best = None
+    for _ in range(repeat):
+        timings = Timings()
+        if trace_memory:
+            tracemalloc.start()
+        status = "ok"
+        start = perf_counter()
+        try:
+            with collect_timings(timings):
+                decompile_file(path, StringIO())
+        except Exception:
+            status = "failed"
+        seconds = perf_counter() - start
+        peak_memory = None
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if best is None or seconds < best["seconds"]:
+            report = timings.report()
+            best = {
+                "status": status,
+                "seconds": seconds,
+                "tokens": report["totals"]["tokens"],
+                "earley_items": report["totals"]["earley_items"],
+                "phases": {
+                    name: phase["seconds"] for name, phase in report["phases"].items()
+                },
+                "peak_memory": peak_memory,
+            }
+    return best
+
+
+def run(args) -> int:
+    files = []
+    for corpus in args.corpus:
+        files += corpus_files(corpus)[: args.limit]
+    if not files:
+        print("No bytecode files found", file=sys.stderr)
+        return 1
+
+    warm_up_seconds = warm_up()
+    results = {}
+    for i, name in enumerate(files, 1):
+        if args.verbose:
+            print(f"[{i}/{len(files)}] {name}", file=sys.stderr)
+        results[name] = bench_file(osp.join(TEST_DIR, name), args.repeat, args.memory)
+
+    seconds = sum(result["seconds"] for result in results.values())
+    tokens = sum(result["tokens"] for result in results.values())
+    phases = {
+        name: sum(result["phases"][name] for result in results.values())
+        for name in PHASES
+    }
+    summary = {
+        "python": f"{PYTHON_IMPLEMENTATION} {platform.python_version()}",
+        "decompyle3": __version__,
+        "corpora": list(args.corpus),
+        "repeat": args.repeat,
+        "warm_up_seconds": warm_up_seconds,
+        "totals": {
+            "files": len(results),
+            "failed": sum(result["status"] != "ok" for result in results.values()),
+            "seconds": seconds,
+            "tokens": tokens,
+            "tokens_per_second": tokens / seconds if seconds else 0.0,
+            "peak_rss": peak_rss(),
+        },
+        "phases": phases,
+        "files": results,
+    }
+    print_summary(summary, args.top)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(summary, fp, indent=1, sort_keys=True)
+            fp.write("\n")
+    return 0
+
+
+def print_summary(summary: dict, top: int) -> None:
+    totals = summary["totals"]
+    print(f"# {summary['python']}, decompyle3 {summary['decompyle3']}")
+    print(
+        f"# {totals['files']} files ({totals['failed']} failed) in "
+        f"{totals['seconds']:.3f} seconds, after {summary['warm_up_seconds']:.3f} "
+        "seconds building parsers"
+    )
+    print(
+        f"# {totals['tokens']} tokens, {totals['tokens_per_second']:.0f} tokens/second"
+    )
+    if totals["peak_rss"]:
+        print(f"# peak RSS {totals['peak_rss'] / (1024 * 1024):.1f} MB")
+    print("#")
+    print("# phase                seconds      %")
+    for name, seconds in summary["phases"].items():
+        share = 100.0 * seconds / totals["seconds"] if totals["seconds"] else 0.0
+        print(f"# {name:<17} {seconds:10.3f} {share:6.1f}")
+    print("#")
+    print("# slowest files:")
+    slowest = sorted(summary["files"].items(), key=lambda item: -item[1]["seconds"])
+    for name, result in slowest[:top]:
+        memory = ""
+        if result["peak_memory"] is not None:
+            memory = f" {result['peak_memory'] / (1024 * 1024):8.1f} MB"
+        status = "" if result["status"] == "ok" else f" ({result['status']})"
+        print(
+            f"#  {result['seconds']:8.3f}s {result['tokens']:7d} tokens{memory}  "
+            f"{name}{status}"
+        )
+
+
+def slower(old: float, new: float, threshold: float) -> bool:
+    return new > old * (1 + threshold / 100.0)
+
+
+def compare(args) -> int:
+    with open(args.old) as fp:
+        old = json.load(fp)
+    with open(args.new) as fp:
+        new = json.load(fp)
+
+    def change(old_seconds: float, new_seconds: float) -> str:
+        if not old_seconds:
+            return "     new"
+        return f"{100.0 * (new_seconds - old_seconds) / old_seconds:+7.1f}%"
+
+    regressions = []
+    print("# what                       old seconds  new seconds   change")
+    rows = [("total", old["totals"]["seconds"], new["totals"]["seconds"])]
+    rows += [
+        (f"phase {name}", old["phases"].get(name, 0.0), new["phases"][name])
+        for name in new["phases"]
+    ]
+    for what, old_seconds, new_seconds in rows:
+        flag = ""
+        if slower(old_seconds, new_seconds, args.threshold):
+            flag = "  <-- slower"
+            regressions.append(what)
+        print(
+            f"# {what:<25} {old_seconds:12.3f} {new_seconds:12.3f} "
+            f"{change(old_seconds, new_seconds)}{flag}"
+        )
+    old_rate = old["totals"]["tokens_per_second"]
+    new_rate = new["totals"]["tokens_per_second"]
+    print(f"# tokens/second: {old_rate:.0f} -> {new_rate:.0f}")
+
+    slower_files = []
+    for name, new_result in new["files"].items():
+        old_result = old["files"].get(name)
+        if old_result is None:
+            continue
+        if old_result["status"] != new_result["status"]:
+            print(f"# {name}: {old_result['status']} -> {new_result['status']}")
+        old_seconds, new_seconds = old_result["seconds"], new_result["seconds"]
+        if max(old_seconds, new_seconds) < args.min_seconds:
+            continue
+        if slower(old_seconds, new_seconds, args.threshold):
+            slower_files.append((name, old_seconds, new_seconds))
+    if slower_files:
+        print(f"# files more than {args.threshold}% slower:")
+        for name, old_seconds, new_seconds in sorted(
+            slower_files, key=lambda item: item[1] - item[2]
+        ):
+            print(
+                f"#  {old_seconds:8.3f}s -> {new_seconds:8.3f}s "
+                f"{change(old_seconds, new_seconds)}  {name}"
+            )
+        regressions += [name for name, _, _ in slower_files]
+
+    if regressions:
+        print(f"# {len(regressions)} regressions over {args.threshold}%")
+        return 1
+    print(f"# no regressions over {args.threshold}%")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark decompyle3 over the bundled bytecode corpora."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="decompile the corpora")
+    run_parser.add_argument(
+        "--corpus",
+        action="append",
+        choices=CORPORA,
+        help="corpus to decompile; may be given more than once. Default: "
+        + " and ".join(DEFAULT_CORPORA),
+    )
+    run_parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="decompile at most this many files from each corpus",
+    )
+    run_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="decompile each file this many times and keep the fastest",
+    )
+    run_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="trace the peak memory allocated for each file (slow)",
+    )
+    run_parser.add_argument(
+        "--top", type=int, default=10, help="number of slowest files to show"
+    )
+    run_parser.add_argument("--output", "-o", help="save the results in this file")
+    run_parser.add_argument("--verbose", "-v", action="store_true")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("old", help="results of the earlier run")
+    compare_parser.add_argument("new", help="results of the later run")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="percentage by which a time must go up to count as a regression",
+    )
+    compare_parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.05,
+        help="ignore files that took less than this in both runs",
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and not args.corpus:
+        args.corpus = list(DEFAULT_CORPORA)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# emacs-mode: -*-python-*-
+"""
+scaling.py -- check that scanning grows linearly with the size of the code
+
+Usage-Examples:
+
+  # Scan generated functions of 500 to 8000 cases
+  scaling.py
+
+  # Other sizes
+  scaling.py --sizes 250,750,2250
+
+Each test function is generated, compiled by the running Python, and
+the time to turn its bytecode into tokens (the scanner's ingest(), with
+its jump-target and control-flow pass) is measured. Generated code is
+like that found in large machine-written modules: a dispatch function
+with one if/elif branch per case, a loop with a branch per case in its
+body, and a table with a constant list, set or dict literal per case.
+
+For each size the time per instruction is shown. When scanning is linear
+this stays about the same as the size grows; the last line gives the
+ratio of the time per instruction of the largest size to that of the
+smallest. The running Python must be one that decompyle3 decompiles,
+since the code is compiled by it.
+"""
+
+import argparse
+import sys
+from time import perf_counter
+
+from xdis.version_info import PYTHON_IMPLEMENTATION, PYTHON_VERSION_TRIPLE
+
+from decompyle3.scanner import get_scanner
+
+DEFAULT_SIZES = (500, 1000, 2000, 4000, 8000)
+
+
+def dispatch_source(n: int) -> str:
+    lines = ["def dispatch(x, y):"]
+    for i in range(n):
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} x == {i} and y:")
+        lines.append(f"        return {i}")
+    lines.append("    return -1")
+    return "\n".join(lines) + "\n"
+
+
+def loop_source(n: int) -> str:
+    lines = ["def loop(items):", "    total = 0", "    for x in items:"]
+    for i in range(n):
+        lines.append(f"        if x == {i}:")
+        lines.append(f"            total += {i}")
+        lines.append("            continue")
+    lines.append("    return total")
+    return "\n".join(lines) + "\n"
+
+
+def table_source(n: int) -> str:
+    lines = ["def table():"]
+    for i in range(n):
+        values = [str(i + j) for j in range(5)]
+        if i % 3 == 0:
+            literal = "[%s]" % ", ".join(values)
+        elif i % 3 == 1:
+            literal = "{%s}" % ", ".join(values)
+        else:
+            literal = "{%s}" % ", ".join(
+                f"{key!r}: {value}" for key, value in zip("abcde", values)
+            )
+        lines.append(f"    t{i} = {literal}")
+    lines.append("    return t0")
+    return "\n".join(lines) + "\n"
+
+
+def function_code(source: str):
+    module = compile(source, "<generated>", "exec")
+    return next(const for const in module.co_consts if hasattr(const, "co_code"))
+
+
+def time_scan(scanner, co, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        scanner.ingest(co)
+        seconds = perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check that scanning time grows linearly with code size."
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma-separated numbers of cases in the generated functions",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="scan this many times, keep the best"
+    )
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    if PYTHON_VERSION_TRIPLE[:2] not in ((3, 7), (3, 8)):
+        print("This needs to run on Python 3.7 or 3.8", file=sys.stderr)
+        return 1
+    scanner = get_scanner(PYTHON_VERSION_TRIPLE[:2], PYTHON_IMPLEMENTATION)
+
+    for name, generate in (
+        ("dispatch", dispatch_source),
+        ("loop", loop_source),
+        ("table", table_source),
+    ):
+        print(f"# {name}")
+        print("#     cases  instructions    seconds  microseconds/instruction")
+        per_instruction = []
+        for size in sizes:
+            co = function_code(generate(size))
+            instructions = len(co.co_code) // 2
+            seconds = time_scan(scanner, co, args.repeat)
+            per_instruction.append(seconds / instructions)
+            print(
+                f"#  {size:8d} {instructions:13d} {seconds:10.3f} "
+                f"{1e6 * seconds / instructions:25.2f}"
+            )
+        print(
+            f"# time per instruction grew {per_instruction[-1] / per_instruction[0]:.2f}"
+            f" times from {sizes[0]} to {sizes[-1]} cases"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# emacs-mode: -*-python-*-
+"""
+token_memory.py -- measure the memory that scanner tokens take
+
+Usage-Examples:
+
+  # Tokenize the 3.7 and 3.8 corpora
+  token_memory.py
+
+  # Just the first 50 files of the 3.8 corpus
+  token_memory.py --corpus 3.8 --limit 50
+
+Each code object in the corpora under test/bytecode_<corpus> is turned
+into tokens by the scanner, as the first phase of decompiling does, and
+all of the token lists are kept. The memory allocated while doing this
+is traced with tracemalloc. Shown are the number of tokens, the memory
+still held once all files have been tokenized, that memory per token,
+and the peak memory allocated.
+
+The size of a single token, including any instance dictionary, is shown
+too, since it is the part of the figure that the Token class decides.
+"""
+
+import argparse
+import gc
+import os.path as osp
+import sys
+import tracemalloc
+from glob import glob
+from time import perf_counter
+
+from xdis import iscode, load_module
+
+from decompyle3.scanner import get_scanner
+from decompyle3.scanners.tok import Token
+
+TEST_DIR = osp.normpath(osp.join(osp.dirname(__file__), ".."))
+
+CORPORA = ("3.7", "3.8", "3.7pypy", "3.8pypy")
+DEFAULT_CORPORA = ("3.7", "3.8")
+
+
+def code_objects(co):
+    yield co
+    for const in co.co_consts:
+        if iscode(const):
+            yield from code_objects(const)
+
+
+def token_size(token: Token) -> int:
+    """
+    Return the size in bytes of `token` itself and of its instance
+    dictionary, if it has one.
+    """
+    size = sys.getsizeof(token)
+    if hasattr(token, "__dict__"):
+        size += sys.getsizeof(token.__dict__)
+    return size
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the memory that scanner tokens take."
+    )
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        choices=CORPORA,
+        help="corpus to tokenize; may be given more than once. Default: "
+        + " and ".join(DEFAULT_CORPORA),
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="tokenize at most this many files from each corpus",
+    )
+    args = parser.parse_args(argv)
+    corpora = args.corpus or list(DEFAULT_CORPORA)
+
+    code = []
+    for corpus in corpora:
+        pattern = osp.join(TEST_DIR, f"bytecode_{corpus}", "**", "*.pyc")
+        for path in sorted(glob(pattern, recursive=True))[: args.limit]:
+            if "code-fragment" in path:
+                continue
+            version, _, _, co, python_implementation = load_module(path)[:5]
+            scanner = get_scanner(version, python_implementation)
+            code += [(scanner, c) for c in code_objects(co)]
+    if not code:
+        print("No bytecode files found", file=sys.stderr)
+        return 1
+
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter()
+    token_lists = []
+    for scanner, co in code:
+        tokens, _ = scanner.ingest(co)
+        token_lists.append(tokens)
+    seconds = perf_counter() - start
+    # The scanners still hold the tables of the last code object each
+    # scanned; let those go, so that what is left is the tokens.
+    for scanner, _ in code:
+        scanner.insts = scanner.lines = scanner.offset2inst_index = None
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tokens = sum(len(token_list) for token_list in token_lists)
+    print(f"# {len(code)} code objects, {tokens} tokens in {seconds:.3f} seconds")
+    print(f"# {held / (1024 * 1024):.1f} MB held, {held / tokens:.0f} bytes/token")
+    print(f"# {peak / (1024 * 1024):.1f} MB peak")
+    print(f"# a token is {token_size(token_lists[0][0])} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())